@@ -5,35 +5,84 @@ from firebase_admin import initialize_app
 
 from shared_functions.main import (
     SM_FUNCTION_post_parser_config,
-    SM_FUNCTION_post_parser_imp,
+    SM_FUNCTION_post_parser_json_imp,
+    SM_FUNCTION_post_parser_batch_imp,
+    SM_FUNCTION_ontology_imp,
 )
 from config import openai_api_key
 
 app = initialize_app()
 
 
+def get_parser_config() -> SM_FUNCTION_post_parser_config:
+    return {
+        "wandb_project": "st-demo-sandbox",
+        "max_summary_length": 500,
+        "openai_api_key": openai_api_key,
+        "openai_api_base": "https://openrouter.ai/api/v1",
+        "openai_api_referer": "https://127.0.0.1:3000/",
+    }
+
+
 @https_fn.on_request(min_instances=1, memory=512, timeout_sec=600)
 def SM_FUNCTION_post_parser(request):
     """
-    Wrapper on SM_FUNCTION_post_parser_imp
+    Wrapper on SM_FUNCTION_post_parser_json_imp. Set `parameters.format` to
+    "compact" to reference the ontology by version instead of inlining it
+    (see SM_FUNCTION_ontology).
     """
     request_json = request.get_json()
     content = request_json["content"]
     parameters = request_json["parameters"]
 
-    config: SM_FUNCTION_post_parser_config = {
-        "wandb_project": "st-demo-sandbox",
-        "max_summary_length": 500,
-        "openai_api_key": openai_api_key,
-        "openai_api_base": "https://openrouter.ai/api/v1",
-        "openai_api_referer": "https://127.0.0.1:3000/",
-    }
+    config = get_parser_config()
 
-    parser_result = SM_FUNCTION_post_parser_imp(content, parameters, config)
-    parser_json = parser_result.model_dump_json()
+    parser_json = SM_FUNCTION_post_parser_json_imp(content, parameters, config)
 
     return https_fn.Response(
         parser_json,
         status=200,
         headers={"Content-Type": "application/json"},
     )
+
+
+@https_fn.on_request(min_instances=1, memory=512, timeout_sec=600)
+def SM_FUNCTION_post_parser_batch(request):
+    """
+    Wrapper on SM_FUNCTION_post_parser_batch_imp. Streams back one NDJSON
+    line per content as soon as it is parsed.
+    """
+    request_json = request.get_json()
+    contents = request_json["contents"]
+    parameters = request_json.get("parameters", {})
+
+    config = get_parser_config()
+
+    lines = SM_FUNCTION_post_parser_batch_imp(contents, parameters, config)
+
+    return https_fn.Response(
+        lines,
+        status=200,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+
+@https_fn.on_request(memory=512, timeout_sec=60)
+def SM_FUNCTION_ontology(request):
+    """
+    Wrapper on SM_FUNCTION_ontology_imp. Returns the parser ontology and its
+    version hash, which compact parser results reference. Responses are cacheable
+    and revalidated by version (ETag).
+    """
+    version, ontology_json = SM_FUNCTION_ontology_imp()
+
+    headers = {
+        "Content-Type": "application/json",
+        "ETag": f'"{version}"',
+        "Cache-Control": "public, max-age=3600",
+    }
+
+    if request.headers.get("If-None-Match") == f'"{version}"':
+        return https_fn.Response(status=304, headers=headers)
+
+    return https_fn.Response(ontology_json, status=200, headers=headers)
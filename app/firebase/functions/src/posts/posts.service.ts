@@ -1,5 +1,13 @@
 import { logger } from 'firebase-functions/v1';
 
+import {
+  CompactParserResult,
+  JsonTerm,
+  ParserOntology,
+  ParserOntologyResponse,
+  ParserResponseFormat,
+  ParserResult,
+} from '../@shared/parser.types';
 import { AppPostCreate, PLATFORM, TweetRead } from '../@shared/types';
 import { FUNCTIONS_PY_URL, IS_TEST } from '../config/config';
 import { createPost } from '../db/posts.repo';
@@ -32,8 +40,11 @@ export const publishPost = async (userId: string, post: AppPostCreate) => {
   return createdPost;
 };
 
-export const getPostSemantics = async (content: string) => {
-  const parameters = { options: TAG_OPTIONS };
+export const getPostSemantics = async (
+  content: string,
+  format: ParserResponseFormat = 'full'
+) => {
+  const parameters = { options: TAG_OPTIONS, format };
 
   const response = await fetch(`${FUNCTIONS_PY_URL}/SM_FUNCTION_post_parser`, {
     headers: [
@@ -47,7 +58,9 @@ export const getPostSemantics = async (content: string) => {
   try {
     const body = await response.json();
     logger.debug('getPostSemantics', body);
-    return body;
+    return format === 'compact'
+      ? await expandCompactResult(body, content)
+      : body;
   } catch (e) {
     logger.error(`error: ${JSON.stringify(e)}`);
     logger.error(
@@ -55,3 +68,156 @@ export const getPostSemantics = async (content: string) => {
     );
   }
 };
+
+/** ontologies referenced by compact parser results, keyed by version hash */
+const ontologies = new Map<string, ParserOntology>();
+
+/** attempts to fetch the requested ontology version, e.g. while old and new
+ * parser instances overlap during a deploy */
+const ONTOLOGY_FETCH_ATTEMPTS = 2;
+
+export const getParserOntology = async (
+  version: string
+): Promise<ParserOntology> => {
+  const cached = ontologies.get(version);
+  if (cached) {
+    return cached;
+  }
+
+  let servedVersion: string | undefined;
+  for (let attempt = 0; attempt < ONTOLOGY_FETCH_ATTEMPTS; attempt++) {
+    const response = await fetch(`${FUNCTIONS_PY_URL}/SM_FUNCTION_ontology`, {
+      headers: [['Accept', 'application/json']],
+      method: 'get',
+    });
+    const body = (await response.json()) as ParserOntologyResponse;
+
+    ontologies.set(body.version, body.ontology);
+    if (body.version === version) {
+      return body.ontology;
+    }
+    servedVersion = body.version;
+  }
+
+  throw new Error(
+    `Parser ontology version ${servedVersion} differs from requested ${version}`
+  );
+};
+
+const jsonTermToNt = (term: JsonTerm) => {
+  if (typeof term === 'string') {
+    return term.startsWith('_:') ? term : `<${term}>`;
+  }
+  const value = JSON.stringify(term.value);
+  if (term.lang) return `${value}@${term.lang}`;
+  if (term.datatype) return `${value}^^<${term.datatype}>`;
+  return value;
+};
+
+/**
+ * Convert a compact parser result of `post` into the full ParserResult format,
+ * fetching its ontology by version (cached). Compact results don't carry the
+ * post, so callers pass their own copy. N-Triples semantics are valid Turtle
+ * and are used as is.
+ */
+export const expandCompactResult = async (
+  result: CompactParserResult,
+  post: string
+): Promise<ParserResult> => {
+  const semantics =
+    result.semantics_format === 'json'
+      ? (result.semantics as JsonTerm[][])
+          .map((triple) => `${triple.map(jsonTermToNt).join(' ')} .`)
+          .join('\n')
+      : (result.semantics as string);
+
+  return {
+    post,
+    semantics,
+    support: {
+      ontology: await getParserOntology(result.support.ontology_version),
+      refs_meta: result.support.refs_meta,
+      timings: result.support.timings,
+    },
+  };
+};
+
+/**
+ * Call `onLine` with each line of a streamed response `body` as soon as it
+ * arrives, without buffering the whole body.
+ */
+const readLines = async (
+  body: ReadableStream<Uint8Array>,
+  onLine: (line: string) => void
+) => {
+  const reader = body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffered += decoder.decode(value, { stream: !done });
+    const lines = buffered.split('\n');
+    // keep the last, possibly incomplete, line until more data arrives
+    buffered = done ? '' : (lines.pop() as string);
+    lines.forEach(onLine);
+    if (done) return;
+  }
+};
+
+/**
+ * Parse many contents in one call to the batch parser function. The function
+ * streams back one NDJSON line per content ({ index, result } or
+ * { index, error }), which are handled as they arrive. Results are returned
+ * in the order of `contents`.
+ */
+export const getPostsSemantics = async (
+  contents: string[],
+  format: ParserResponseFormat = 'full'
+) => {
+  const parameters = { options: TAG_OPTIONS, format };
+
+  const response = await fetch(
+    `${FUNCTIONS_PY_URL}/SM_FUNCTION_post_parser_batch`,
+    {
+      headers: [
+        ['Accept', 'application/x-ndjson'],
+        ['Content-Type', 'application/json'],
+      ],
+      method: 'post',
+      body: JSON.stringify({ contents, parameters }),
+    }
+  );
+
+  if (!response.body) {
+    throw new Error(
+      `Error calling SM_FUNCTION_post_parser_batch: ${response.status}`
+    );
+  }
+
+  const results: Promise<any>[] = contents.map(() =>
+    Promise.resolve(undefined)
+  );
+
+  await readLines(response.body, (line) => {
+    if (line.trim().length === 0) return;
+    const item = JSON.parse(line);
+    if (item.error) {
+      logger.error(`Error parsing content ${item.index}: ${item.error}`);
+      return;
+    }
+    // compact results are expanded while the rest of the batch streams in
+    results[item.index] =
+      format === 'compact'
+        ? expandCompactResult(item.result, contents[item.index]).catch(
+            (e) => {
+              logger.error(`Error expanding result ${item.index}: ${e}`);
+              return undefined;
+            }
+          )
+        : Promise.resolve(item.result);
+  });
+
+  logger.debug('getPostsSemantics', { n: contents.length });
+
+  return Promise.all(results);
+};
@@ -28,6 +28,8 @@ export interface ParserOntology {
 export interface ParsedSupport {
   ontology?: ParserOntology;
   refs_meta?: Record<string, RefMeta>;
+  /** duration in ms of each parser stage, if enabled in the parser config */
+  timings?: Record<string, number>;
 }
 
 export interface ParserResult {
@@ -35,3 +37,30 @@ export interface ParserResult {
   semantics: AppPostSemantics;
   support?: ParsedSupport;
 }
+
+/** Response formats of the parser function, see `parameters.format` */
+export type ParserResponseFormat = 'full' | 'compact';
+
+export type SemanticsFormat = 'nt' | 'json';
+
+export type JsonTerm =
+  | string
+  | { value: string; lang?: string; datatype?: string };
+
+export interface CompactParsedSupport {
+  ontology_version: string;
+  refs_meta?: Record<string, RefMeta>;
+  timings?: Record<string, number>;
+}
+
+/** ParserResult referencing the ontology by version hash */
+export interface CompactParserResult {
+  semantics: string | JsonTerm[][];
+  semantics_format: SemanticsFormat;
+  support: CompactParsedSupport;
+}
+
+export interface ParserOntologyResponse {
+  version: string;
+  ontology: ParserOntology;
+}
@@ -0,0 +1,65 @@
+"""Run end-to-end benchmarks offline and compare them to the stored baselines.
+
+Usage:
+  run_benchmarks.py [--scenarios=<scenarios>] [--sizes=<sizes>] [--baseline=<path>] [--tolerance=<tolerance>] [--llm-latency=<seconds>] [--update-baseline]
+  run_benchmarks.py (-h | --help)
+
+
+Options:
+  -h --help                 Show this screen.
+  --scenarios=<scenarios>   Comma separated scenarios to run [default: all].
+  --sizes=<sizes>           Comma separated corpus sizes [default: 1,100,10000].
+  --baseline=<path>         Baselines file [default: benchmarks/baselines.json].
+  --tolerance=<tolerance>   Relative change tolerated before a metric is reported as a regression [default: 0.25].
+  --llm-latency=<seconds>   Latency of the fake LLM calls [default: 0].
+  --update-baseline         Store the results as the new baselines.
+
+Exits with a non-zero status if a metric regressed compared to the baselines.
+"""
+
+import sys
+from pathlib import Path
+from docopt import docopt
+
+sys.path.append(str(Path(__file__).parent))
+
+from suite import (
+    SCENARIOS,
+    compare_to_baselines,
+    format_results_table,
+    load_baselines,
+    run_suite,
+    save_baselines,
+)
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+
+    scenarios = (
+        list(SCENARIOS)
+        if arguments["--scenarios"] == "all"
+        else arguments["--scenarios"].split(",")
+    )
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios {sorted(unknown)}, choose from {list(SCENARIOS)}")
+    sizes = [int(size) for size in arguments["--sizes"].split(",")]
+    baseline_path = Path(arguments["--baseline"])
+
+    results = run_suite(scenarios, sizes, float(arguments["--llm-latency"]))
+
+    baselines = load_baselines(baseline_path)
+    print(format_results_table(results, baselines))
+
+    if arguments["--update-baseline"]:
+        save_baselines(baseline_path, results)
+        print(f"Saved baselines to {baseline_path}")
+        sys.exit(0)
+
+    regressions = compare_to_baselines(
+        results, baselines, float(arguments["--tolerance"])
+    )
+    for key, metric, old, new in regressions:
+        print(f"Regression in {key} {metric}: {old:g} -> {new:g}")
+    sys.exit(1 if regressions else 0)
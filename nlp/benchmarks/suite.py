@@ -0,0 +1,412 @@
+"""End-to-end benchmarks of the post parsing pipeline on synthetic corpora.
+
+Each scenario times one operation per post of a synthetic corpus and reports the
+p50/p95 latency of the operation, the throughput (posts per second) and the peak RSS
+of the process running it. The LLM is replaced by the offline `FakeChatModel` and
+external HTTP (URL unshortening) by a local server, so results only reflect our code.
+Scenarios run in separate processes so their peak RSS don't mix.
+"""
+import sys
+import json
+import time
+import random
+import zipfile
+import platform
+import resource
+import tempfile
+import threading
+import multiprocessing
+from pathlib import Path
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+
+from desci_sense.shared_functions.fake_llm import create_templated_completion
+from desci_sense.shared_functions.init import init_multi_stage_parser_config
+from desci_sense.shared_functions.interface import ParserResult
+from desci_sense.shared_functions.parsers.firebase_api_parser import (
+    FirebaseAPIParser,
+)
+from desci_sense.shared_functions.postprocessing.output_parsers import extract_tags
+from desci_sense.shared_functions.schema.ontology_base import OntologyBase
+from desci_sense.shared_functions.schema.post import RefPost
+from desci_sense.shared_functions.dataloaders.twitter.twitter_archive_loader import (
+    TwitterArchiveLoader,
+)
+
+DEFAULT_SIZES = [1, 100, 10000]
+DEFAULT_BASELINE_PATH = Path(__file__).parent / "baselines.json"
+
+# relative change of a metric tolerated before it is reported as a regression
+DEFAULT_TOLERANCE = 0.25
+# latency changes below this (in ms) are timer noise
+MIN_LATENCY_DELTA_MS = 0.05
+
+# metric -> True if higher is better
+METRICS = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "throughput": True,
+    "peak_rss_mb": False,
+}
+
+WORDS = (
+    "open science replication preprint dataset protocol genome climate model "
+    "neuroscience review evidence citation journal funding peer reproducibility"
+).split()
+
+START_DATE = datetime(2024, 1, 1)
+
+
+def make_post_text(i: int, ref_host: str) -> str:
+    """
+    Return text of synthetic post `i`, with 0, 1 or 2 references to `ref_host`
+    so that all prompt cases are covered.
+    """
+    rng = random.Random(i)
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 40)))
+    refs = [f"http://{ref_host}/paper/{i}/{j}" for j in range(i % 3)]
+    return "\n".join([text.capitalize() + "."] + refs)
+
+
+def make_corpus(size: int, ref_host: str) -> List[str]:
+    return [make_post_text(i, ref_host) for i in range(size)]
+
+
+def make_ref_post(i: int, ref_host: str) -> RefPost:
+    """Same as `make_post_text` but already converted (no URL unshortening)."""
+    text = make_post_text(i, ref_host)
+    ref_urls = [line for line in text.split("\n") if line.startswith("http")]
+    return RefPost(
+        author="bench_author",
+        content=text,
+        url="",
+        source_network="bench",
+        ref_urls=ref_urls,
+    )
+
+
+class LocalHttpServer:
+    """
+    Local stand-in for the web: answers every request with 200 and an empty page,
+    so that URL unshortening doesn't leave the machine.
+    """
+
+    def __init__(self) -> None:
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            do_GET = do_HEAD
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.host = f"127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def create_offline_parser(llm_latency: float = 0.0) -> FirebaseAPIParser:
+    config = init_multi_stage_parser_config(
+        {
+            "wandb_project": "benchmarks",
+            "openai_api_key": "offline",
+            "openai_api_base": f"fake://llm?latency={llm_latency}",
+            "openai_api_referer": "https://127.0.0.1:3000/",
+        },
+        {"ref_metadata_method": "none"},
+    )
+    return FirebaseAPIParser(config=config)
+
+
+def write_tweets_archive(path: Path, size: int) -> Path:
+    """Write synthetic Twitter archive zip with `size` tweets."""
+
+    def to_js(name: str, items) -> bytes:
+        return f"window.YTD.{name}.part0 = {json.dumps(items)}".encode("utf8")
+
+    account = [{"account": {"username": "bench_user", "accountId": "1"}}]
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("archive/data/account.js", to_js("account", account))
+        with zf.open("archive/data/tweets.js", "w") as f:
+            f.write(b"window.YTD.tweets.part0 = [\n")
+            for i in range(size):
+                url = f"https://t.co/{i}"
+                tweet = {
+                    "tweet": {
+                        "id": str(1000 + i),
+                        "id_str": str(1000 + i),
+                        "created_at": (START_DATE + timedelta(minutes=i)).strftime(
+                            "%a %b %d %H:%M:%S +0000 %Y"
+                        ),
+                        "full_text": f"{make_post_text(i, 'example.com')} {url}",
+                        "entities": {
+                            "urls": [
+                                {"url": url, "expanded_url": f"https://example.com/{i}"}
+                            ],
+                            "user_mentions": [],
+                        },
+                    }
+                }
+                sep = b",\n" if i < size - 1 else b"\n"
+                f.write(json.dumps(tweet).encode("utf8") + sep)
+            f.write(b"]")
+    return path
+
+
+def time_each(fn: Callable, items) -> List[float]:
+    """Return duration in seconds of `fn` on each of `items`."""
+    durations = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def time_iteration(iterator: Iterator) -> List[float]:
+    """Return duration in seconds taken to produce each item of `iterator`."""
+    durations = []
+    start = time.perf_counter()
+    for _ in iterator:
+        now = time.perf_counter()
+        durations.append(now - start)
+        start = now
+    return durations
+
+
+# Scenarios: setup is not timed, and each returns the per post durations
+
+
+def bench_process_text_parallel(size: int, llm_latency: float) -> List[float]:
+    server = LocalHttpServer()
+    try:
+        parser = create_offline_parser(llm_latency)
+        corpus = make_corpus(size, server.host)
+        return time_each(parser.process_text_parallel, corpus)
+    finally:
+        server.close()
+
+
+def bench_post_process_result(size: int, llm_latency: float) -> List[float]:
+    parser = create_offline_parser(llm_latency)
+    results = [
+        parser.process_ref_post_parallel(make_ref_post(i, "example.com"))
+        for i in range(size)
+    ]
+    return time_each(lambda r: parser.post_process_result(**r), results)
+
+
+def bench_model_dump_json(size: int, llm_latency: float) -> List[float]:
+    parser = create_offline_parser(llm_latency)
+    results: List[ParserResult] = [
+        parser.post_process_result(
+            **parser.process_ref_post_parallel(make_ref_post(i, "example.com"))
+        )
+        for i in range(size)
+    ]
+    return time_each(lambda r: r.model_dump_json(), results)
+
+
+def bench_extract_tags(size: int, llm_latency: float) -> List[float]:
+    labels = OntologyBase().get_all_labels()
+    prompt_tags = "\n".join(f"<{label}>: definition" for label in labels)
+    completions = [
+        create_templated_completion(
+            f"{prompt_tags}\nContent: {make_post_text(i, 'example.com')}"
+        )
+        for i in range(size)
+    ]
+    return time_each(lambda text: extract_tags(text, labels), completions)
+
+
+def bench_ontology_lookups(size: int, llm_latency: float) -> List[float]:
+    ontology = OntologyBase()
+    type_pairs = sorted(
+        {
+            (subject_type, object_type)
+            for c in ontology.concepts
+            for subject_type in c.valid_subject_types
+            for object_type in c.valid_object_types
+        }
+    )
+    labels = ontology.get_all_labels()
+
+    def lookup(i: int):
+        subject_type, object_type = type_pairs[i % len(type_pairs)]
+        for label in ontology.get_valid_labels(subject_type, object_type):
+            ontology.get_concept_by_label(label)
+        ontology.get_concept_by_label(labels[i % len(labels)])
+
+    return time_each(lookup, range(size))
+
+
+def bench_twitter_archive(size: int, llm_latency: float) -> List[float]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = write_tweets_archive(Path(tmp_dir) / "archive.zip", size)
+        return time_iteration(TwitterArchiveLoader().iter_archive(str(path)))
+
+
+SCENARIOS: Dict[str, Callable[[int, float], List[float]]] = {
+    "process_text_parallel": bench_process_text_parallel,
+    "post_process_result": bench_post_process_result,
+    "model_dump_json": bench_model_dump_json,
+    "extract_tags": bench_extract_tags,
+    "ontology_lookups": bench_ontology_lookups,
+    "twitter_archive": bench_twitter_archive,
+}
+
+
+def get_peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    durations_ms = np.array(durations) * 1000
+    return {
+        "n": len(durations),
+        "p50_ms": round(float(np.percentile(durations_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(durations_ms, 95)), 4),
+        "throughput": round(len(durations) / (durations_ms.sum() / 1000), 2),
+        "peak_rss_mb": round(get_peak_rss_mb(), 1),
+    }
+
+
+def run_scenario(name: str, size: int, llm_latency: float = 0.0) -> Dict[str, float]:
+    """Run scenario `name` on a corpus of `size` posts in the current process."""
+    return summarize(SCENARIOS[name](size, llm_latency))
+
+
+def _run_scenario_in_child(name, size, llm_latency, queue):
+    try:
+        queue.put(run_scenario(name, size, llm_latency))
+    except BaseException as e:
+        queue.put(e)
+        raise
+
+
+def run_scenario_isolated(
+    name: str, size: int, llm_latency: float = 0.0
+) -> Dict[str, float]:
+    """Run scenario `name` in a fresh process, so its peak RSS is its own."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(
+        target=_run_scenario_in_child, args=(name, size, llm_latency, queue)
+    )
+    process.start()
+    result = queue.get()
+    process.join()
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+def get_result_key(name: str, size: int) -> str:
+    return f"{name}[{size}]"
+
+
+def run_suite(
+    scenarios: Optional[List[str]] = None,
+    sizes: Optional[List[int]] = None,
+    llm_latency: float = 0.0,
+    isolated: bool = True,
+) -> Dict[str, Dict[str, float]]:
+    """Run `scenarios` (default all) for each of `sizes`, and return results by key."""
+    run = run_scenario_isolated if isolated else run_scenario
+    results = {}
+    for name in scenarios or list(SCENARIOS):
+        for size in sizes or DEFAULT_SIZES:
+            key = get_result_key(name, size)
+            results[key] = run(name, size, llm_latency)
+            print(f"{key}: {results[key]}")
+    return results
+
+
+def get_environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": multiprocessing.cpu_count(),
+    }
+
+
+def load_baselines(path: Path) -> Dict:
+    if not Path(path).exists():
+        return {"environment": {}, "results": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_baselines(path: Path, results: Dict[str, Dict[str, float]]):
+    """Merge `results` into the baselines stored at `path`."""
+    baselines = load_baselines(path)
+    baselines["environment"] = get_environment()
+    baselines["results"] = {**baselines["results"], **results}
+    with open(path, "w") as f:
+        json.dump(baselines, f, indent=2)
+        f.write("\n")
+
+
+def compare_to_baselines(
+    results: Dict[str, Dict[str, float]],
+    baselines: Dict,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[Tuple[str, str, float, float]]:
+    """
+    Return (key, metric, baseline, value) for each metric of `results` that is worse
+    than its baseline by more than `tolerance` (relative change).
+    """
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines["results"].get(key)
+        if baseline is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = baseline[metric], result[metric]
+            if metric.endswith("_ms") and new - old < MIN_LATENCY_DELTA_MS:
+                continue
+            if higher_is_better:
+                regressed = new < old / (1 + tolerance)
+            else:
+                regressed = new > old * (1 + tolerance)
+            if regressed:
+                regressions.append((key, metric, old, new))
+    return regressions
+
+
+def format_results_table(
+    results: Dict[str, Dict[str, float]], baselines: Optional[Dict] = None
+) -> str:
+    """Return markdown table of `results`, with relative change to `baselines`."""
+    baseline_results = (baselines or {}).get("results", {})
+    lines = [
+        "| benchmark | p50 (ms) | p95 (ms) | posts/s | peak RSS (MB) |",
+        "|---|---|---|---|---|",
+    ]
+    for key, result in results.items():
+        cells = []
+        for metric in METRICS:
+            cell = f"{result[metric]:g}"
+            old = baseline_results.get(key, {}).get(metric)
+            if old:
+                cell += f" ({(result[metric] - old) / old:+.0%})"
+            cells.append(cell)
+        lines.append(f"| {key} | " + " | ".join(cells) + " |")
+    return "\n".join(lines)
@@ -37,15 +37,13 @@ def extract_external_masto_ref_urls(post: dict, add_qrt_url: bool = True):
     Extract list of URLs referenced by this post (in the post text body).
     Shortened URLs are expanded to long form.
     """
+    # urls extracted from the text are already normalized
     urls = extract_and_expand_urls(post["plain_content"])
 
     # extract URL from mastodon post card
     if post["card"]:
         if post["card"]["url"]:
-            urls += [post["card"]["url"]]
-
-    # normalize urls
-    urls = [normalize_url(u) for u in urls]
+            urls += [normalize_url(post["card"]["url"])]
 
     # remove dups
     urls = list(set(urls))
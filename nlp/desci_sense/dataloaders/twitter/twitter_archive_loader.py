@@ -1,19 +1,133 @@
-import zipfile
+import io
+import json
+import glob
 import os
+import zipfile
+import fnmatch
+import posixpath
 import pytz
 import pandas as pd
 from datetime import datetime
-from typing import List
+from typing import IO, Any, Iterator, List, Optional
 
 
 from ...shared_functions.schema.post import RefPost
-from ...dataloaders.twitter.twitter_archive_parser import (
-    parse_tweets,
-    PathConfig,
-    extract_username,
-    read_json_from_js_file,
+from ...dataloaders.twitter.twitter_utils import (
+    convert_archive_tweet_to_ref_post,
+    convert_twitter_time_to_datetime,
 )
-from ...dataloaders.twitter.twitter_utils import convert_archive_tweet_to_ref_post
+
+# file names of tweets in the archive `data` directory
+# (they change slightly depending on the archive size)
+TWEETS_FILE_PATTERNS = ["tweet.js", "tweets.js", "tweets-part*.js"]
+
+# number of characters read at a time from archive files
+READ_CHUNK_SIZE = 1 << 16
+
+_json_decoder = json.JSONDecoder()
+
+
+def iter_js_array(stream: IO[str], chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Incrementally parse a Twitter-produced .js file of the form
+    `window.YTD.<name> = [ {...}, {...} ]` from text `stream`, yielding one array
+    item at a time. Only the item being parsed is held in memory.
+    """
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def read_more() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        # drop already parsed text
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    # skip assignment prefix up to the opening bracket
+    while "[" not in buffer:
+        if not read_more():
+            # empty file
+            return
+    pos = buffer.index("[") + 1
+
+    while True:
+        # skip separators between items
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) or not read_more():
+                break
+        if pos >= len(buffer) or buffer[pos] == "]":
+            return
+
+        try:
+            item, pos = _json_decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # item is not complete yet
+            if eof or not read_more():
+                raise
+            continue
+
+        yield item
+
+
+def iter_tweets_from_js_files(
+    streams: Iterator[IO[str]], cutoff_date: str = None
+) -> Iterator[dict]:
+    """
+    Yield raw tweets from tweet .js `streams`. If `cutoff_date` is provided,
+    only tweets created on or after `cutoff_date` are yielded.
+    """
+    cutoff_datetime = None
+    if cutoff_date is not None:
+        cutoff_datetime = datetime.strptime(cutoff_date, "%Y-%m-%d").replace(
+            tzinfo=pytz.UTC
+        )
+
+    for stream in streams:
+        for tweet in iter_js_array(stream):
+            if cutoff_datetime is not None:
+                created_at = convert_twitter_time_to_datetime(
+                    tweet["tweet"]["created_at"]
+                )
+                if created_at is None or created_at < cutoff_datetime:
+                    continue
+            yield tweet
+
+
+def get_archive_member_names(zip_file: zipfile.ZipFile) -> dict:
+    """
+    Return names of the account and tweets files in the `data` directory of
+    a Twitter archive zip.
+    """
+    account = None
+    tweets = []
+    for name in zip_file.namelist():
+        dirname, basename = posixpath.split(name)
+        if posixpath.basename(dirname) != "data":
+            continue
+        if basename == "account.js":
+            account = name
+        elif any(fnmatch.fnmatch(basename, p) for p in TWEETS_FILE_PATTERNS):
+            tweets.append(name)
+
+    if account is None:
+        raise ValueError("Failed to find data/account.js in archive")
+    if len(tweets) == 0:
+        raise ValueError(f"No files matching {TWEETS_FILE_PATTERNS} in archive")
+
+    return {"account": account, "tweets": sorted(tweets)}
+
+
+def read_username(stream: IO[str]) -> str:
+    """Returns the user's Twitter username from account.js contents."""
+    account = next(iter_js_array(stream))
+    return account["account"]["username"]
 
 
 def create_dataframe_from_refposts(ref_posts: List[RefPost]):
@@ -38,39 +152,73 @@ class TwitterArchiveLoader:
     def __init__(self) -> None:
         pass
 
+    def iter_ref_posts_from_archive_dir(
+        self, archive_dir: str, cutoff_date: str = None
+    ) -> Iterator[RefPost]:
+        """
+        Lazily loads tweets found at path specified by `archive_dir` and converts them to RefPosts.
+        """
+        dir_input_data = os.path.join(archive_dir, "data")
+        with open(
+            os.path.join(dir_input_data, "account.js"), "r", encoding="utf8"
+        ) as f:
+            username = read_username(f)
+
+        tweets_files = sorted(
+            path
+            for pattern in TWEETS_FILE_PATTERNS
+            for path in glob.glob(os.path.join(dir_input_data, pattern))
+        )
+
+        def open_streams():
+            for path in tweets_files:
+                with open(path, "r", encoding="utf8") as f:
+                    yield f
+
+        for tweet in iter_tweets_from_js_files(open_streams(), cutoff_date):
+            yield convert_archive_tweet_to_ref_post(tweet, username)
+
     def load_ref_posts_from_archive_dir(
         self, archive_dir: str, cutoff_date: str = None
     ) -> List[RefPost]:
         """
         Loads tweets found at path specified by `archive_dir` and converts them to a list of RefPosts.
         """
-        paths = PathConfig(dir_archive=archive_dir)
-        username = extract_username(paths)
-
-        tweets = []
-        for tweets_js_filename in paths.files_input_tweets:
-            json = read_json_from_js_file(tweets_js_filename)
-            tweets += json
-
-        ref_posts = []
-        for tweet in tweets:
-            ref_post = convert_archive_tweet_to_ref_post(tweet, username)
-            ref_posts.append(ref_post)
-
-        # Filter by cutoff_date if provided
-        if cutoff_date is not None:
-            cutoff_datetime = datetime.strptime(cutoff_date, "%Y-%m-%d").replace(
-                tzinfo=pytz.UTC
-            )
-            ref_posts = [
-                post for post in ref_posts if post.created_at >= cutoff_datetime
-            ]
-
-        return ref_posts
+        return list(self.iter_ref_posts_from_archive_dir(archive_dir, cutoff_date))
+
+    def iter_archive(
+        self, path_to_zip: str, cutoff_date: Optional[str] = None
+    ) -> Iterator[RefPost]:
+        """Reads tweets from zip archive `path_to_zip` and lazily converts them into RefPosts.
+        Tweets are parsed incrementally from the zip member streams (without extracting the archive),
+        so memory use doesn't depend on the archive size.
+        If optional `cutoff_date` is provided, yields only posts with creation date equal to or greater than `cutoff_date`.
+
+        Args:
+            path_to_zip (str): zip archive of tweets to be converted.
+            cutoff_date (str, optional): yields only posts with creation date equal to or greater than `cutoff_date`. Defaults to None.
+
+        Yields:
+            RefPost: tweets converted to RefPosts
+        """
+        with zipfile.ZipFile(path_to_zip, "r") as zip_file:
+            members = get_archive_member_names(zip_file)
+
+            with zip_file.open(members["account"]) as f:
+                username = read_username(io.TextIOWrapper(f, encoding="utf8"))
+
+            def open_streams():
+                for name in members["tweets"]:
+                    with zip_file.open(name) as f:
+                        yield io.TextIOWrapper(f, encoding="utf8")
+
+            for tweet in iter_tweets_from_js_files(open_streams(), cutoff_date):
+                yield convert_archive_tweet_to_ref_post(tweet, username)
 
     def load_archive(self, path_to_zip: str, cutoff_date: str = None) -> List[RefPost]:
-        """Extracts zip archive of tweets `path_to_zip` and converts them into RefPosts.
+        """Reads zip archive of tweets `path_to_zip` and converts them into RefPosts.
         If optional `cutoff_date` is provided, returns only posts with creation date equal to or greater than `cutoff_date`.
+        Use `iter_archive` to process large archives without holding all posts in memory.
 
         Args:
             path_to_zip (str): zip archive of tweets to be converted.
@@ -79,12 +227,4 @@ class TwitterArchiveLoader:
         Returns:
             List[RefPost]: list of tweets converted to RefPosts
         """
-        # Extract the zip archive
-        with zipfile.ZipFile(path_to_zip, "r") as zip_ref:
-            extract_path = os.path.splitext(path_to_zip)[0]
-            zip_ref.extractall(extract_path)
-
-        # Load tweets from the extracted directory
-        ref_posts = self.load_ref_posts_from_archive_dir(extract_path, cutoff_date)
-
-        return ref_posts
+        return list(self.iter_archive(path_to_zip, cutoff_date))
@@ -1,13 +1,15 @@
 """Script to run evaluation of label prediction models.
 
 Usage:
-  eval_benchmark_v0.py [--config=<config>] [--dataset=<dataset>] [--file=<file>]
+  eval_benchmark_v0.py [--config=<config>] [--dataset=<dataset>] [--file=<file>] [--workers=<workers>] [--cache=<cache>]
 
 
 Options:
 --config=<config>  Optional path to configuration file.
 --dataset=<dataset> Optional path to a wandb artifact.
 --file=<file> Optional file name e.g. labeled_dataset.table.json indeed it should be a table.json format
+--workers=<workers> Number of concurrent predictions [default: 8].
+--cache=<cache> Path of the persistent prediction cache (SQLite) [default: eval_predictions_cache.db].
 
 """
 from datetime import datetime
@@ -17,20 +19,24 @@ import json
 import pandas as pd
 import numpy as np
 import sys
-from tqdm import tqdm
 import docopt
 import re
 from sklearn.preprocessing import MultiLabelBinarizer
-from sklearn.metrics import (
-    precision_recall_fscore_support,
-    accuracy_score,
-    confusion_matrix,
-)
 
 
 sys.path.append(str(Path(__file__).parents[2]))
 
 from desci_sense.runner import init_model, load_config
+from desci_sense.evaluation.eval_metrics import (
+    calculate_scores,
+    create_custom_confusion_matrix,
+    score_chart_by_label,
+)
+from desci_sense.evaluation.eval_runner import (
+    create_prediction_cache,
+    get_config_hash,
+    predict_rows,
+)
 
 
 # get a path to a wandb table and populate it in a pd data frame
@@ -50,16 +56,28 @@ def get_dataset(table_path):
     return df
 
 
-def pred_labels(df):
+def pred_labels(df, config, max_workers: int = 8, cache_path: str = None):
     model = init_model(config)
-    for i in tqdm(range(len(df)), desc="Processing", unit="pred"):
-        # print('in iteration',i)
-        response = model.process_text(df["Text"][i])
-        df["Predicted Label"][i] = response["answer"]["multi_tag"]
-        df["Reasoning Steps"][i] = response["answer"]["reasoning"]
 
-        """ print('Predicted Label: ',df['Predicted Label'][i])
-    print(tuple(zip(df['Predicted Label'],df['True Label'])))"""
+    def predict(text: str) -> dict:
+        response = model.process_text_st(text)
+        return {
+            "multi_tag": response["answer"]["multi_tag"],
+            "reasoning": response["answer"]["reasoning"],
+        }
+
+    cache = create_prediction_cache(cache_path)
+    predictions = predict_rows(
+        df["Text"].tolist(),
+        predict,
+        config_hash=get_config_hash(config),
+        cache=cache,
+        max_workers=max_workers,
+    )
+
+    # failed predictions are left empty
+    df["Predicted Label"] = [p["multi_tag"] if p else [] for p in predictions]
+    df["Reasoning Steps"] = [p["reasoning"] if p else "" for p in predictions]
 
 
 # values are returned as string, we want them as lists
@@ -93,76 +111,6 @@ def binarize(y_pred, y_true):
     return y_pred, y_true, mlb.classes_
 
 
-# assumes that the values on 'True Label' and 'Predicted Label' are lists
-def calculate_scores(y_pred, y_true):
-    # calculate scores
-    # Calculate precision, recall, f1_score, support
-    precision, recall, f1_score, support = precision_recall_fscore_support(
-        y_true, y_pred, average=None
-    )
-
-    # calculate accuracy
-    accuracy = accuracy_score(y_pred=y_pred, y_true=y_true)
-
-    # calculate label confusion chart
-
-    return precision, recall, f1_score, support, accuracy
-
-
-# def create_evaluation_artifact(df,)
-
-# Create a custom confusion matrix: on the diagonal you see the true positives
-# off the diagonal you see the false positives incase the row label was predicted as false negative
-
-
-def create_custom_confusion_matrix(y_true, y_pred, labels):
-    # Initialize an empty matrix
-    matrix = np.zeros((len(labels), len(labels)))
-
-    # Calculate confusion matrix for each label
-    for i, label_i in enumerate(labels):
-        for j, label_j in enumerate(labels):
-            if i == j:
-                # Diagonal: True Positives for label i
-                tp = confusion_matrix(y_true[:, i], y_pred[:, i]).ravel()[3]
-                matrix[i, i] = tp
-            else:
-                # Off-diagonal: i was true (fn for i) but j was predicted (fp for j)
-                fn_i = y_true[:, i] & ~y_pred[:, i]
-                fp_j = ~y_true[:, j] & y_pred[:, j]
-                matrix[i, j] = np.sum(fn_i & fp_j)
-
-    return pd.DataFrame(matrix, index=labels, columns=labels)
-
-
-# Log chart of metrics per label
-def score_chart_by_label(labels, y_pred, y_true):
-    precision, recall, f1_score, support, accuracy = calculate_scores(
-        y_pred=y_pred, y_true=y_true
-    )
-    df = pd.DataFrame(
-        {
-            "Labels": labels,
-            "Precision": precision,
-            "Recall": recall,
-            "F1 score": f1_score,
-            "True label Count": sum(y_true),
-        }
-    )
-    avg_row = pd.DataFrame(
-        {
-            "Labels": "Average",
-            "Precision": pd.Series(precision).mean(),
-            "Recall": pd.Series(recall).mean(),
-            "F1 score": pd.Series(f1_score).mean(),
-            "True label Count": sum(sum(y_true)),
-        },
-        index=[0],
-    )
-    df = df._append(avg_row, ignore_index=True)
-    return df
-
-
 if __name__ == "__main__":
     arguments = docopt.docopt(__doc__)
 
@@ -206,7 +154,12 @@ if __name__ == "__main__":
     # return the pd df from the table
     df = get_dataset(table_path)
 
-    pred_labels(df)
+    pred_labels(
+        df,
+        config,
+        max_workers=int(arguments["--workers"]),
+        cache_path=arguments["--cache"],
+    )
 
     # make sure df can be binarized
     normalize_df(df)
@@ -217,9 +170,8 @@ if __name__ == "__main__":
     )
 
     # calculate scores
-    precision, recall, f1_score, support, accuracy = calculate_scores(
-        y_pred=y_pred, y_true=y_true
-    )
+    scores = calculate_scores(y_pred=y_pred, y_true=y_true)
+    precision, recall, f1_score, support, accuracy = scores
 
     # Create the evaluation artifact
     current_datetime = datetime.now()
@@ -236,7 +188,9 @@ if __name__ == "__main__":
     artifact.add(table, "prediction_evaluation")
 
     # Log score chart per label
-    score_chart = score_chart_by_label(labels=labels, y_pred=y_pred, y_true=y_true)
+    score_chart = score_chart_by_label(
+        labels=labels, y_pred=y_pred, y_true=y_true, scores=scores
+    )
 
     print(score_chart)
 
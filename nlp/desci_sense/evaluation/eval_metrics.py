@@ -0,0 +1,86 @@
+"""Multi-label evaluation metrics over binarized label matrices (rows = posts, columns = labels)."""
+import numpy as np
+import pandas as pd
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    # labels with a zero denominator score 0, as in sklearn's default zero_division
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.zeros(len(numerator), dtype=float),
+        where=denominator != 0,
+    )
+
+
+# assumes that the values on 'True Label' and 'Predicted Label' are binarized
+def calculate_scores(y_pred, y_true):
+    """
+    Return per label precision, recall, f1 score and support, and the subset accuracy,
+    computed from the per label TP/FP/FN counts in a single pass over the labels matrices.
+    """
+    y_true = np.asarray(y_true).astype(bool)
+    y_pred = np.asarray(y_pred).astype(bool)
+
+    tp = np.sum(y_true & y_pred, axis=0)
+    fp = np.sum(~y_true & y_pred, axis=0)
+    fn = np.sum(y_true & ~y_pred, axis=0)
+
+    precision = _safe_divide(tp, tp + fp)
+    recall = _safe_divide(tp, tp + fn)
+    f1_score = _safe_divide(2 * tp, 2 * tp + fp + fn)
+    support = tp + fn
+
+    # a post counts as accurate only if all its labels are predicted correctly
+    accuracy = float(np.mean(np.all(y_true == y_pred, axis=1)))
+
+    return precision, recall, f1_score, support, accuracy
+
+
+# Create a custom confusion matrix: on the diagonal you see the true positives
+# off the diagonal you see the false positives incase the row label was predicted as false negative
+def create_custom_confusion_matrix(y_true, y_pred, labels):
+    y_true = np.asarray(y_true).astype(bool)
+    y_pred = np.asarray(y_pred).astype(bool)
+
+    # Off-diagonal: number of posts where i was true (fn for i) but j was predicted (fp for j)
+    fn = (y_true & ~y_pred).astype(np.int64)
+    fp = (~y_true & y_pred).astype(np.int64)
+    matrix = (fn.T @ fp).astype(float)
+
+    # Diagonal: True Positives for each label
+    np.fill_diagonal(matrix, np.sum(y_true & y_pred, axis=0))
+
+    return pd.DataFrame(matrix, index=labels, columns=labels)
+
+
+# Log chart of metrics per label
+def score_chart_by_label(labels, y_pred, y_true, scores=None):
+    """
+    Return table of metrics per label, with an average row.
+    `scores` can be passed if already computed with `calculate_scores`.
+    """
+    if scores is None:
+        scores = calculate_scores(y_pred=y_pred, y_true=y_true)
+    precision, recall, f1_score, support, accuracy = scores
+    df = pd.DataFrame(
+        {
+            "Labels": labels,
+            "Precision": precision,
+            "Recall": recall,
+            "F1 score": f1_score,
+            "True label Count": support,
+        }
+    )
+    avg_row = pd.DataFrame(
+        {
+            "Labels": "Average",
+            "Precision": pd.Series(precision).mean(),
+            "Recall": pd.Series(recall).mean(),
+            "F1 score": pd.Series(f1_score).mean(),
+            "True label Count": support.sum(),
+        },
+        index=[0],
+    )
+    df = pd.concat([df, avg_row], ignore_index=True)
+    return df
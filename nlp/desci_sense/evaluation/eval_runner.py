@@ -0,0 +1,115 @@
+"""Concurrent label prediction over an evaluation dataset, with a persistent prediction cache.
+
+Predictions are cached by hash of the row text and of the model config, so re-running an
+evaluation with an unchanged config only predicts rows that are not cached yet, and a crashed
+run resumes where it stopped.
+"""
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+from tqdm import tqdm
+
+from desci_sense.shared_functions.cache import BaseCache, SQLiteCache
+from desci_sense.shared_functions.prompting import jinja as jinja_templates
+from desci_sense.shared_functions.schema.ontology_base import OntologyBase
+
+# config entries that don't affect predictions
+CONFIG_HASH_EXCLUDED_KEYS = [
+    ("wandb",),
+    ("llm_cache",),
+    ("tracing",),
+    ("openai_api", "openai_api_key"),
+    ("openai_api", "openai_api_referer"),
+]
+
+
+def get_templates_hash() -> str:
+    """Return hash of the sources of the jinja prompt templates."""
+    templates_hash = hashlib.sha256()
+    for path in sorted(Path(jinja_templates.__file__).parent.glob("*.py")):
+        templates_hash.update(path.name.encode("utf-8"))
+        templates_hash.update(path.read_bytes())
+    return templates_hash.hexdigest()
+
+
+def get_config_hash(config: dict) -> str:
+    """
+    Return hash of the parts of `config` that affect predictions, along with the
+    versions of the ontology and prompt templates they are made with.
+    """
+    relevant = json.loads(json.dumps(config, default=str))
+    for path in CONFIG_HASH_EXCLUDED_KEYS:
+        section = relevant
+        for key in path[:-1]:
+            section = section.get(key, {})
+        section.pop(path[-1], None)
+    versions = config.get("ontology", {}).get("versions")
+    serialized = json.dumps(
+        {
+            "config": relevant,
+            "ontology": OntologyBase(versions=versions).version_hash,
+            "templates": get_templates_hash(),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def get_prediction_key(text: str, config_hash: str) -> str:
+    return hashlib.sha256(f"{config_hash}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def create_prediction_cache(db_path: Optional[str]) -> Optional[BaseCache]:
+    """Return persistent prediction cache stored at `db_path`, or None if no path is given."""
+    if db_path is None:
+        return None
+    return SQLiteCache(db_path, table="predictions")
+
+
+def predict_rows(
+    texts: Sequence[str],
+    predict: Callable[[str], dict],
+    config_hash: str,
+    cache: Optional[BaseCache] = None,
+    max_workers: int = 8,
+) -> List[Optional[dict]]:
+    """
+    Run `predict` on each of `texts` using `max_workers` threads and return the
+    predictions in input order. Predictions must be JSON serializable; each one is
+    written to `cache` as soon as it completes. Rows whose prediction failed get None.
+    """
+    predictions: List[Optional[dict]] = [None] * len(texts)
+    keys = [get_prediction_key(text, config_hash) for text in texts]
+
+    pending = []
+    for i, key in enumerate(keys):
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            predictions[i] = cached
+        else:
+            pending.append(i)
+    print(f"Found {len(texts) - len(pending)} cached predictions")
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(predict, texts[i]): i for i in pending}
+        for future in tqdm(
+            as_completed(futures), total=len(futures), desc="Processing", unit="pred"
+        ):
+            i = futures[future]
+            try:
+                predictions[i] = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"Prediction failed for row {i}: {e!r}")
+                continue
+            if cache is not None:
+                cache.set(keys[i], predictions[i])
+
+    if failures > 0:
+        print(f"{failures} predictions failed, run again to retry them")
+
+    return predictions
@@ -0,0 +1,202 @@
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+_MISSING = object()
+
+# valid SQLite table names (SQL identifiers can't be passed as query parameters)
+_TABLE_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class BaseCache:
+    """
+    Key/value cache with per-entry TTL and hit/miss counters.
+    Subclasses implement `_lookup`, `_store` and `_clear`.
+    Values must be JSON serializable (required by persistent backends).
+    Caches are shared across threads, so the counters are updated under a lock.
+    """
+
+    def __init__(self, ttl: Optional[float] = None) -> None:
+        # default time to live in seconds (None = never expires)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._counts_lock = threading.Lock()
+
+    def _lookup(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        raise NotImplementedError
+
+    def _store(self, key: str, value: Any, expires_at: Optional[float]):
+        raise NotImplementedError
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def _expires_at(self, ttl: Optional[float]) -> Optional[float]:
+        ttl = self.ttl if ttl is None else ttl
+        return None if ttl is None else time.time() + ttl
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self._lookup(key)
+        with self._counts_lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return default if entry is None else entry[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store `value` under `key`. `ttl` overrides the cache default TTL."""
+        self._store(key, value, self._expires_at(ttl))
+
+    def clear(self):
+        self._clear()
+        with self._counts_lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._counts_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total > 0 else 0.0,
+        }
+
+
+class LRUCache(BaseCache):
+    """In-memory cache holding at most `max_size` entries."""
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None) -> None:
+        super().__init__(ttl)
+        self.max_size = max_size
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _lookup(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at = entry[1]
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def _store(self, key: str, value: Any, expires_at: Optional[float]):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def _clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache(BaseCache):
+    """Persistent cache stored in a SQLite database at `path`."""
+
+    def __init__(
+        self, path: str, table: str = "cache", ttl: Optional[float] = None
+    ) -> None:
+        super().__init__(ttl)
+        if not _TABLE_NAME_PATTERN.match(table):
+            raise ValueError(f"Invalid SQLite table name: {table!r}")
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def _lookup(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= time.time():
+                with self._conn:
+                    self._conn.execute(
+                        f"DELETE FROM {self.table} WHERE key = ?", (key,)
+                    )
+                return None
+        return json.loads(value), expires_at
+
+    def _store(self, key: str, value: Any, expires_at: Optional[float]):
+        serialized = json.dumps(value)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                (key, serialized, expires_at),
+            )
+
+    def _clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def close(self):
+        self._conn.close()
+
+
+class TieredCache(BaseCache):
+    """
+    Chain of caches checked in order (e.g. in-memory LRU in front of SQLite).
+    Hits in a later tier are promoted to the earlier tiers, and writes go to all tiers.
+    """
+
+    def __init__(self, tiers: List[BaseCache], ttl: Optional[float] = None) -> None:
+        super().__init__(ttl)
+        self.tiers = tiers
+
+    def _lookup(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        for i, tier in enumerate(self.tiers):
+            entry = tier._lookup(key)
+            if entry is not None:
+                for upper in self.tiers[:i]:
+                    upper._store(key, *entry)
+                return entry
+        return None
+
+    def _store(self, key: str, value: Any, expires_at: Optional[float]):
+        for tier in self.tiers:
+            tier._store(key, value, expires_at)
+
+    def _clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+
+def create_cache(
+    max_size: int = 1024,
+    db_path: Optional[str] = None,
+    table: str = "cache",
+    ttl: Optional[float] = None,
+) -> BaseCache:
+    """
+    Return in-memory LRU cache, backed by a persistent SQLite
+    cache if `db_path` is provided.
+    """
+    lru = LRUCache(max_size=max_size, ttl=ttl)
+    if db_path is None:
+        return lru
+    return TieredCache([lru, SQLiteCache(db_path, table=table, ttl=ttl)], ttl=ttl)
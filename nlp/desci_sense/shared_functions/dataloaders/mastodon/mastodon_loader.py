@@ -1,22 +1,40 @@
 # based on https://github.com/langchain-ai/langchain/blob/master/libs/langchain/langchain/document_loaders/mastodon.py
 
-from typing import Any, Dict, Iterable, List, Optional, Sequence
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 from mastodon import Mastodon
 
 from ....configs import environ
 from .mastodon_utils import convert_post_json_to_ref_post
 from ....shared_functions.schema.post import RefPost
 
+# max. number of toots returned by the Mastodon API per page
+MAX_PAGE_SIZE = 40
+
+# max. number of converted posts buffered before workers wait for the consumer
+MAX_BUFFERED_POSTS = 1000
+
 
 class MastodonLoader:
     def __init__(
-        self, base_url: str = "https://mastodon.social", access_token: str = None
+        self,
+        base_url: str = "https://mastodon.social",
+        access_token: str = None,
+        ratelimit_method: str = "pace",
     ) -> None:
         access_token = (
             access_token if access_token else environ["MASTODON_ACCESS_TOKEN"]
         )
 
-        self.api = Mastodon(api_base_url=base_url, access_token=access_token)
+        # with "pace", requests are spread over the instance's rate limit window
+        # instead of exhausting it and then blocking until it resets
+        self.api = Mastodon(
+            api_base_url=base_url,
+            access_token=access_token,
+            ratelimit_method=ratelimit_method,
+        )
 
     def load_profiles(
         self,
@@ -24,32 +42,169 @@ class MastodonLoader:
         number_toots: Optional[int] = 5,
         exclude_replies: bool = True,
         exclude_reposts: bool = True,
+        since_ids: Optional[Dict[str, str]] = None,
+        max_workers: int = 4,
     ) -> List[RefPost]:
         """
-        Return list of posts (toots) from selected accts.
+        Return list of posts (toots) from selected accts, in the order of `mastodon_accounts`.
+        See `iter_profiles` for the arguments. Since all posts are held in memory, `number_toots`
+        defaults to the 5 latest toots per account, unlike `iter_profiles`, which streams full
+        histories by default.
+        """
+        posts_by_account = {account: [] for account in mastodon_accounts}
+        for account, post in self._iter_account_posts(
+            mastodon_accounts,
+            number_toots,
+            exclude_replies,
+            exclude_reposts,
+            since_ids,
+            max_workers,
+        ):
+            posts_by_account[account].append(post)
+        return [post for posts in posts_by_account.values() for post in posts]
+
+    def iter_profiles(
+        self,
+        mastodon_accounts: Sequence[str],
+        number_toots: Optional[int] = None,
+        exclude_replies: bool = True,
+        exclude_reposts: bool = True,
+        since_ids: Optional[Dict[str, str]] = None,
+        max_workers: int = 4,
+    ) -> Iterator[RefPost]:
+        """
+        Yield posts (toots) from selected accts as they are fetched. Accounts are fetched
+        concurrently, following the pagination of each account's statuses.
 
         Args:
             mastodon_accounts (Sequence[str]): The list of Mastodon accounts to query.
-            number_toots (Optional[int], optional): Max. amount many of toots to pull for each account. Defaults to 5.
+            number_toots (Optional[int], optional): Max. amount many of toots to pull for each account.
+                Defaults to None (full history).
             exclude_replies (bool, optional): Whether to exclude reply toots from the load.
-                Defaults to False.
+                Defaults to True.
             exclude_reposts (bool, optional): Whether to exclude reposts ("retoots") from the load.
                 Defaults to True.
+            since_ids (Optional[Dict[str, str]], optional): Checkpoint mapping accounts to the newest
+                toot id already loaded. Only newer toots are fetched, and the mapping is updated
+                in place once all of an account's new toots are fetched (not if the account had
+                more than `number_toots` new toots, which would skip the toots in between).
+                Defaults to None.
+            max_workers (int, optional): Max. number of accounts fetched concurrently. Defaults to 4.
         """
-        results: List[RefPost] = []
-        for account in mastodon_accounts:
-            user = self.api.account_lookup(account)
+        for _, post in self._iter_account_posts(
+            mastodon_accounts,
+            number_toots,
+            exclude_replies,
+            exclude_reposts,
+            since_ids,
+            max_workers,
+        ):
+            yield post
+
+    def iter_account_toots(
+        self,
+        account: str,
+        number_toots: Optional[int] = None,
+        exclude_replies: bool = True,
+        exclude_reposts: bool = True,
+        since_id: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield raw toots of `account`, newest first, one page at a time (following `max_id`),
+        until `number_toots` toots or toot `since_id` are reached.
+        """
+        user = self.api.account_lookup(account)
+        max_id = None
+        remaining = number_toots
+        while remaining is None or remaining > 0:
+            limit = (
+                MAX_PAGE_SIZE if remaining is None else min(remaining, MAX_PAGE_SIZE)
+            )
             toots = self.api.account_statuses(
                 user["id"],
                 only_media=False,
                 pinned=False,
                 exclude_replies=exclude_replies,
                 exclude_reblogs=exclude_reposts,
-                limit=number_toots,
+                max_id=max_id,
+                since_id=since_id,
+                limit=limit,
             )
-            docs = self._format_toots(toots, user)
-            results.extend(docs)
-        return results
+            if not toots:
+                return
+            yield from toots
+            if remaining is not None:
+                remaining -= len(toots)
+            max_id = toots[-1]["id"]
+
+    def _iter_account_posts(
+        self,
+        mastodon_accounts: Sequence[str],
+        number_toots: Optional[int],
+        exclude_replies: bool,
+        exclude_reposts: bool,
+        since_ids: Optional[Dict[str, str]],
+        max_workers: int,
+    ) -> Iterator[Tuple[str, RefPost]]:
+        """
+        Yield (account, post) pairs as they are fetched by the worker threads.
+        """
+        results = queue.Queue(maxsize=MAX_BUFFERED_POSTS)
+        stop = threading.Event()
+        done = object()
+
+        def put(item) -> bool:
+            # wait for the consumer, unless it stopped iterating
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def load_account(account: str):
+            try:
+                since_id = since_ids.get(account) if since_ids is not None else None
+                newest_id = since_id
+                loaded = 0
+                exhausted = True
+                # one toot more than the cap tells whether the cap cut the fetch short
+                fetch_limit = None if number_toots is None else number_toots + 1
+                for toot in self.iter_account_toots(
+                    account, fetch_limit, exclude_replies, exclude_reposts, since_id
+                ):
+                    if loaded == number_toots:
+                        exhausted = False
+                        break
+                    loaded += 1
+                    if newest_id is None or int(toot["id"]) > int(newest_id):
+                        newest_id = str(toot["id"])
+                    if not put((account, convert_post_json_to_ref_post(toot))):
+                        return
+                if since_ids is not None and newest_id is not None and exhausted:
+                    since_ids[account] = newest_id
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            for account in mastodon_accounts:
+                executor.submit(load_account, account)
+            remaining_accounts = len(mastodon_accounts)
+            while remaining_accounts > 0:
+                item = results.get()
+                if item is done:
+                    remaining_accounts -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
 
     def _format_toots(
         self, toots: List[Dict[str, Any]], user_info: dict
@@ -18,18 +18,25 @@
 """
 
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import repeat
 from typing import Optional
 from urllib.parse import urlparse
+import argparse
 import datetime
 import glob
+import hashlib
 import importlib
 import json
 import logging
 import os
 import re
 import shutil
+import sqlite3
 import subprocess
 import sys
+import threading
 import time
 
 # hot-loaded if needed, see import_module():
@@ -77,6 +84,9 @@ class PathConfig:
         self.dir_output = os.path.join(self.dir_archive, "parser-output")
         self.dir_output_media = os.path.join(self.dir_output, "media")
         self.dir_output_cache = os.path.join(self.dir_archive, "parser-cache")
+        self.file_converted_tweets_cache = os.path.join(
+            self.dir_output_cache, "converted_tweets.sqlite"
+        )
         self.file_output_following = os.path.join(self.dir_output, "following.txt")
         self.file_output_followers = os.path.join(self.dir_output, "followers.txt")
         self.file_download_log = os.path.join(self.dir_output_media, "download_log.txt")
@@ -175,6 +185,7 @@ def mkdirs_for_file(path_file):
     os.makedirs(path_dir, exist_ok=True)
 
 
+@lru_cache(maxsize=1024)
 def rel_url(media_path, document_path):
     """Computes the relative URL needed to link from `document_path` to `media_path`.
     Assumes that `document_path` points to a file (e.g. `.md` or `.html`), not a directory.
@@ -281,23 +292,17 @@ def extract_username(paths: PathConfig):
     return account[0]["account"]["username"]
 
 
+MARKDOWN_CONTROL_CHARS_PATTERN = re.compile(r"([\\_*\[\]()~`>#+\-=|{}.!])")
+
+
 def escape_markdown(input_text: str) -> str:
     """
     Escape markdown control characters from input text so that the text will not break in rendered markdown.
     (Only use on unformatted text parts that do not yet have any markdown control characters added on purpose!)
     """
-    characters_to_escape: str = r"\_*[]()~`>#+-=|{}.!"
-    output_text: str = ""
-    for char in input_text:
-        if char in characters_to_escape:
-            # add backslash before control char
-            output_text = output_text + "\\" + char
-        elif char == "\n":
-            # add double space before line break
-            output_text = output_text + "  " + char
-        else:
-            output_text = output_text + char
-    return output_text
+    # add backslash before control chars, and double space before line breaks
+    output_text = MARKDOWN_CONTROL_CHARS_PATTERN.sub(r"\\\1", input_text)
+    return output_text.replace("\n", "  \n")
 
 
 def convert_tweet(tweet, username, media_sources, users: dict, paths: PathConfig):
@@ -588,24 +593,123 @@ def find_dir_input_media(dir_path_input_data):
     return input_media_dirs[0]
 
 
-def download_file_if_larger(url, filename, index, count, sleep_time):
+class DownloadJournal:
+    """
+    Append-only log of media downloads, one JSON object per line. The last entry for a local file
+    tells whether it was already checked ("done"), failed, or was interrupted while downloading
+    ("started"), along with the HTTP validators (ETag / Last-Modified) of the remote version,
+    so that an interrupted run can be resumed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # line cut off by an interrupted run, or log of an older version of this script
+                        continue
+                    if isinstance(entry, dict) and "filename" in entry:
+                        self.entries[entry["filename"]] = entry
+        mkdirs_for_file(path)
+        self._file = open(path, "a", encoding="utf8")
+
+    def get(self, filename) -> Optional[dict]:
+        return self.entries.get(filename)
+
+    def record(self, filename, url, status, **fields) -> dict:
+        entry = {"filename": filename, "url": url, "status": status, **fields}
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self.entries[filename] = entry
+            self._file.write(line + "\n")
+            self._file.flush()
+        return entry
+
+    def close(self):
+        self._file.close()
+
+
+def download_file_if_larger(
+    url,
+    filename,
+    index,
+    count,
+    sleep_time,
+    session=None,
+    journal: Optional[DownloadJournal] = None,
+):
     """Attempts to download from the specified URL. Overwrites file if larger.
     Returns whether the file is now known to be the largest available, and the number of bytes downloaded.
+    If a `journal` is given, the outcome is recorded in it. Its entry for `filename` from a previous run
+    is used to resume an interrupted download with a range request, or otherwise to only download the
+    file if it changed since (conditional request).
     """
     requests = import_module("requests")
     imagesize = import_module("imagesize")
 
     pref = f"{index:3d}/{count:3d} {filename}: "
+    validators = {}
+    downloading = False
+
+    def finish(success, bytes_downloaded, message, level=logging.INFO):
+        logging.log(level, f"{pref}{message}")
+        if journal is not None:
+            # a download cut off midway can be resumed by the next try
+            journal.record(
+                filename,
+                url,
+                "done" if success else ("started" if downloading else "failed"),
+                bytes=bytes_downloaded,
+                message=message,
+                **validators,
+            )
+        return success, bytes_downloaded
+
     # Sleep briefly, in an attempt to minimize the possibility of trigging some auto-cutoff mechanism
-    if index > 1:
+    if index > 1 and sleep_time > 0:
         print(f"{pref}Sleeping...", end="\r")
         time.sleep(sleep_time)
     # Request the URL (in stream mode so that we can conditionally abort depending on the headers)
     print(f"{pref}Requesting headers for {url}...", end="\r")
     byte_size_before = os.path.getsize(filename)
+    tmp_filename = filename + ".tmp"
+    headers = {}
+    resume_from = 0
+    previous = journal.get(filename) if journal is not None else None
+    if previous is not None and previous["url"] == url:
+        if (
+            previous["status"] == "started"
+            and previous.get("etag")
+            and os.path.isfile(tmp_filename)
+        ):
+            # continue the interrupted download, if the remote file is still the same
+            resume_from = os.path.getsize(tmp_filename)
+            headers["Range"] = f"bytes={resume_from}-"
+            headers["If-Range"] = previous["etag"]
+        elif previous["status"] == "done":
+            if previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous.get("last_modified"):
+                headers["If-Modified-Since"] = previous["last_modified"]
     try:
-        with requests.get(url, stream=True, timeout=2) as res:
-            if not res.status_code == 200:
+        with (session or requests).get(
+            url, stream=True, timeout=2, headers=headers
+        ) as res:
+            if res.status_code == 304:
+                validators = {
+                    k: previous.get(k)
+                    for k in ["etag", "last_modified"]
+                    if previous.get(k)
+                }
+                return finish(
+                    True, 0, "SKIPPED. Online version not modified since last run."
+                )
+            if res.status_code not in (200, 206):
                 # Try to get content of response as `res.text`.
                 # For twitter.com, this will be empty in most (all?) cases.
                 # It is successfully tested with error responses from other domains.
@@ -613,14 +717,32 @@ def download_file_if_larger(url, filename, index, count, sleep_time):
                     f'Download failed with status "{res.status_code} {res.reason}". '
                     f'Response content: "{res.text}"'
                 )
-            byte_size_after = int(res.headers["content-length"])
-            if byte_size_after != byte_size_before:
+            if res.headers.get("etag"):
+                validators["etag"] = res.headers["etag"]
+            if res.headers.get("last-modified"):
+                validators["last_modified"] = res.headers["last-modified"]
+            if res.status_code == 206:
+                byte_size_after = int(res.headers["content-range"].rsplit("/", 1)[1])
+            else:
+                resume_from = 0
+                byte_size_after = int(res.headers["content-length"])
+            if byte_size_after != byte_size_before or resume_from > 0:
                 # Proceed with the full download
-                tmp_filename = filename + ".tmp"
-                print(f"{pref}Downloading {url}...            ", end="\r")
-                with open(tmp_filename, "wb") as f:
+                if journal is not None:
+                    journal.record(filename, url, "started", **validators)
+                if resume_from > 0:
+                    print(
+                        f"{pref}Resuming download of {url} at {resume_from} bytes...",
+                        end="\r",
+                    )
+                else:
+                    print(f"{pref}Downloading {url}...            ", end="\r")
+                downloading = True
+                with open(tmp_filename, "ab" if resume_from > 0 else "wb") as f:
                     shutil.copyfileobj(res.raw, f)
-                post = f"{byte_size_after/2**20:.1f}MB downloaded"
+                downloading = False
+                bytes_downloaded = byte_size_after - resume_from
+                post = f"{bytes_downloaded/2**20:.1f}MB downloaded"
                 width_before, height_before = imagesize.get(filename)
                 width_after, height_after = imagesize.get(tmp_filename)
                 pixels_before, pixels_after = (
@@ -642,11 +764,12 @@ def download_file_if_larger(url, filename, index, count, sleep_time):
                     bytes_percentage_increase = (
                         100.0 * (byte_size_after - byte_size_before) / byte_size_before
                     )
-                    logging.info(
-                        f"{pref}SUCCESS. New version is {bytes_percentage_increase:3.0f}% "
-                        f"larger in bytes (pixel comparison not possible). {post}"
+                    return finish(
+                        True,
+                        bytes_downloaded,
+                        f"SUCCESS. New version is {bytes_percentage_increase:3.0f}% "
+                        f"larger in bytes (pixel comparison not possible). {post}",
                     )
-                    return True, byte_size_after
                 elif (
                     width_before == -1
                     or height_before == -1
@@ -654,140 +777,398 @@ def download_file_if_larger(url, filename, index, count, sleep_time):
                     or height_after == -1
                 ):
                     # could not check size of one version, this should not happen (corrupted download?)
-                    logging.info(
-                        f"{pref}SKIPPED. Pixel size comparison inconclusive: "
-                        f"{width_before}*{height_before}px vs. {width_after}*{height_after}px. {post}"
+                    return finish(
+                        False,
+                        bytes_downloaded,
+                        f"SKIPPED. Pixel size comparison inconclusive: "
+                        f"{width_before}*{height_before}px vs. {width_after}*{height_after}px. {post}",
                     )
-                    return False, byte_size_after
                 elif pixels_after >= pixels_before:
                     os.replace(tmp_filename, filename)
                     bytes_percentage_increase = (
                         100.0 * (byte_size_after - byte_size_before) / byte_size_before
                     )
                     if bytes_percentage_increase >= 0:
-                        logging.info(
-                            f"{pref}SUCCESS. New version is {bytes_percentage_increase:3.0f}% larger in bytes "
-                            f"and {pixels_percentage_increase:3.0f}% larger in pixels. {post}"
+                        return finish(
+                            True,
+                            bytes_downloaded,
+                            f"SUCCESS. New version is {bytes_percentage_increase:3.0f}% larger in bytes "
+                            f"and {pixels_percentage_increase:3.0f}% larger in pixels. {post}",
                         )
                     else:
-                        logging.info(
-                            f"{pref}SUCCESS. New version is actually {-bytes_percentage_increase:3.0f}% "
+                        return finish(
+                            True,
+                            bytes_downloaded,
+                            f"SUCCESS. New version is actually {-bytes_percentage_increase:3.0f}% "
                             f"smaller in bytes but {pixels_percentage_increase:3.0f}% "
-                            f"larger in pixels. {post}"
+                            f"larger in pixels. {post}",
                         )
-                    return True, byte_size_after
                 else:
-                    logging.info(
-                        f"{pref}SKIPPED. Online version has {-pixels_percentage_increase:3.0f}% "
-                        f"smaller pixel size. {post}"
+                    return finish(
+                        True,
+                        bytes_downloaded,
+                        f"SKIPPED. Online version has {-pixels_percentage_increase:3.0f}% "
+                        f"smaller pixel size. {post}",
                     )
-                    return True, byte_size_after
             else:
-                logging.info(
-                    f"{pref}SKIPPED. Online version is same byte size, assuming same content. Not downloaded."
+                return finish(
+                    True,
+                    0,
+                    "SKIPPED. Online version is same byte size, assuming same content. Not downloaded.",
                 )
-                return True, 0
     except Exception as err:
-        logging.error(
-            f"{pref}FAIL. Media couldn't be retrieved from {url} because of exception: {err}"
+        return finish(
+            False,
+            0,
+            f"FAIL. Media couldn't be retrieved from {url} because of exception: {err}",
+            level=logging.ERROR,
+        )
+
+
+def format_time_remaining(seconds: float) -> str:
+    """Formats an estimated remaining time, e.g. '2 minutes 5 seconds'."""
+    estimated_time_remaining: datetime.datetime = datetime.datetime.fromtimestamp(
+        seconds, tz=datetime.timezone.utc
+    )
+    if estimated_time_remaining.hour >= 1:
+        return (
+            f"{estimated_time_remaining.hour} hour{'' if estimated_time_remaining.hour == 1 else 's'} "
+            f"{estimated_time_remaining.minute} minute{'' if estimated_time_remaining.minute == 1 else 's'}"
         )
-        return False, 0
+    elif estimated_time_remaining.minute >= 1:
+        return (
+            f"{estimated_time_remaining.minute} minute{'' if estimated_time_remaining.minute == 1 else 's'} "
+            f"{estimated_time_remaining.second} second{'' if estimated_time_remaining.second == 1 else 's'}"
+        )
+    else:
+        return f"{estimated_time_remaining.second} second{'' if estimated_time_remaining.second == 1 else 's'}"
 
 
-def download_larger_media(media_sources, paths: PathConfig):
+def download_larger_media(
+    media_sources,
+    paths: PathConfig,
+    max_workers: int = 16,
+    max_connections_per_host: int = 4,
+    sleep_time: float = 0.25,
+    resume: bool = True,
+) -> dict:
     """Uses (filename, URL) tuples in media_sources to download files from remote storage.
     Aborts downloads if the remote file is the same size or smaller than the existing local version.
     Retries the failed downloads several times, with increasing pauses between each to avoid being blocked.
+
+    Downloads run in a pool of `max_workers` threads, with at most `max_connections_per_host`
+    concurrent requests to the same host. Progress is journaled to paths.file_download_log: with `resume`,
+    files already handled in a previous (possibly interrupted) run are skipped, otherwise they are
+    checked again with conditional requests. Returns a report of the download counts and throughput.
     """
-    # Log to file as well as the console
+    requests = import_module("requests")
     logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(message)s")
-    mkdirs_for_file(paths.file_download_log)
-    logfile_handler = logging.FileHandler(filename=paths.file_download_log, mode="w")
-    logfile_handler.setLevel(logging.INFO)
-    logging.getLogger().addHandler(logfile_handler)
+    journal = DownloadJournal(paths.file_download_log)
+
+    number_of_sources = len(media_sources)
+    if resume:
+        media_sources = [
+            (local_media_path, media_url)
+            for local_media_path, media_url in media_sources
+            if not (
+                journal.get(local_media_path) is not None
+                and journal.get(local_media_path)["status"] == "done"
+                and journal.get(local_media_path)["url"] == media_url
+            )
+        ]
+    number_of_resumed = number_of_sources - len(media_sources)
+    if number_of_resumed > 0:
+        logging.info(
+            f"Skipping {number_of_resumed} media files already handled according to {paths.file_download_log}"
+        )
+
+    # Limit concurrent requests per host, to avoid being blocked
+    host_limits = {
+        urlparse(media_url).netloc: threading.BoundedSemaphore(
+            max_connections_per_host
+        )
+        for _, media_url in media_sources
+    }
+
+    def download(index, local_media_path, media_url, count, sleep_time):
+        with host_limits[urlparse(media_url).netloc]:
+            return download_file_if_larger(
+                media_url,
+                local_media_path,
+                index,
+                count,
+                sleep_time,
+                session=session,
+                journal=journal,
+            )
+
     # Download new versions
     start_time = time.time()
     total_bytes_downloaded = 0
-    sleep_time = 0.25
+    success_count = 0
     remaining_tries = 5
-    while remaining_tries > 0:
-        number_of_files = len(media_sources)
-        success_count = 0
-        retries = []
-        for index, (local_media_path, media_url) in enumerate(media_sources):
-            success, bytes_downloaded = download_file_if_larger(
-                media_url, local_media_path, index + 1, number_of_files, sleep_time
-            )
-            if success:
-                success_count += 1
-            else:
-                retries.append((local_media_path, media_url))
-            total_bytes_downloaded += bytes_downloaded
-
-            # show % done and estimated remaining time:
-            time_elapsed: float = time.time() - start_time
-            estimated_time_per_file: float = time_elapsed / (index + 1)
-            estimated_time_remaining: datetime.datetime = (
-                datetime.datetime.fromtimestamp(
-                    (number_of_files - (index + 1)) * estimated_time_per_file,
-                    tz=datetime.timezone.utc,
-                )
-            )
-            if estimated_time_remaining.hour >= 1:
-                time_remaining_string: str = (
-                    f"{estimated_time_remaining.hour} hour{'' if estimated_time_remaining.hour == 1 else 's'} "
-                    f"{estimated_time_remaining.minute} minute{'' if estimated_time_remaining.minute == 1 else 's'}"
-                )
-            elif estimated_time_remaining.minute >= 1:
-                time_remaining_string: str = (
-                    f"{estimated_time_remaining.minute} minute{'' if estimated_time_remaining.minute == 1 else 's'} "
-                    f"{estimated_time_remaining.second} second{'' if estimated_time_remaining.second == 1 else 's'}"
-                )
-            else:
-                time_remaining_string: str = f"{estimated_time_remaining.second} second{'' if estimated_time_remaining.second == 1 else 's'}"
-
-            if index + 1 == number_of_files:
-                print("    100 % done.")
-            else:
-                print(
-                    f"    {(100*(index+1)/number_of_files):.1f} % done, about {time_remaining_string} remaining..."
-                )
+    try:
+        with requests.Session() as session:
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                while remaining_tries > 0 and media_sources:
+                    number_of_files = len(media_sources)
+                    tries_start_time = time.time()
+                    retries = []
+                    futures = {
+                        executor.submit(
+                            download,
+                            index + 1,
+                            local_media_path,
+                            media_url,
+                            number_of_files,
+                            sleep_time,
+                        ): (local_media_path, media_url)
+                        for index, (local_media_path, media_url) in enumerate(
+                            media_sources
+                        )
+                    }
+                    for done_count, future in enumerate(as_completed(futures), start=1):
+                        success, bytes_downloaded = future.result()
+                        if success:
+                            success_count += 1
+                        else:
+                            retries.append(futures[future])
+                        total_bytes_downloaded += bytes_downloaded
+
+                        # show % done and estimated remaining time:
+                        time_elapsed: float = time.time() - tries_start_time
+                        estimated_time_per_file: float = time_elapsed / done_count
+                        if done_count == number_of_files:
+                            print("    100 % done.")
+                        else:
+                            time_remaining_string = format_time_remaining(
+                                (number_of_files - done_count) * estimated_time_per_file
+                            )
+                            print(
+                                f"    {(100*done_count/number_of_files):.1f} % done, about {time_remaining_string} remaining..."
+                            )
 
-        media_sources = retries
-        remaining_tries -= 1
-        sleep_time += 2
-        logging.info(
-            f"\n{success_count} of {number_of_files} tested media files "
-            f"are known to be the best-quality available.\n"
-        )
-        if len(retries) == 0:
-            break
-        if remaining_tries > 0:
-            print(
-                f"----------------------\n\nRetrying the ones that failed, with a longer sleep. "
-                f"{remaining_tries} tries remaining.\n"
-            )
+                    media_sources = retries
+                    remaining_tries -= 1
+                    sleep_time += 2
+                    logging.info(
+                        f"\n{number_of_files - len(retries)} of {number_of_files} tested media files "
+                        f"are known to be the best-quality available.\n"
+                    )
+                    if len(retries) > 0 and remaining_tries > 0:
+                        print(
+                            f"----------------------\n\nRetrying the ones that failed, with a longer sleep. "
+                            f"{remaining_tries} tries remaining.\n"
+                        )
+    finally:
+        journal.close()
     end_time = time.time()
 
+    time_taken = max(end_time - start_time, 1e-9)
+    report = {
+        "files": number_of_sources,
+        "resumed": number_of_resumed,
+        "succeeded": success_count,
+        "failed": len(media_sources),
+        "bytes_downloaded": total_bytes_downloaded,
+        "seconds": time_taken,
+        "bytes_per_second": total_bytes_downloaded / time_taken,
+        "files_per_second": (number_of_sources - number_of_resumed) / time_taken,
+    }
     logging.info(
         f"Total downloaded: {total_bytes_downloaded/2**20:.1f}MB = {total_bytes_downloaded/2**30:.2f}GB"
     )
     logging.info(f"Time taken: {end_time-start_time:.0f}s")
-    print(f"Wrote log to {paths.file_download_log}")
+    logging.info(
+        f"Throughput: {report['bytes_per_second']/2**20:.2f}MB/s, "
+        f"{report['files_per_second']:.1f} files/s"
+    )
+    print(f"Wrote download journal to {paths.file_download_log}")
+    return report
+
+
+def get_tweet_content_hash(tweet: dict, username: str) -> str:
+    """Returns a hash of the tweet's JSON content, used to detect changed tweets in the conversion cache."""
+    content = json.dumps([username, tweet], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def convert_tweets_chunk(chunk: list, username, paths: PathConfig) -> list:
+    """Converts a chunk of (tweet id, content hash, tweet) tuples, e.g. in a worker process.
+    Instead of updating shared state, the media sources and users found in each tweet are
+    returned along with its conversion, so they can be merged by the caller and cached."""
+    converted = []
+    for tweet_id, content_hash, tweet in chunk:
+        media_sources = []
+        users = {}
+        timestamp, md, html = convert_tweet(
+            tweet, username, media_sources, users, paths
+        )
+        converted.append(
+            (
+                tweet_id,
+                {
+                    "hash": content_hash,
+                    "timestamp": timestamp,
+                    "md": md,
+                    "html": html,
+                    "media_sources": [list(source) for source in media_sources],
+                    "users": [[user.user_id, user.handle] for user in users.values()],
+                },
+            )
+        )
+    return converted
+
+
+def get_file_content_hash(filename: str, username: str) -> str:
+    """Returns a hash of the raw bytes of an input file, used to skip hashing its tweets one by one
+    when the file didn't change since the previous run."""
+    sha1 = hashlib.sha1(username.encode("utf-8"))
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+class ConvertedTweetsCache:
+    """
+    Tweets converted in previous runs, stored in a SQLite database with one row per tweet id,
+    along with the content hashes of the input files they were read from. Only new or changed
+    conversions are written back, instead of rewriting the whole cache.
+    """
+
+    def __init__(self, path):
+        mkdirs_for_file(path)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tweets (id TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, hash TEXT NOT NULL)"
+            )
+
+    def get(self, tweet_id) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT value FROM tweets WHERE id = ?", (tweet_id,)
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def get_file_hash(self, filename) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT hash FROM files WHERE path = ?", (filename,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def update(self, converted: list, file_hashes: dict):
+        """Upserts the (tweet id, conversion) pairs in `converted`, then records `file_hashes`."""
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tweets (id, value) VALUES (?, ?)",
+                (
+                    (tweet_id, json.dumps(entry, ensure_ascii=False))
+                    for tweet_id, entry in converted
+                ),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (path, hash) VALUES (?, ?)",
+                file_hashes.items(),
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+def is_cached_conversion_valid(cached: Optional[dict], content_hash: str) -> bool:
+    """Returns whether a cached conversion matches the tweet content and its media files are still in place."""
+    return (
+        cached is not None
+        and cached["hash"] == content_hash
+        and all(os.path.isfile(path) for path, _ in cached["media_sources"])
+    )
 
 
-def parse_tweets(username, users, paths: PathConfig):
+def parse_tweets(
+    username,
+    users,
+    paths: PathConfig,
+    processes: int = 1,
+    chunk_size: int = 1000,
+    use_cache: bool = True,
+    media_sources: Optional[list] = None,
+):
     """Read tweets from paths.files_input_tweets, write to *.md and *.html.
     Copy the media used to paths.dir_output_media.
     Collect user_id:user_handle mappings for later use, in 'users'.
-    Returns the mapping from media filename to best-quality URL.
+    Collect the (local media path, best-quality URL) tuples of the media used, in 'media_sources' if given.
+    Returns the converted tweets as (timestamp, md, html) tuples, oldest first.
+
+    Converted tweets are cached in paths.dir_output_cache by tweet id and content hash, so that
+    running again on an updated archive only converts new or changed tweets (unless `use_cache` is False).
+    Tweets of input files that didn't change since the previous run are not hashed again.
+    If `processes` > 1, tweets are converted in a pool of that many processes, in chunks of `chunk_size` tweets.
     """
-    tweets = []
-    media_sources = []
+    cache = (
+        ConvertedTweetsCache(paths.file_converted_tweets_cache) if use_cache else None
+    )
+    # keeps archive order, with None for tweets that still need to be converted
+    converted = {}
+    pending = []
+    file_hashes = {}
     for tweets_js_filename in paths.files_input_tweets:
-        json = read_json_from_js_file(tweets_js_filename)
-        for tweet in json:
-            tweets.append(convert_tweet(tweet, username, media_sources, users, paths))
+        file_unchanged = False
+        if cache is not None:
+            file_hash = get_file_content_hash(tweets_js_filename, username)
+            file_unchanged = cache.get_file_hash(tweets_js_filename) == file_hash
+            file_hashes[tweets_js_filename] = file_hash
+        for tweet in read_json_from_js_file(tweets_js_filename):
+            tweet_id = tweet.get("tweet", tweet)["id_str"]
+            cached = cache.get(tweet_id) if cache is not None else None
+            if file_unchanged and cached is not None:
+                content_hash = cached["hash"]
+            else:
+                content_hash = get_tweet_content_hash(tweet, username)
+            if is_cached_conversion_valid(cached, content_hash):
+                converted[tweet_id] = cached
+            else:
+                converted[tweet_id] = None
+                pending.append((tweet_id, content_hash, tweet))
+    print(
+        f"Found {len(converted) - len(pending)} converted tweets in cache, "
+        f"converting {len(pending)} tweets..."
+    )
+
+    pending_chunks = chunks(pending, chunk_size)
+    newly_converted = []
+    if processes > 1 and len(pending) > chunk_size:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for chunk_converted in executor.map(
+                convert_tweets_chunk, pending_chunks, repeat(username), repeat(paths)
+            ):
+                newly_converted.extend(chunk_converted)
+    else:
+        for chunk in pending_chunks:
+            newly_converted.extend(convert_tweets_chunk(chunk, username, paths))
+    converted.update(newly_converted)
+
+    if cache is not None:
+        try:
+            cache.update(newly_converted, file_hashes)
+        finally:
+            cache.close()
+
+    tweets = []
+    if media_sources is None:
+        media_sources = []
+    for entry in converted.values():
+        tweets.append((entry["timestamp"], entry["md"], entry["html"]))
+        media_sources.extend(tuple(source) for source in entry["media_sources"])
+        for user_id, handle in entry["users"]:
+            users[user_id] = UserData(user_id=user_id, handle=handle)
     tweets.sort(key=lambda tup: tup[0])  # oldest first
 
     # # Group tweets by month
@@ -1790,6 +2171,15 @@ def find_archive():
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Parse a Twitter archive.")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=os.cpu_count(),
+        help="number of processes converting tweets (default: number of CPUs)",
+    )
+    args = parser.parse_args()
+
     archive_path = find_archive()
     paths = PathConfig(dir_archive=archive_path)
 
@@ -1798,24 +2188,6 @@ def main():
 
     user_id_url_template = "https://twitter.com/i/user/{}"
 
-    html_template = """\
-<!doctype html>
-<html lang="en">
-<head>
-    <meta charset="utf-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1">
-    <link rel="stylesheet"
-          href="https://unpkg.com/@picocss/pico@latest/css/pico.min.css">
-    <title>Your Twitter archive!</title>
-</head>
-<body>
-    <h1>Your twitter archive</h1>
-    <main class="container">
-    {}
-    </main>
-</body>
-</html>"""
-
     users = {}
 
     migrate_old_output(paths)
@@ -1825,7 +2197,10 @@ def main():
     if not os.path.isfile(paths.file_tweet_icon):
         shutil.copy("assets/images/favicon.ico", paths.file_tweet_icon)
 
-    media_sources = parse_tweets(username, users, html_template, paths)
+    media_sources = []
+    parse_tweets(
+        username, users, paths, processes=args.processes, media_sources=media_sources
+    )
 
     following_ids = collect_user_ids_from_followings(paths)
     print(f"found {len(following_ids)} user IDs in followings.")
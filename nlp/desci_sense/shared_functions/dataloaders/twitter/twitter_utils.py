@@ -117,16 +117,14 @@ def extract_external_ref_urls(tweet: dict, add_qrt_url: bool = True):
     Shortened URLs are expanded to long form.
     Quote Retweets (QRTs) are treated by default as an external URL. (disable by setting `add_qrt_url`=False)
     """
+    # urls extracted from the text are already normalized
     urls = extract_and_expand_urls(tweet["text"])
 
     # add qrt url if this was a qrt
     if add_qrt_url:
         qrt_url = tweet.get("qrtURL", None)
         if qrt_url:
-            urls += [qrt_url]
-
-    # normalize urls
-    urls = [normalize_url(u) for u in urls]
+            urls += [normalize_url(qrt_url)]
 
     external = set()
     for url in urls:
@@ -0,0 +1,167 @@
+import re
+import time
+import random
+import asyncio
+import hashlib
+import itertools
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr
+
+# `openai_api_base` scheme or `model_name` prefix selecting the fake model,
+# e.g. "fake://llm?latency=0.5&jitter=0.1" or "fake/llm"
+FAKE_API_BASE_SCHEME = "fake"
+FAKE_MODEL_PREFIX = "fake/"
+
+# tag type definitions listed in the semantics prompts, e.g. "<dg-claim>: ..."
+PROMPT_TAG_PATTERN = re.compile(r"^\s*<([\w-]+)>:", re.MULTILINE)
+PROMPT_CONTENT_PATTERN = re.compile(r"^\s*Content:(.*)$", re.MULTILINE)
+WORD_PATTERN = re.compile(r"[A-Za-z][\w-]{3,}")
+
+# max. tags and keywords in templated completions
+MAX_FAKE_TAGS = 2
+MAX_FAKE_KEYWORDS = 3
+
+
+def is_fake_model(model_name: str, api_base: Optional[str]) -> bool:
+    return model_name.startswith(FAKE_MODEL_PREFIX) or (
+        api_base is not None and urlparse(api_base).scheme == FAKE_API_BASE_SCHEME
+    )
+
+
+def get_fake_model_params(api_base: Optional[str]) -> Dict[str, float]:
+    """Read fake model parameters (latency, jitter, seed) from the `api_base` query string."""
+    if api_base is None or urlparse(api_base).scheme != FAKE_API_BASE_SCHEME:
+        return {}
+    query = parse_qs(urlparse(api_base).query)
+    return {
+        k: float(query[k][0]) for k in ["latency", "jitter", "seed"] if k in query
+    }
+
+
+def create_templated_completion(prompt: str) -> str:
+    """
+    Return a completion in the `Reasoning Steps / Candidate Tags / Final Answer`
+    format, deterministic for `prompt`. Tags are picked among the tag types defined
+    in the prompt, and keywords among the words of the post content.
+    """
+    digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+
+    tags = PROMPT_TAG_PATTERN.findall(prompt)
+    if tags:
+        n_tags = 1 + digest % min(MAX_FAKE_TAGS, len(tags))
+        start = digest % len(tags)
+        tags = [tags[(start + i) % len(tags)] for i in range(n_tags)]
+
+    contents = PROMPT_CONTENT_PATTERN.findall(prompt)
+    words = WORD_PATTERN.findall(contents[-1]) if contents else []
+    keywords = list(dict.fromkeys(w.lower() for w in words))[:MAX_FAKE_KEYWORDS]
+
+    tags_text = ", ".join(f"<{tag}>" for tag in tags)
+    keywords_text = " ".join(f"#{kw}" for kw in keywords)
+    return (
+        f"Reasoning Steps: Offline completion for a prompt of {len(prompt)} characters.\n"
+        f"Candidate Tags: {tags_text} {keywords_text}\n"
+        f"Final Answer: {tags_text} {keywords_text}"
+    )
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for the OpenAI chat model, e.g. for measuring the overhead of
+    the parser pipeline. Returns `responses` in turn if provided, otherwise a
+    completion templated from the prompt (see `create_templated_completion`),
+    after `latency` +/- `jitter` seconds.
+    """
+
+    model_name: str = "fake/llm"
+    temperature: float = 0.0
+    responses: Optional[List[str]] = None
+    latency: float = 0.0
+    jitter: float = 0.0
+    seed: int = 0
+    # size in characters of the streamed chunks
+    chunk_size: int = 16
+
+    _rng: random.Random = PrivateAttr(default=None)
+    # index of the next response, shared by concurrent calls (`next` is atomic)
+    _counter: Iterator[int] = PrivateAttr(default=None)
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+        self._counter = itertools.count()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "latency": self.latency}
+
+    def get_delay(self) -> float:
+        return max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+
+    def get_completion(self, messages: List[BaseMessage]) -> str:
+        if self.responses:
+            return self.responses[next(self._counter) % len(self.responses)]
+        prompt = "\n".join(str(m.content) for m in messages)
+        return create_templated_completion(prompt)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.get_delay())
+        message = AIMessage(content=self.get_completion(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.get_delay())
+        message = AIMessage(content=self.get_completion(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        # latency is spent before the first chunk (time to first token)
+        time.sleep(self.get_delay())
+        completion = self.get_completion(messages)
+        for i in range(0, len(completion), self.chunk_size):
+            chunk = completion[i : i + self.chunk_size]
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.get_delay())
+        completion = self.get_completion(messages)
+        for i in range(0, len(completion), self.chunk_size):
+            chunk = completion[i : i + self.chunk_size]
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
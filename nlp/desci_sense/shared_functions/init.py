@@ -1,10 +1,20 @@
-from typing import List, TypedDict, Any, Optional
+import json
+import hashlib
+from typing import TYPE_CHECKING, List, TypedDict, Any, Optional
 
-from confection import Config
 from loguru import logger
 
+if TYPE_CHECKING:
+    from confection import Config
+
 MAX_SUMMARY_LENGTH = 500
 
+# default max number of posts parsed concurrently in a batch
+BATCH_MAX_CONCURRENCY = 8
+
+# upper bound of the `max_concurrency` requested for a batch
+BATCH_MAX_CONCURRENCY_LIMIT = 32
+
 
 class ParserInitConfig(TypedDict, total=True):
     wandb_project: str
@@ -34,6 +44,14 @@ class ParserInitConfigOptional(TypedDict, total=False):
     kw_ref_metadata_method: str
     max_keywords: int
     keyword_extraction_model: str
+    enable_llm_cache: bool
+    llm_cache_db_path: str
+    llm_cache_ttl: float
+    llm_cache_max_size: int
+    llm_cache_deterministic_only: bool
+    stream_answers: bool
+    record_timings: bool
+    enable_otel_tracing: bool
 
 
 def init_multi_stage_parser_config(
@@ -53,6 +71,14 @@ def init_multi_stage_parser_config(
         "kw_ref_metadata_method": "citoid",
         "max_keywords": 6,
         "keyword_extraction_model": "openai/gpt-4",
+        "enable_llm_cache": False,
+        "llm_cache_db_path": None,
+        "llm_cache_ttl": None,
+        "llm_cache_max_size": 1024,
+        "llm_cache_deterministic_only": False,
+        "stream_answers": False,
+        "record_timings": False,
+        "enable_otel_tracing": False,
     }
 
     if optional is None:
@@ -62,12 +88,15 @@ def init_multi_stage_parser_config(
 
     # logger.info(f"config {{}}", config)
 
+    from confection import Config
+
     parser_config = Config(
         {
             "general": {
                 "parser_type": config["parser_type"],
                 "ref_metadata_method": config["ref_metadata_method"],
                 "max_summary_length": config["max_summary_length"],
+                "stream_answers": config["stream_answers"],
             },
             "openai_api": {
                 "openai_api_base": config["openai_api_base"],
@@ -92,6 +121,17 @@ def init_multi_stage_parser_config(
                     "temperature": config["temperature"],
                 },
             },
+            "llm_cache": {
+                "enabled": config["enable_llm_cache"],
+                "db_path": config["llm_cache_db_path"],
+                "ttl": config["llm_cache_ttl"],
+                "max_size": config["llm_cache_max_size"],
+                "deterministic_only": config["llm_cache_deterministic_only"],
+            },
+            "tracing": {
+                "timings": config["record_timings"],
+                "opentelemetry": config["enable_otel_tracing"],
+            },
             "wandb": {
                 "entity": config["wandb_entity"],
                 "project": config["wandb_project"],
@@ -99,3 +139,13 @@ def init_multi_stage_parser_config(
         }
     )
     return parser_config
+
+
+def get_config_fingerprint(config: "Config") -> str:
+    """
+    Return a stable hash of a parser config. Two configs with the same
+    fingerprint build identical parsers, so the fingerprint can be used
+    as a cache key for parser instances.
+    """
+    serialized = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
@@ -1,3 +1,4 @@
+from enum import Enum
 from typing import Optional, List, Dict, TypedDict, Union, Any
 from pydantic import (
     Field,
@@ -10,6 +11,8 @@ from pydantic import (
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from rdflib import URIRef, Literal, Graph
 
+from .rdf_writer import serialize_turtle, serialize_nt, serialize_json_triples
+
 
 # TODO fix using alias for env var default loading
 class NotionOntologyConfig(BaseSettings):
@@ -161,6 +164,10 @@ class ParserSupport(BaseModel):
         default_factory=dict,
         description="Metadata info, keyed by URL. (if extracted)",
     )
+    timings: Optional[Dict[str, float]] = Field(
+        default=None,
+        description="Duration in ms of each parser stage. (if enabled)",
+    )
 
 
 class ParserResult(BaseModel):
@@ -177,7 +184,7 @@ class ParserResult(BaseModel):
 
     @field_serializer("semantics")
     def graph_serializer(graph: Graph):
-        return graph.serialize(format="turtle")
+        return serialize_turtle(graph)
 
     @field_validator(
         "semantics", mode="before"
@@ -193,6 +200,69 @@ class ParserResult(BaseModel):
         raise ValueError("Invalid graph format")
 
 
+class ResponseFormat(str, Enum):
+    # ParserResult with inlined ontology and Turtle semantics
+    FULL = "full"
+    # CompactParserResult
+    COMPACT = "compact"
+
+
+class SemanticsFormat(str, Enum):
+    NT = "nt"
+    JSON = "json"
+
+
+class CompactParserSupport(BaseModel):
+    ontology_version: str = Field(
+        description="Version hash of the ontology used by NLP module \
+            (the ontology itself is served separately)"
+    )
+    refs_meta: Dict[str, RefMetadata] = Field(
+        default_factory=dict,
+        description="Metadata info, keyed by URL. (if extracted)",
+    )
+    timings: Optional[Dict[str, float]] = Field(
+        default=None,
+        description="Duration in ms of each parser stage. (if enabled)",
+    )
+
+
+class CompactParserResult(BaseModel):
+    """
+    Compact alternative to ParserResult: references the ontology by version hash
+    and encodes the semantics as N-Triples or a JSON list of triples.
+    """
+
+    semantics: Union[str, List[List[Any]]] = Field(
+        description="Triplets identified by the parser, in `semantics_format`"
+    )
+    semantics_format: SemanticsFormat = Field(default=SemanticsFormat.NT)
+    support: CompactParserSupport
+
+    @classmethod
+    def from_result(
+        cls,
+        result: ParserResult,
+        ontology_version: str,
+        semantics_format: SemanticsFormat = SemanticsFormat.NT,
+    ) -> "CompactParserResult":
+        semantics_format = SemanticsFormat(semantics_format)
+        if semantics_format == SemanticsFormat.NT:
+            semantics = serialize_nt(result.semantics)
+        else:
+            semantics = serialize_json_triples(result.semantics)
+
+        return cls(
+            semantics=semantics,
+            semantics_format=semantics_format,
+            support=CompactParserSupport(
+                ontology_version=ontology_version,
+                refs_meta=result.support.refs_meta,
+                timings=result.support.timings,
+            ),
+        )
+
+
 # TODO remove - changed to RefMetadata
 class RefMeta(TypedDict):
     title: str
@@ -0,0 +1,217 @@
+import json
+import hashlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    get_buffer_string,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .cache import BaseCache, create_cache
+
+
+def create_llm_cache(cache_config: dict) -> Optional[BaseCache]:
+    """
+    Create LLM response cache from the `llm_cache` config section,
+    or return None if caching is disabled.
+    """
+    if not cache_config or not cache_config.get("enabled", False):
+        return None
+    return create_cache(
+        max_size=cache_config.get("max_size", 1024),
+        db_path=cache_config.get("db_path"),
+        table="llm_responses",
+        ttl=cache_config.get("ttl"),
+    )
+
+
+class CachedChatModel(BaseChatModel):
+    """
+    Chat model delegating to `model`, with completions cached by hash of the rendered
+    prompt, the model parameters and `namespace` (e.g. the ontology version).
+    If `deterministic_only` is set, completions are only cached for models
+    running at temperature 0.
+
+    Generation, streaming and callbacks go through the wrapped model. A stream the
+    consumer stops reading early (e.g. after the final answer, see
+    `FinalAnswerStreamParser.stop_at_answer`) is cached as partial, and partial
+    completions are only replayed to streams.
+    """
+
+    model: BaseChatModel
+    response_cache: BaseCache
+    namespace: str = ""
+    deterministic_only: bool = False
+    # responses are cached in `response_cache`, not in LangChain's global cache
+    cache: Optional[bool] = False
+
+    def __init__(self, model: BaseChatModel, response_cache: BaseCache, **kwargs):
+        super().__init__(model=model, response_cache=response_cache, **kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cached-{self.model._llm_type}"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {**self.model._identifying_params, "namespace": self.namespace}
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.model, "model_name", type(self.model).__name__)
+
+    @property
+    def temperature(self) -> Optional[float]:
+        return getattr(self.model, "temperature", None)
+
+    @property
+    def cache_enabled(self) -> bool:
+        return not self.deterministic_only or self.temperature == 0
+
+    def get_cache_key(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> str:
+        """Return cache key of a call with `messages`, `stop` and call `kwargs`."""
+        prompt = get_buffer_string(messages)
+        key_data = [
+            prompt,
+            self.model_name,
+            self.temperature,
+            self.namespace,
+            stop,
+            sorted(kwargs.items()),
+        ]
+        serialized = json.dumps(key_data, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get_cached(self, key: str, complete_only: bool = True) -> Optional[str]:
+        if not self.cache_enabled:
+            return None
+        cached = self.response_cache.get(key)
+        if cached is None or (complete_only and not cached["complete"]):
+            return None
+        return cached["content"]
+
+    def set_cached(self, key: str, content: str, complete: bool = True):
+        if self.cache_enabled:
+            self.response_cache.set(key, {"content": content, "complete": complete})
+
+    @staticmethod
+    def to_result(content: str) -> ChatResult:
+        message = AIMessage(content=content)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @property
+    def model_streams(self) -> bool:
+        return type(self.model)._stream != BaseChatModel._stream
+
+    @property
+    def model_astreams(self) -> bool:
+        return type(self.model)._astream != BaseChatModel._astream
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key = self.get_cache_key(messages, stop, **kwargs)
+        cached = self.get_cached(key)
+        if cached is not None:
+            return self.to_result(cached)
+
+        result = self.model._generate(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+        self.set_cached(key, result.generations[0].message.content)
+        return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key = self.get_cache_key(messages, stop, **kwargs)
+        cached = self.get_cached(key)
+        if cached is not None:
+            return self.to_result(cached)
+
+        result = await self.model._agenerate(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+        self.set_cached(key, result.generations[0].message.content)
+        return result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        key = self.get_cache_key(messages, stop, **kwargs)
+        cached = self.get_cached(key, complete_only=False)
+        if cached is None and not self.model_streams:
+            # model doesn't stream, generate in one go
+            result = self._generate(messages, stop, run_manager, **kwargs)
+            cached = result.generations[0].message.content
+        if cached is not None:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=cached))
+            return
+
+        content = []
+        try:
+            for chunk in self.model._stream(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                content.append(chunk.text)
+                yield chunk
+        except GeneratorExit:
+            # consumer stopped reading
+            self.set_cached(key, "".join(content), complete=False)
+            raise
+        self.set_cached(key, "".join(content))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        key = self.get_cache_key(messages, stop, **kwargs)
+        cached = self.get_cached(key, complete_only=False)
+        if cached is None and not self.model_astreams:
+            # model doesn't stream, generate in one go
+            result = await self._agenerate(messages, stop, run_manager, **kwargs)
+            cached = result.generations[0].message.content
+        if cached is not None:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=cached))
+            return
+
+        content = []
+        try:
+            async for chunk in self.model._astream(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                content.append(chunk.text)
+                yield chunk
+        except GeneratorExit:
+            # consumer stopped reading
+            self.set_cached(key, "".join(content), complete=False)
+            raise
+        self.set_cached(key, "".join(content))
@@ -1,10 +1,44 @@
-from typing import TypedDict, Any
+# Entry point of the parser cloud functions. Importing this module must stay
+# cheap (see tests/test_import_time.py): langchain, pandas, rdflib, aiohttp etc.
+# are only imported when a parser is first built or used.
+import json
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import (
+    TYPE_CHECKING,
+    TypedDict,
+    Any,
+    AsyncIterator,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from loguru import logger
 
-from .parsers.firebase_api_parser import FirebaseAPIParser
-from .init import init_multi_stage_parser_config
-from .interface import ParserResult
+from .init import (
+    init_multi_stage_parser_config,
+    get_config_fingerprint,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_MAX_CONCURRENCY_LIMIT,
+)
+
+if TYPE_CHECKING:
+    from confection import Config
+    from .parsers.firebase_api_parser import FirebaseAPIParser
+    from .interface import ParserResult
+
+# max number of distinct parser configs kept warm per process
+MAX_CACHED_PARSERS = 4
+
+_parser_registry: "OrderedDict[str, FirebaseAPIParser]" = OrderedDict()
+_parser_registry_lock = threading.Lock()
+
+# (version hash, JSON) of the ontology, built on first request
+_ontology_response: Optional[Tuple[str, str]] = None
 
 
 class SM_FUNCTION_post_parser_config(TypedDict, total=True):
@@ -15,18 +49,197 @@ class SM_FUNCTION_post_parser_config(TypedDict, total=True):
     openai_api_referer: int
 
 
-def SM_FUNCTION_post_parser_imp(content, parameters, config) -> ParserResult:
-    paserConfig = init_multi_stage_parser_config(config, {})
+def get_parser(parser_config: "Config") -> "FirebaseAPIParser":
+    """
+    Return a FirebaseAPIParser for `parser_config`, building it only on first use.
+
+    Parsers are kept per process and keyed by config fingerprint, so warm
+    instances reuse the models, ontology and chains across requests, and a
+    changed config builds (and caches) a new parser instead of mutating one in use.
+    """
+    key = get_config_fingerprint(parser_config)
+    with _parser_registry_lock:
+        parser = _parser_registry.get(key)
+        if parser is not None:
+            _parser_registry.move_to_end(key)
+            return parser
+
+        logger.info(f"Building parser for config fingerprint {key[:12]}...")
+        from .parsers.firebase_api_parser import FirebaseAPIParser
+
+        parser = FirebaseAPIParser(parser_config)
+        _parser_registry[key] = parser
+
+        # evict least recently used parsers
+        while len(_parser_registry) > MAX_CACHED_PARSERS:
+            _parser_registry.popitem(last=False)
+
+    return parser
+
+
+def clear_parser_registry():
+    global _ontology_response
+    with _parser_registry_lock:
+        _parser_registry.clear()
+        _ontology_response = None
 
-    parser = FirebaseAPIParser(paserConfig)
 
+def serialize_parser_result(
+    result: "ParserResult", parser: "FirebaseAPIParser", parameters: dict
+) -> str:
+    """
+    Serialize `result` to JSON in the response format requested in `parameters`:
+    `format` is "full" (default, ParserResult) or "compact" (CompactParserResult,
+    whose `semantics_format` is "nt" (default) or "json").
+    If stage timings are recorded, the time spent serializing is added to them
+    as the `serialization` stage.
+    """
+    from . import tracing
+    from .interface import CompactParserResult, ResponseFormat, SemanticsFormat
+
+    response_format = ResponseFormat(parameters.get("format", ResponseFormat.FULL))
+    with parser.trace("serialize_parser_result") as timings:
+        with tracing.span("serialization"):
+            if response_format == ResponseFormat.FULL:
+                serialized = result.model_dump(mode="json")
+            else:
+                serialized = CompactParserResult.from_result(
+                    result,
+                    ontology_version=parser.ontology.version_hash,
+                    semantics_format=parameters.get(
+                        "semantics_format", SemanticsFormat.NT
+                    ),
+                ).model_dump(mode="json")
+
+    if timings is not None and serialized["support"].get("timings") is not None:
+        serialized["support"]["timings"]["serialization"] = timings.as_dict()[
+            "serialization"
+        ]
+    return json.dumps(serialized, ensure_ascii=False, separators=(",", ":"))
+
+
+def SM_FUNCTION_post_parser_imp(content, parameters, config) -> "ParserResult":
     # set extraction method to citoid
-    parser.set_md_extract_method("citoid")
+    paserConfig = init_multi_stage_parser_config(
+        config, {"ref_metadata_method": "citoid"}
+    )
+
+    parser = get_parser(paserConfig)
 
     logger.info(f"Running parser on content: {content}...")
 
     result = parser.process_text_parallel(content)
-    
+
     logger.info(f"Parser run ended result: {result}...")
 
     return result
+
+
+def SM_FUNCTION_post_parser_json_imp(content, parameters, config) -> str:
+    """
+    Same as SM_FUNCTION_post_parser_imp, returning the result serialized in the
+    response format requested in `parameters` (see `serialize_parser_result`).
+    """
+    paserConfig = init_multi_stage_parser_config(
+        config, {"ref_metadata_method": "citoid"}
+    )
+
+    parser = get_parser(paserConfig)
+
+    logger.info(f"Running parser on content: {content}...")
+
+    result = parser.process_text_parallel(content)
+
+    return serialize_parser_result(result, parser, parameters)
+
+
+def SM_FUNCTION_ontology_imp() -> Tuple[str, str]:
+    """
+    Return (version hash, JSON) of the ontology used by the parser, referenced
+    by version hash in compact parser results. Only the ontology is loaded
+    (no parser or LLM clients are built).
+    """
+    global _ontology_response
+    if _ontology_response is None:
+        from .schema.ontology_base import OntologyBase
+
+        # same ontology as FirebaseAPIParser
+        ontology = OntologyBase()
+        version = ontology.version_hash
+        ontology_json = json.dumps(
+            {"version": version, "ontology": ontology.ontology_dict}
+        )
+        _ontology_response = (version, ontology_json)
+
+    return _ontology_response
+
+
+async def aparse_contents(
+    parser: "FirebaseAPIParser",
+    contents: List[str],
+    max_concurrency: int = BATCH_MAX_CONCURRENCY,
+) -> AsyncIterator[Tuple[int, Union["ParserResult", Exception]]]:
+    """
+    Parse `contents` concurrently, yielding (index, result) pairs in order of
+    completion. Failed items yield the raised exception as their result.
+    Closing the iterator early (e.g. the client disconnected) cancels the
+    contents still being parsed.
+    """
+    from aiohttp.client import ClientSession
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async with ClientSession() as session:
+
+        async def parse(i: int, content: str):
+            async with semaphore:
+                try:
+                    return i, await parser.aprocess_text(content, session=session)
+                except Exception as e:
+                    return i, e
+
+        tasks = [
+            asyncio.ensure_future(parse(i, content))
+            for i, content in enumerate(contents)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def SM_FUNCTION_post_parser_batch_imp(
+    contents: List[str], parameters, config
+) -> Iterator[str]:
+    """
+    Parse a list of contents, yielding one NDJSON line per content as soon as
+    it is parsed. Each line holds the index of the content in `contents` and
+    either its serialized ParserResult or an error message.
+    """
+    paserConfig = init_multi_stage_parser_config(
+        config, {"ref_metadata_method": "citoid"}
+    )
+
+    parser = get_parser(paserConfig)
+
+    max_concurrency = min(
+        max(int(parameters.get("max_concurrency", BATCH_MAX_CONCURRENCY)), 1),
+        BATCH_MAX_CONCURRENCY_LIMIT,
+    )
+
+    logger.info(f"Running parser on batch of {len(contents)} contents...")
+
+    from .utils import iterate_async_sync
+
+    for i, result in iterate_async_sync(
+        aparse_contents(parser, contents, max_concurrency)
+    ):
+        if isinstance(result, Exception):
+            logger.warning(f"Parser failed on content {i}: {result!r}")
+            yield json.dumps({"index": i, "error": repr(result)}) + "\n"
+        else:
+            result_json = serialize_parser_result(result, parser, parameters)
+            yield f'{{"index": {i}, "result": {result_json}}}\n'
@@ -1,36 +1,58 @@
+import asyncio
+from collections import defaultdict
+
 from confection import Config
+from aiohttp.client import ClientSession
 
 from loguru import logger
-from typing import List, Dict
+from typing import ContextManager, List, Dict, Optional, Union
 
 from langchain.chat_models import ChatOpenAI
 from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnableParallel
+from langchain_core.runnables import (
+    Runnable,
+    RunnableConfig,
+    RunnableLambda,
+    RunnableParallel,
+)
 
+from .. import tracing
 from ..interface import ParserResult, ParserSupport
-from ..init import MAX_SUMMARY_LENGTH
+from ..init import MAX_SUMMARY_LENGTH, BATCH_MAX_CONCURRENCY
+from ..llm_cache import CachedChatModel, create_llm_cache
+from ..fake_llm import FakeChatModel, is_fake_model, get_fake_model_params
 from ..schema.ontology_base import OntologyBase
 from ..schema.post import RefPost
-from ..schema.helpers import convert_text_to_ref_post
+from ..schema.helpers import convert_text_to_ref_post, aconvert_text_to_ref_post
 from ..postprocessing import (
-    convert_predicted_relations_to_rdf_triplets,
-    convert_triplets_to_graph,
-    convert_keywords_to_triplets,
+    predicted_relations_to_triples,
+    keywords_to_triples,
+)
+from ..rdf_writer import triples_to_graph
+from ..postprocessing.output_parsers import (
+    TagTypeParser,
+    KeywordParser,
+    FinalAnswerStreamParser,
 )
-from ..postprocessing.output_parsers import TagTypeParser, KeywordParser
 from ..dataloaders import scrape_post
 from ..enum_dict import EnumDict, EnumDictKey
+from ..utils import run_coroutine_sync
 from ..web_extractors.metadata_extractors import (
     MetadataExtractionType,
     RefMetadata,
     extract_metadata_by_type,
     extract_all_metadata_by_type,
+    aextract_all_metadata_by_type,
 )
 
 from ..prompting.jinja.zero_ref_template import zero_ref_template
 from ..prompting.jinja.single_ref_template import single_ref_template
 from ..prompting.jinja.keywords_extraction_template import keywords_extraction_template
 from ..prompting.jinja.multi_ref_template import multi_ref_template
+from ..prompting.jinja.compiled_template import CompiledTemplate
+
+# prompt template variables that change per post
+PROMPT_DYNAMIC_VARS = ["author_name", "content", "references_metadata"]
 
 
 class PromptCase(EnumDictKey):
@@ -56,6 +78,13 @@ def create_model(
     api_key: str,
     openapi_referer: str,
 ):
+    # offline stand-in, e.g. for benchmarks (see `fake_llm`)
+    if is_fake_model(model_name, api_base):
+        return FakeChatModel(
+            model_name=model_name,
+            temperature=temperature,
+            **get_fake_model_params(api_base),
+        )
     model = ChatOpenAI(
         model=model_name,
         temperature=temperature,
@@ -66,6 +95,27 @@ def create_model(
     return model
 
 
+def stream_until_answer(chain: Runnable) -> Runnable:
+    """
+    Wrap `chain` so that invoking it streams the generation, and returns once
+    the output parser has parsed the final answer (see `FinalAnswerStreamParser`).
+    """
+
+    def invoke(input, config: RunnableConfig):
+        output = None
+        for output in chain.stream(input, config):
+            pass
+        return output
+
+    async def ainvoke(input, config: RunnableConfig):
+        output = None
+        async for output in chain.astream(input, config):
+            pass
+        return output
+
+    return RunnableLambda(invoke, afunc=ainvoke)
+
+
 class FirebaseAPIParser:
     def __init__(self, config: Config) -> None:
         self.config = config
@@ -88,6 +138,13 @@ class FirebaseAPIParser:
         # basic prompt template that takes a string as input
         self.prompt_template = PromptTemplate.from_template("{input}")
 
+        # load ontology
+        logger.info("Loading ontology...")
+        self.ontology = OntologyBase()
+
+        # optional cache of LLM responses
+        self.llm_cache = create_llm_cache(config.get("llm_cache"))
+
         # init model
         model_name = (
             "mistralai/mistral-7b-instruct"
@@ -99,21 +156,19 @@ class FirebaseAPIParser:
         # TODO replace this with new config serialize to not print api key
         # logger.info("self.config {}", self.config)
 
-        self.parser_model = ChatOpenAI(
-            model=model_name,
-            temperature=self.config["model"]["temperature"],
-            openai_api_key=self.config["openai_api"]["openai_api_key"],
-            openai_api_base=self.config["openai_api"]["openai_api_base"],
-            # headers={"HTTP-Referer": self.config["openai_api"]["openai_api_referer"]},
+        self.parser_model = self.wrap_model_with_cache(
+            create_model(
+                model_name,
+                self.config["model"]["temperature"],
+                self.config["openai_api"]["openai_api_base"],
+                self.config["openai_api"]["openai_api_key"],
+                self.config["openai_api"]["openai_api_referer"],
+            )
         )
 
         # init kw extraction chain
         self.init_keyword_extraction_chain()
 
-        # load ontology
-        logger.info("Loading ontology...")
-        self.ontology = OntologyBase()
-
         # organize information in ontology for quick retrieval by prompter
         self.init_prompt_case_dict(self.ontology)
 
@@ -127,6 +182,21 @@ class FirebaseAPIParser:
         for case_dict in self.prompt_case_dict.values():
             self.all_labels += case_dict["labels"]
 
+    def wrap_model_with_cache(self, model):
+        """
+        Wrap `model` with the LLM response cache, if enabled in config.
+        """
+        if self.llm_cache is None:
+            return model
+        return CachedChatModel(
+            model,
+            self.llm_cache,
+            namespace=self.ontology.version_hash,
+            deterministic_only=self.config["llm_cache"].get(
+                "deterministic_only", False
+            ),
+        )
+
     def set_keyword_extraction_mode(self, enabled: bool):
         self.kw_mode_enabled = enabled
 
@@ -146,39 +216,41 @@ class FirebaseAPIParser:
 
         # configure zero ref case
         prompt_case_dict[PromptCase.ZERO_REF] = {
-            "labels": ontology.get_valid_templates(
-                subject_type="post", object_type="nan", as_dict=False
-            ).label.to_list(),
+            "labels": ontology.get_valid_labels(
+                subject_type="post", object_type="nan"
+            ),
             "type_templates": ontology.get_valid_templates(
                 subject_type="post", object_type="nan"
             ),
         }
         prompt_case_dict[PromptCase.ZERO_REF]["output_parser"] = TagTypeParser(
-            allowed_tags=prompt_case_dict[PromptCase.ZERO_REF]["labels"]
+            allowed_tags=prompt_case_dict[PromptCase.ZERO_REF]["labels"],
+            stop_at_answer=self.stream_answers,
         )
-        prompt_case_dict[PromptCase.ZERO_REF]["chain"] = (
-            self.prompt_template
-            | self.parser_model
-            | prompt_case_dict[PromptCase.ZERO_REF]["output_parser"]
+        prompt_case_dict[PromptCase.ZERO_REF]["chain"] = self.create_chain(
+            self.prompt_template,
+            self.parser_model,
+            prompt_case_dict[PromptCase.ZERO_REF]["output_parser"],
         )
         prompt_case_dict[PromptCase.ZERO_REF]["prompt_j2_template"] = zero_ref_template
 
         # configure single ref case
         prompt_case_dict[PromptCase.SINGLE_REF] = {
-            "labels": ontology.get_valid_templates(
-                subject_type="post", object_type="ref", as_dict=False
-            ).label.to_list(),
+            "labels": ontology.get_valid_labels(
+                subject_type="post", object_type="ref"
+            ),
             "type_templates": ontology.get_valid_templates(
                 subject_type="post", object_type="ref"
             ),
         }
         prompt_case_dict[PromptCase.SINGLE_REF]["output_parser"] = TagTypeParser(
-            allowed_tags=prompt_case_dict[PromptCase.SINGLE_REF]["labels"]
+            allowed_tags=prompt_case_dict[PromptCase.SINGLE_REF]["labels"],
+            stop_at_answer=self.stream_answers,
         )
-        prompt_case_dict[PromptCase.SINGLE_REF]["chain"] = (
-            self.prompt_template
-            | self.parser_model
-            | prompt_case_dict[PromptCase.SINGLE_REF]["output_parser"]
+        prompt_case_dict[PromptCase.SINGLE_REF]["chain"] = self.create_chain(
+            self.prompt_template,
+            self.parser_model,
+            prompt_case_dict[PromptCase.SINGLE_REF]["output_parser"],
         )
         prompt_case_dict[PromptCase.SINGLE_REF][
             "prompt_j2_template"
@@ -187,25 +259,34 @@ class FirebaseAPIParser:
         # configure multi ref case
         # TODO update to handle relations - meanwhile placeholder based on single refs
         prompt_case_dict[PromptCase.MULTI_REF] = {
-            "labels": ontology.get_valid_templates(
-                subject_type="post", object_type="ref", as_dict=False
-            ).label.to_list(),
+            "labels": ontology.get_valid_labels(
+                subject_type="post", object_type="ref"
+            ),
             "type_templates": ontology.get_valid_templates(
                 subject_type="post", object_type="ref"
             ),
         }
         prompt_case_dict[PromptCase.MULTI_REF]["output_parser"] = TagTypeParser(
-            allowed_tags=prompt_case_dict[PromptCase.SINGLE_REF]["labels"]
+            allowed_tags=prompt_case_dict[PromptCase.SINGLE_REF]["labels"],
+            stop_at_answer=self.stream_answers,
         )
-        prompt_case_dict[PromptCase.MULTI_REF]["chain"] = (
-            self.prompt_template
-            | self.parser_model
-            | prompt_case_dict[PromptCase.MULTI_REF]["output_parser"]
+        prompt_case_dict[PromptCase.MULTI_REF]["chain"] = self.create_chain(
+            self.prompt_template,
+            self.parser_model,
+            prompt_case_dict[PromptCase.MULTI_REF]["output_parser"],
         )
         prompt_case_dict[PromptCase.MULTI_REF][
             "prompt_j2_template"
         ] = multi_ref_template
 
+        # render the static (ontology dependent) parts of each prompt once
+        for case_dict in prompt_case_dict.values():
+            case_dict["compiled_prompt"] = CompiledTemplate(
+                case_dict["prompt_j2_template"],
+                PROMPT_DYNAMIC_VARS,
+                type_templates=case_dict["type_templates"],
+            )
+
         self.prompt_case_dict = prompt_case_dict
 
     @property
@@ -220,6 +301,46 @@ class FirebaseAPIParser:
         for case_dict in self.prompt_case_dict.values():
             all_template_types += case_dict["type_templates"]
 
+    @property
+    def stream_answers(self) -> bool:
+        return self.config["general"].get("stream_answers", False)
+
+    @property
+    def tracing_config(self) -> dict:
+        return self.config.get("tracing", {})
+
+    def trace(self, name: str) -> ContextManager[Optional[tracing.StageTimings]]:
+        """
+        Collect timings of the parser stages run within the block (see `tracing`),
+        if timings or OpenTelemetry tracing are enabled in config.
+        """
+        record_timings = self.tracing_config.get("timings", False)
+        opentelemetry = self.tracing_config.get("opentelemetry", False)
+        return tracing.trace(
+            name,
+            enabled=record_timings or opentelemetry,
+            opentelemetry=opentelemetry,
+        )
+
+    def add_timings(
+        self, result: ParserResult, timings: Optional[tracing.StageTimings]
+    ) -> ParserResult:
+        """Attach stage `timings` to `result` support info, if enabled in config."""
+        if timings is not None and self.tracing_config.get("timings", False):
+            result.support.timings = timings.as_dict()
+        return result
+
+    def create_chain(
+        self,
+        prompt_template: PromptTemplate,
+        model: Runnable,
+        output_parser: FinalAnswerStreamParser,
+    ) -> Runnable:
+        chain = prompt_template | model | output_parser
+        if self.stream_answers:
+            chain = stream_until_answer(chain)
+        return chain
+
     @property
     def max_summary_length(self):
         return self.config["general"].get(
@@ -251,20 +372,19 @@ class FirebaseAPIParser:
         # get metadata
         metadata_list: List[RefMetadata] = semantics.get("md_list", list())
 
-        # convert model outputs to triplets
-        triplets = convert_predicted_relations_to_rdf_triplets(
-            semantics,
-            self.ontology,
-        )
+        with tracing.span("rdf_graph"):
+            # convert model outputs to triples
+            triples = predicted_relations_to_triples(
+                semantics,
+                self.ontology,
+            )
 
-        # convert triplets to graph
-        graph = convert_triplets_to_graph(triplets)
+            # add keywords
+            if keywords:
+                triples += keywords_to_triples(keywords)
 
-        # add keywords to graph
-        if keywords:
-            kw_triplets = convert_keywords_to_triplets(keywords)
-            for t in kw_triplets:
-                graph.add(t.to_tuple())
+            # convert triples to graph
+            graph = triples_to_graph(triples)
 
         # gather support info
         parser_support: ParserSupport = self.get_support_data(metadata_list)
@@ -304,14 +424,13 @@ class FirebaseAPIParser:
         """
 
         references_metadata = self.get_refs_metadata_portion(metadata_list)
-        prompt_j2_template = self.kw_extraction["prompt_j2_template"]
+        compiled_prompt = self.kw_extraction["compiled_prompt"]
 
         # instantiate prompt with ref post details
-        full_prompt = prompt_j2_template.render(
+        full_prompt = compiled_prompt.render(
             author_name=post.author,
             content=post.content,
             references_metadata=references_metadata,
-            max_keywords=self.kw_extraction["max_keywords"],
         )
 
         return full_prompt
@@ -335,12 +454,10 @@ class FirebaseAPIParser:
             str: full instantiated prompt
         """
         references_metadata = self.get_refs_metadata_portion(metadata_list)
-        prompt_j2_template = self.prompt_case_dict[case]["prompt_j2_template"]
-        type_templates = self.prompt_case_dict[case]["type_templates"]
+        compiled_prompt = self.prompt_case_dict[case]["compiled_prompt"]
 
         # instantiate prompt with ref post details
-        full_prompt = prompt_j2_template.render(
-            type_templates=type_templates,
+        full_prompt = compiled_prompt.render(
             author_name=post.author,
             content=post.content,
             references_metadata=references_metadata,
@@ -348,6 +465,13 @@ class FirebaseAPIParser:
 
         return full_prompt
 
+    def get_semantics_prompt_prefix(self, case: PromptCase) -> str:
+        """
+        Return static start of the semantics prompt for `case`, which is the
+        same for all posts of that case.
+        """
+        return self.prompt_case_dict[case]["compiled_prompt"].prefix
+
     def process_by_case(
         self,
         post: RefPost,
@@ -355,17 +479,19 @@ class FirebaseAPIParser:
         metadata_list: List[RefMetadata] = None,
     ) -> dict:
         # get full prompt
-        full_prompt = self.create_semantics_prompt_by_case(
-            post,
-            case,
-            metadata_list,
-        )
+        with tracing.span("prompt_rendering"):
+            full_prompt = self.create_semantics_prompt_by_case(
+                post,
+                case,
+                metadata_list,
+            )
 
         # load corresponding chain
         chain = self.prompt_case_dict[case]["chain"]
 
         # run chain on full prompt
-        answer = chain.invoke({"input": full_prompt})
+        with tracing.span("semantics_llm"):
+            answer = chain.invoke({"input": full_prompt})
 
         # TODO make structured output type
         result = {
@@ -403,21 +529,30 @@ class FirebaseAPIParser:
         model = self.config["keyword_extraction"]["model"]
         name = model["model_name"]
         logger.info(f"Loading keyword model (type={name})...")
-        self.kw_model = create_model(
-            name,
-            model["temperature"],
-            self.config["openai_api"]["openai_api_base"],
-            self.config["openai_api"]["openai_api_key"],
-            self.config["openai_api"]["openai_api_referer"],
+        self.kw_model = self.wrap_model_with_cache(
+            create_model(
+                name,
+                model["temperature"],
+                self.config["openai_api"]["openai_api_base"],
+                self.config["openai_api"]["openai_api_key"],
+                self.config["openai_api"]["openai_api_referer"],
+            )
         )
 
         # init kw output parser
 
         self.kw_extraction = {
             "prompt_j2_template": kw_template,
-            "chain": self.kw_prompt_template
-            | self.kw_model
-            | KeywordParser(max_keywords=max_keywords),
+            "compiled_prompt": CompiledTemplate(
+                kw_template, PROMPT_DYNAMIC_VARS, max_keywords=max_keywords
+            ),
+            "chain": self.create_chain(
+                self.kw_prompt_template,
+                self.kw_model,
+                KeywordParser(
+                    max_keywords=max_keywords, stop_at_answer=self.stream_answers
+                ),
+            ),
             "max_keywords": max_keywords,
         }
 
@@ -455,90 +590,297 @@ class FirebaseAPIParser:
 
         Runs keyword extraction in parallel chain if enabled in config
         """
-        # convert text to RefPost
-        post: RefPost = convert_text_to_ref_post(text, author, source)
+        with self.trace("process_text_parallel") as timings:
+            # convert text to RefPost
+            with tracing.span("url_unshortening"):
+                post: RefPost = convert_text_to_ref_post(text, author, source)
+
+            combined_result = self.process_ref_post_parallel(post)
+
+            final_result = self.post_process_result(**combined_result)
+
+        return self.add_timings(final_result, timings)
+
+    def get_prompt_case(self, post: RefPost) -> PromptCase:
+        """
+        Return PromptCase according to how many external references post mentions
+        """
+        if len(post.ref_urls) == 0:
+            return PromptCase.ZERO_REF
+        if len(post.ref_urls) == 1:
+            return PromptCase.SINGLE_REF
+        return PromptCase.MULTI_REF
+
+    def create_parallel_prompts(
+        self,
+        post: RefPost,
+        case: PromptCase,
+        md_list: List[RefMetadata],
+    ) -> Dict[str, str]:
+        """
+        Return inputs for the parallel semantics + keywords chain
+        """
+        return {
+            "kw_input": self.create_kw_prompt(post, md_list),
+            "input": self.create_semantics_prompt_by_case(post, case, md_list),
+        }
+
+    def get_parallel_chain(self, case: PromptCase) -> RunnableParallel:
+        kw_chain = self.kw_extraction.get("chain")
+        semantics_chain = self.prompt_case_dict[case]["chain"]
 
-        combined_result = self.process_ref_post_parallel(post)
+        # both chains run concurrently, so each records its own span
+        timings = tracing.get_current_timings()
+        if timings is not None:
+            semantics_chain = tracing.with_run_timing(
+                semantics_chain, "semantics_llm", timings
+            )
+            kw_chain = tracing.with_run_timing(kw_chain, "keywords_llm", timings)
 
-        final_result = self.post_process_result(**combined_result)
+        return RunnableParallel(semantics=semantics_chain, keywords=kw_chain)
 
-        return final_result
+    def collect_parallel_results(
+        self,
+        post: RefPost,
+        case: PromptCase,
+        md_list: List[RefMetadata],
+        prompts: Dict[str, str],
+        answers: Dict,
+    ) -> dict:
+        # TODO hacky, find a cleaner way to pass this info
+        return {
+            "keywords": {
+                "post": post,
+                "full_prompt": prompts["kw_input"],
+                "answer": answers.get("keywords"),
+            },
+            "semantics": {
+                "post": post,
+                "full_prompt": prompts["input"],
+                "answer": answers.get("semantics"),
+                "possible_labels": self.prompt_case_dict[case]["labels"],
+                "md_list": md_list,
+            },
+        }
 
     def process_ref_post_parallel(self, post: RefPost):
         assert self.kw_mode_enabled
         md_list = []
 
         # check how many external references post mentions
-        if len(post.ref_urls) == 0:
-            case = PromptCase.ZERO_REF
+        case = self.get_prompt_case(post)
 
-        else:
-            # at least one external reference
-            if len(post.ref_urls) == 1:
-                case = PromptCase.SINGLE_REF
+        with tracing.span("ref_metadata", method=self.md_extract_method.value):
+            if case == PromptCase.SINGLE_REF:
                 # if metadata flag is active, retreive metadata
                 md_list = extract_metadata_by_type(
                     post.ref_urls[0],
                     self.md_extract_method,
-                    self.config["general"]["max_summary_length"],
+                    self.max_summary_length,
                 )
 
-            else:
-                case = PromptCase.MULTI_REF
-                # TODO finish
-                # md_list = extract_metadata_by_type(post.ref_urls[0], self.md_extract_method)
+            elif case == PromptCase.MULTI_REF:
+                # retrieve metadata for all references concurrently
+                md_list = extract_all_metadata_by_type(
+                    post.ref_urls,
+                    self.md_extract_method,
+                    self.max_summary_length,
+                )
 
         # run filters if specified TODO
 
         # create prompts
-        full_semantics_prompt = self.create_semantics_prompt_by_case(
-            post,
-            case,
-            md_list,
-        )
+        with tracing.span("prompt_rendering"):
+            prompts = self.create_parallel_prompts(post, case, md_list)
 
-        full_kw_prompt = self.create_kw_prompt(post, md_list)
+        # run semantics and keywords chains in parallel
+        answers = self.get_parallel_chain(case).invoke(prompts)
 
-        # create parallel chain
-        kw_chain = self.kw_extraction.get("chain")
-        semantics_chain = self.prompt_case_dict[case]["chain"]
+        return self.collect_parallel_results(post, case, md_list, prompts, answers)
 
-        map_chain = RunnableParallel(semantics=semantics_chain, keywords=kw_chain)
+    async def aprocess_ref_post_parallel(
+        self, post: RefPost, session: ClientSession = None
+    ) -> dict:
+        """
+        Async version of `process_ref_post_parallel`. Metadata for all references
+        is fetched concurrently and both chains run concurrently on the event loop.
+        """
+        assert self.kw_mode_enabled
 
-        combined_result = map_chain.invoke(
-            {
-                "kw_input": full_kw_prompt,
-                "input": full_semantics_prompt,
-            }
-        )
+        case = self.get_prompt_case(post)
 
-        # TODO hacky, find a cleaner way to pass this info
-        semantics_answer = combined_result.get("semantics")
-        kw_answer = combined_result.get("keywords")
+        with tracing.span("ref_metadata", method=self.md_extract_method.value):
+            md_list = await aextract_all_metadata_by_type(
+                post.ref_urls,
+                self.md_extract_method,
+                self.max_summary_length,
+                session,
+            )
 
-        combined_result["keywords"] = {
-            "post": post,
-            "full_prompt": full_kw_prompt,
-            "answer": kw_answer,
-        }
+        with tracing.span("prompt_rendering"):
+            prompts = self.create_parallel_prompts(post, case, md_list)
 
-        combined_result["semantics"] = {
-            "post": post,
-            "full_prompt": full_semantics_prompt,
-            "answer": semantics_answer,
-            "possible_labels": self.prompt_case_dict[case]["labels"],
-            "md_list": md_list,
-        }
+        answers = await self.get_parallel_chain(case).ainvoke(prompts)
+
+        return self.collect_parallel_results(post, case, md_list, prompts, answers)
+
+    async def aprocess_ref_post(
+        self, post: RefPost, session: ClientSession = None
+    ) -> ParserResult:
+        """
+        Process input post asynchronously and return results in the format
+        required by the API interface.
+        """
+        with self.trace("aprocess_ref_post") as timings:
+            combined_result = await self.aprocess_ref_post_parallel(post, session)
 
-        # logger.info(
-        #     f"combined_result[semantics]: {combined_result['semantics']['full_prompt']}"
-        # )
+            result = self.post_process_result(**combined_result)
 
-        # logger.info(
-        #     f"combined_result[keywords]: {combined_result['keywords']['full_prompt']}"
-        # )
+        return self.add_timings(result, timings)
 
-        return combined_result
+    async def aprocess_text(
+        self,
+        text: str,
+        author: str = "default_author",
+        source: str = "default_source",
+        session: ClientSession = None,
+    ) -> ParserResult:
+        """
+        Async version of `process_text_parallel`. URL expansion, reference metadata
+        lookups and the LLM calls share one HTTP session and each stage runs its
+        requests concurrently, so latency is bounded by the slowest request per stage.
+        """
+        if session is None:
+            async with ClientSession() as session:
+                return await self.aprocess_text(text, author, source, session)
+
+        with self.trace("aprocess_text") as timings:
+            # convert text to RefPost
+            with tracing.span("url_unshortening"):
+                post: RefPost = await aconvert_text_to_ref_post(
+                    text, session, author, source
+                )
+
+            result = await self.aprocess_ref_post(post, session)
+
+        return self.add_timings(result, timings)
+
+    async def aprocess_batch(
+        self,
+        posts: List[RefPost],
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+    ) -> List[Union[ParserResult, Exception]]:
+        """
+        Process a batch of posts and return a ParserResult per post, in input order.
+
+        Reference metadata is fetched once per unique URL across the batch (posts
+        citing a URL whose metadata can't be fetched are processed without it), and
+        the semantics and keywords chains of all posts share at most
+        `max_concurrency` concurrent LLM calls.
+        If processing a post fails, the exception is returned in place of its result.
+        """
+        assert self.kw_mode_enabled
+
+        # fetch metadata once for each unique reference URL
+        unique_urls = list(dict.fromkeys(url for post in posts for url in post.ref_urls))
+        async with ClientSession() as session:
+            md_results = await asyncio.gather(
+                *[
+                    aextract_all_metadata_by_type(
+                        [url],
+                        self.md_extract_method,
+                        self.max_summary_length,
+                        session,
+                    )
+                    for url in unique_urls
+                ],
+                return_exceptions=True,
+            )
+        md_by_url = {}
+        for url, md_result in zip(unique_urls, md_results):
+            if isinstance(md_result, Exception):
+                logger.warning(f"Failed fetching metadata of {url}: {md_result!r}")
+                continue
+            md_by_url.update((md.url, md) for md in md_result)
+
+        # create prompts, grouping posts by prompt case
+        results: List[Union[ParserResult, Exception, None]] = [None] * len(posts)
+        items = {}
+        case_indices = defaultdict(list)
+        for i, post in enumerate(posts):
+            try:
+                case = self.get_prompt_case(post)
+                md_list = [md_by_url[u] for u in post.ref_urls if u in md_by_url]
+                prompts = self.create_parallel_prompts(post, case, md_list)
+            except Exception as e:
+                results[i] = e
+                continue
+            items[i] = (case, md_list, prompts)
+            case_indices[case].append(i)
+
+        # all chains share one concurrency budget
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_chain(chain, chain_input: dict):
+            async with semaphore:
+                try:
+                    return await chain.ainvoke(chain_input)
+                except Exception as e:
+                    return e
+
+        # (post index, answer key, chain, input) of each LLM call
+        calls = [
+            (
+                i,
+                "keywords",
+                self.kw_extraction.get("chain"),
+                {"kw_input": prompts["kw_input"]},
+            )
+            for i, (_, _, prompts) in items.items()
+        ]
+        for case, indices in case_indices.items():
+            chain = self.prompt_case_dict[case]["chain"]
+            calls.extend(
+                (i, "semantics", chain, {"input": items[i][2]["input"]})
+                for i in indices
+            )
+
+        call_answers = await asyncio.gather(
+            *[run_chain(chain, chain_input) for _, _, chain, chain_input in calls]
+        )
+
+        answers = {i: {} for i in items}
+        for (i, key, _, _), answer in zip(calls, call_answers):
+            answers[i][key] = answer
+
+        # post process each post separately so errors stay per item
+        for i, (case, md_list, prompts) in items.items():
+            try:
+                for answer in answers[i].values():
+                    if isinstance(answer, Exception):
+                        raise answer
+                combined_result = self.collect_parallel_results(
+                    posts[i], case, md_list, prompts, answers[i]
+                )
+                results[i] = self.post_process_result(**combined_result)
+            except Exception as e:
+                results[i] = e
+
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed processing post {i} in batch: {result!r}")
+
+        return results
+
+    def process_batch(
+        self,
+        posts: List[RefPost],
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+    ) -> List[Union[ParserResult, Exception]]:
+        """
+        Sync version of `aprocess_batch`.
+        """
+        return run_coroutine_sync(self.aprocess_batch(posts, max_concurrency))
 
     def extract_post_topics_w_metadata(self, post: RefPost) -> List[str]:
         md_list = extract_all_metadata_by_type(
@@ -554,16 +896,17 @@ class FirebaseAPIParser:
         Process input post and return results in the format required by
         the API interface.
         """
-        result: Dict = self.process_ref_post_st(post)
+        with self.trace("process_ref_post") as timings:
+            result: Dict = self.process_ref_post_st(post)
 
-        # post processing
-        full_result: ParserResult = self.post_process_result(
-            result,
-        )
+            # post processing
+            full_result: ParserResult = self.post_process_result(
+                result,
+            )
 
         # TODO keywords. maybe async call?
 
-        return full_result
+        return self.add_timings(full_result, timings)
 
     def process_ref_post_st(self, post: RefPost) -> dict:
         """
@@ -577,19 +920,26 @@ class FirebaseAPIParser:
 
         else:
             # at least one external reference
+            md_span = tracing.span("ref_metadata", method=self.md_extract_method.value)
             if len(post.ref_urls) == 1:
                 case = PromptCase.SINGLE_REF
                 # if metadata flag is active, retreive metadata
-                md_list = extract_metadata_by_type(
-                    post.ref_urls[0],
-                    self.md_extract_method,
-                    self.config["general"]["max_summary_length"],
-                )
+                with md_span:
+                    md_list = extract_metadata_by_type(
+                        post.ref_urls[0],
+                        self.md_extract_method,
+                        self.config["general"]["max_summary_length"],
+                    )
 
             else:
                 case = PromptCase.MULTI_REF
-                # TODO finish
-                # md_list = extract_metadata_by_type(post.ref_urls[0], self.md_extract_method)
+                # retrieve metadata for all references concurrently
+                with md_span:
+                    md_list = extract_all_metadata_by_type(
+                        post.ref_urls,
+                        self.md_extract_method,
+                        self.config["general"]["max_summary_length"],
+                    )
 
         # run filters if specified TODO
 
@@ -608,12 +958,14 @@ class FirebaseAPIParser:
         Process input text and return results in format required by the
         API interface.
         """
-        # convert text to RefPost
-        post: RefPost = convert_text_to_ref_post(text, author, source)
+        with self.trace("process_text") as timings:
+            # convert text to RefPost
+            with tracing.span("url_unshortening"):
+                post: RefPost = convert_text_to_ref_post(text, author, source)
 
-        result = self.process_ref_post(post)
+            result = self.process_ref_post(post)
 
-        return result
+        return self.add_timings(result, timings)
 
     def process_text_st(
         self,
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import List, Dict
 from rdflib.namespace import RDF
 from rdflib import URIRef, Literal, Graph
@@ -8,19 +9,34 @@ from ..interface import (
 )
 from ..schema.ontology_base import OntologyBase
 from ..schema.post import RefPost
+from ..rdf_writer import Triple, triples_to_graph
 
 
-def convert_predicted_relations_to_rdf_triplets(
+# subject of all triplets (see RDFTriplet)
+ASSERTION_URI = RDFTriplet.model_fields["subject"].default
+KEYWORD_PREDICATE_URI = URIRef(KeywordConceptDefinition().uri)
+
+
+@lru_cache(maxsize=256)
+def get_uri_ref(uri: str) -> URIRef:
+    return URIRef(uri)
+
+
+def predicted_relations_to_triples(
     prediction: Dict,
     ontology: OntologyBase,
-) -> List[RDFTriplet]:
+) -> List[Triple]:
+    """
+    Same as `convert_predicted_relations_to_rdf_triplets`, but returns
+    plain (subject, predicate, object) tuples.
+    """
     post: RefPost = prediction.get("post")
     refs = post.ref_urls
 
     # extract predicted labels
     predicted_labels = prediction["answer"]["multi_tag"]
 
-    triplets = []
+    triples = []
 
     # for each tag decide if it's the object or predicate
     for label in predicted_labels:
@@ -30,25 +46,14 @@ def convert_predicted_relations_to_rdf_triplets(
             # of form assertion concept ref
             assert len(refs) > 0
             # TODO change to real URI once we have that
-            triplets += [
-                RDFTriplet(
-                    predicate=URIRef(concept.uri),
-                    object=URIRef(ref),
-                )
-                for ref in refs
-            ]
+            predicate = get_uri_ref(concept.uri)
+            triples += [(ASSERTION_URI, predicate, URIRef(ref)) for ref in refs]
 
         elif concept.can_be_object():
             # for now, if concept can be subject we assume triplet
             # of form assertion isA concept
             assert len(refs) == 0
-            triplets += [
-                RDFTriplet(
-                    predicate=RDF.type,
-                    object=URIRef(ref),
-                )
-                for ref in refs
-            ]
+            triples += [(ASSERTION_URI, RDF.type, URIRef(ref)) for ref in refs]
 
         else:
             raise ValueError(
@@ -56,26 +61,31 @@ def convert_predicted_relations_to_rdf_triplets(
                               or predicate"
             )
 
-    return triplets
+    return triples
 
 
-def convert_keywords_to_triplets(prediction: Dict) -> List[RDFTriplet]:
+def keywords_to_triples(prediction: Dict) -> List[Triple]:
     keywords = prediction["answer"].get("valid_keywords")
+    return [(ASSERTION_URI, KEYWORD_PREDICATE_URI, Literal(kw)) for kw in keywords]
+
 
-    triplets = [
-        RDFTriplet(
-            predicate=URIRef(KeywordConceptDefinition().uri),
-            object=Literal(kw),
-        )
-        for kw in keywords
+def convert_predicted_relations_to_rdf_triplets(
+    prediction: Dict,
+    ontology: OntologyBase,
+) -> List[RDFTriplet]:
+    return [
+        RDFTriplet(subject=s, predicate=p, object=o)
+        for s, p, o in predicted_relations_to_triples(prediction, ontology)
     ]
 
-    return triplets
+
+def convert_keywords_to_triplets(prediction: Dict) -> List[RDFTriplet]:
+    return [
+        RDFTriplet(subject=s, predicate=p, object=o)
+        for s, p, o in keywords_to_triples(prediction)
+    ]
 
 
 def convert_triplets_to_graph(triplets: List[RDFTriplet]) -> Graph:
     """Convert list of rdf triplets to rdf graph"""
-    g = Graph()
-    for t in triplets:
-        g.add(t.to_tuple())
-    return g
+    return triples_to_graph(t.to_tuple() for t in triplets)
@@ -1,7 +1,20 @@
 import re
-from typing import List
+from functools import lru_cache
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple, Union
 
-from langchain.schema import BaseOutputParser
+from langchain_core.messages import BaseMessage
+from langchain_core.pydantic_v1 import PrivateAttr
+from langchain_core.runnables import RunnableConfig
+from langchain_core.output_parsers.transform import BaseTransformOutputParser
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+REASONING_STEPS_PATTERN = re.compile(r"Reasoning Steps:(.*?)Candidate Tags:", re.DOTALL)
+CANDIDATE_TAGS_PATTERN = re.compile(r"Candidate Tags:(.*?)Final Answer:", re.DOTALL)
+FINAL_ANSWER_PATTERN = re.compile(r"Final Answer:(.*)", re.DOTALL)
+
+# answer line after the final answer marker, ended by a newline
+ANSWER_LINE_PATTERN = re.compile(r"\s*\S[^\n]*\n")
 
 
 # GPT4
@@ -27,6 +40,52 @@ def convert_string_to_list(input_string):
     return names_list
 
 
+# words, where tag words may contain hyphens (e.g. dg-claim)
+TAG_TOKEN_PATTERN = re.compile(r"[\w-]+")
+
+
+class TagMatcher:
+    """
+    Finds tags from a closed set in text in a single pass.
+    Matching is case insensitive and only matches whole tags, not tags that are
+    part of a longer word or tag (e.g. `claim` in `dg-claim` or `reading` in `spreading`).
+
+    If all tags are single words, the text is split into words which are looked
+    up in a dict. Otherwise a precompiled alternation of the tags (longest first)
+    is used.
+    """
+
+    def __init__(self, tags: List[str]) -> None:
+        self.tags = list(tags)
+        self._canonical = {tag.lower(): tag for tag in self.tags}
+        self._single_words = all(
+            TAG_TOKEN_PATTERN.fullmatch(tag) for tag in self._canonical
+        )
+        self.pattern = TAG_TOKEN_PATTERN
+        if not self._single_words:
+            # longest first, so a tag that is a prefix of another tag doesn't shadow it
+            alternation = "|".join(
+                map(re.escape, sorted(self._canonical, key=len, reverse=True))
+            )
+            self.pattern = re.compile(
+                rf"(?<![\w-])(?:{alternation})(?![\w-])", re.IGNORECASE
+            )
+
+    def find_all(self, text: str) -> List[str]:
+        """Return unique tags found in `text`, in order of first occurrence."""
+        canonical = self._canonical
+        if self._single_words:
+            matches = self.pattern.findall(text.lower())
+        else:
+            matches = [m.lower() for m in self.pattern.findall(text)]
+        return list(dict.fromkeys(canonical[m] for m in matches if m in canonical))
+
+
+@lru_cache(maxsize=32)
+def get_tag_matcher(tags: Tuple[str, ...]) -> TagMatcher:
+    return TagMatcher(list(tags))
+
+
 def extract_tags(input_text: str, tags: List[str]) -> List[str]:
     """
     Given an input text and a list of tags, return a list of all tags appearing in the text
@@ -39,52 +98,173 @@ def extract_tags(input_text: str, tags: List[str]) -> List[str]:
     Returns:
     List[str]: A list of tags found in the input text, in the order of their occurrence.
     """
-    pattern = "|".join(map(re.escape, tags))
-    found_tags = re.findall(pattern, input_text.lower())
+    return get_tag_matcher(tuple(tags)).find_all(input_text)
+
+
+def extract_answer_sections(text: str) -> Tuple[str, str, str]:
+    """
+    Split LLM output into its reasoning steps, candidate tags and final answer sections.
+    """
+    # Extract content using regular expressions with error handling
+    try:
+        reasoning_steps = REASONING_STEPS_PATTERN.search(text).group(1).strip()
+    except AttributeError:
+        reasoning_steps = "[System error: failed to extract reasoning steps since the generated output was in an invalid format]"
+
+    try:
+        candidate_tags = CANDIDATE_TAGS_PATTERN.search(text).group(1).strip()
+    except AttributeError:
+        candidate_tags = "[System error: failed to extract candidate tags since the generated output was in an invalid format.]"
 
-    # make sure tags are unique
-    unique_found_tags = list(set(found_tags))
+    try:
+        final_answer = FINAL_ANSWER_PATTERN.search(text).group(1).strip()
+    except AttributeError:
+        final_answer = "<error>"
 
-    return unique_found_tags
+    return reasoning_steps, candidate_tags, final_answer
 
 
-class TagTypeParser(BaseOutputParser):
+class FinalAnswerTracker:
+    """
+    Accumulates streamed output text and detects when the line following
+    `Final Answer:` is complete.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.marker_pos = -1
+        self.answer_end = -1
+
+    @property
+    def answer_complete(self) -> bool:
+        return self.answer_end >= 0
+
+    def add(self, chunk_text: str) -> bool:
+        """
+        Add streamed `chunk_text`, return True if it completed the answer line.
+        """
+        search_from = max(0, len(self.text) - len(FINAL_ANSWER_MARKER))
+        self.text += chunk_text
+        if self.answer_complete:
+            return False
+
+        if self.marker_pos < 0:
+            self.marker_pos = self.text.find(FINAL_ANSWER_MARKER, search_from)
+            if self.marker_pos < 0:
+                return False
+
+        match = ANSWER_LINE_PATTERN.match(
+            self.text, self.marker_pos + len(FINAL_ANSWER_MARKER)
+        )
+        if match is None:
+            return False
+        self.answer_end = match.end()
+        return True
+
+
+def get_chunk_text(chunk: Union[str, BaseMessage]) -> str:
+    return chunk.content if isinstance(chunk, BaseMessage) else chunk
+
+
+class FinalAnswerStreamParser(BaseTransformOutputParser[dict]):
+    """
+    Base for parsers of outputs ending with a `Final Answer:` section.
+
+    When streaming (e.g. `chain.stream`), the output is parsed as soon as the
+    final answer line is complete, and parsed again from the full output when
+    the stream ends. If `stop_at_answer` is set, the rest of the stream is not
+    consumed, which cuts the generation short.
+    """
+
+    stop_at_answer: bool = False
+
+    def _stop_after_answer(
+        self, input: Iterator[Union[str, BaseMessage]]
+    ) -> Iterator[Union[str, BaseMessage]]:
+        # stop pulling from upstream once the answer is complete - langchain
+        # otherwise drains the remaining input for tracing
+        tracker = FinalAnswerTracker()
+        for chunk in input:
+            yield chunk
+            if tracker.add(get_chunk_text(chunk)):
+                return
+
+    async def _astop_after_answer(
+        self, input: AsyncIterator[Union[str, BaseMessage]]
+    ) -> AsyncIterator[Union[str, BaseMessage]]:
+        tracker = FinalAnswerTracker()
+        async for chunk in input:
+            yield chunk
+            if tracker.add(get_chunk_text(chunk)):
+                return
+
+    def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[dict]:
+        tracker = FinalAnswerTracker()
+        for chunk in input:
+            if tracker.add(get_chunk_text(chunk)):
+                yield self.parse(tracker.text[: tracker.answer_end])
+                if self.stop_at_answer:
+                    return
+
+        if not tracker.answer_complete or len(tracker.text) > tracker.answer_end:
+            yield self.parse(tracker.text)
+
+    async def _atransform(
+        self, input: AsyncIterator[Union[str, BaseMessage]]
+    ) -> AsyncIterator[dict]:
+        tracker = FinalAnswerTracker()
+        async for chunk in input:
+            if tracker.add(get_chunk_text(chunk)):
+                yield self.parse(tracker.text[: tracker.answer_end])
+                if self.stop_at_answer:
+                    return
+
+        if not tracker.answer_complete or len(tracker.text) > tracker.answer_end:
+            yield self.parse(tracker.text)
+
+    def transform(
+        self,
+        input: Iterator[Union[str, BaseMessage]],
+        config: Optional[RunnableConfig] = None,
+        **kwargs: Any,
+    ) -> Iterator[dict]:
+        if self.stop_at_answer:
+            input = self._stop_after_answer(input)
+        yield from super().transform(input, config, **kwargs)
+
+    async def atransform(
+        self,
+        input: AsyncIterator[Union[str, BaseMessage]],
+        config: Optional[RunnableConfig] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[dict]:
+        if self.stop_at_answer:
+            input = self._astop_after_answer(input)
+        async for output in super().atransform(input, config, **kwargs):
+            yield output
+
+
+class TagTypeParser(FinalAnswerStreamParser):
     """Parse the output of an LLM call to a dict ."""
 
     allowed_tags: List[str]
 
+    _tag_matcher: Optional[TagMatcher] = PrivateAttr(default=None)
+
     @property
     def valid_tags(self):
         return self.allowed_tags
 
+    @property
+    def tag_matcher(self) -> TagMatcher:
+        # compiled once per parser
+        if self._tag_matcher is None:
+            self._tag_matcher = TagMatcher(self.valid_tags)
+        return self._tag_matcher
+
     def parse(self, text: str):
         """Parse the output of an LLM call."""
-        # Define the regular expressions for the three sections
-        reasoning_steps_pattern = r"Reasoning Steps:(.*?)Candidate Tags:"
-        candidate_tags_pattern = r"Candidate Tags:(.*?)Final Answer:"
-        final_answer_pattern = r"Final Answer:(.*)"
-
-        # Extract content using regular expressions with error handling
-        try:
-            reasoning_steps = (
-                re.search(reasoning_steps_pattern, text, re.DOTALL).group(1).strip()
-            )
-        except AttributeError:
-            reasoning_steps = "[System error: failed to extract reasoning steps since the generated output was in an invalid format]"
-
-        try:
-            candidate_tags = (
-                re.search(candidate_tags_pattern, text, re.DOTALL).group(1).strip()
-            )
-        except AttributeError:
-            candidate_tags = "[System error: failed to extract candidate tags since the generated output was in an invalid format.]"
-
-        try:
-            final_answer = (
-                re.search(final_answer_pattern, text, re.DOTALL).group(1).strip()
-            )
-        except AttributeError:
-            final_answer = "<error>"
+        reasoning_steps, candidate_tags, final_answer = extract_answer_sections(text)
 
         final_reasoning = (
             "[Reasoning Steps]\n\n"
@@ -94,7 +274,7 @@ class TagTypeParser(BaseOutputParser):
         )
 
         # force final answer to conform to closed set of tags
-        multi_tags = extract_tags(final_answer, self.valid_tags)
+        multi_tags = self.tag_matcher.find_all(final_answer)
 
         # if we only want to choose single tag - take first
         single_tag = multi_tags[:1]
@@ -110,39 +290,14 @@ class TagTypeParser(BaseOutputParser):
         return extracted_content
 
 
-class KeywordParser(BaseOutputParser):
+class KeywordParser(FinalAnswerStreamParser):
     """Parse the output of an LLM call to a dict ."""
 
     max_keywords: int = -1
 
     def parse(self, text: str):
         """Parse the output of an LLM call."""
-        # Define the regular expressions for the three sections
-        reasoning_steps_pattern = r"Reasoning Steps:(.*?)Candidate Tags:"
-        candidate_tags_pattern = r"Candidate Tags:(.*?)Final Answer:"
-        final_answer_pattern = r"Final Answer:(.*)"
-
-        # Extract content using regular expressions with error handling
-        try:
-            reasoning_steps = (
-                re.search(reasoning_steps_pattern, text, re.DOTALL).group(1).strip()
-            )
-        except AttributeError:
-            reasoning_steps = "[System error: failed to extract reasoning steps since the generated output was in an invalid format]"
-
-        try:
-            candidate_tags = (
-                re.search(candidate_tags_pattern, text, re.DOTALL).group(1).strip()
-            )
-        except AttributeError:
-            candidate_tags = "[System error: failed to extract candidate tags since the generated output was in an invalid format.]"
-
-        try:
-            final_answer = (
-                re.search(final_answer_pattern, text, re.DOTALL).group(1).strip()
-            )
-        except AttributeError:
-            final_answer = "<error>"
+        reasoning_steps, candidate_tags, final_answer = extract_answer_sections(text)
 
         final_reasoning = (
             "[Reasoning Steps]\n\n"
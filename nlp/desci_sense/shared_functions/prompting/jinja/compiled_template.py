@@ -0,0 +1,51 @@
+import re
+import uuid
+from typing import Any, List
+
+from jinja2 import Template
+
+
+class CompiledTemplate:
+    """
+    Jinja template pre-rendered once with its static variables (e.g. the ontology
+    tag definitions), split into literal segments around its per-post variables.
+    Rendering then only joins the segments with the per-post values, and gives
+    the same output as rendering the original template.
+
+    Per-post variables must only appear as plain `{{ var }}` expressions in the
+    template (no filters or control structures).
+    """
+
+    def __init__(
+        self, template: Template, dynamic_vars: List[str], **static_vars: Any
+    ) -> None:
+        marker = uuid.uuid4().hex
+        placeholders = {var: f"\x00{marker}:{var}\x00" for var in dynamic_vars}
+        rendered = template.render(**static_vars, **placeholders)
+
+        placeholder_vars = {p: var for var, p in placeholders.items()}
+        pattern = re.compile("|".join(re.escape(p) for p in placeholders.values()))
+
+        self.segments: List[str] = []
+        self.slots: List[str] = []
+        pos = 0
+        for match in pattern.finditer(rendered):
+            self.segments.append(rendered[pos : match.start()])
+            self.slots.append(placeholder_vars[match.group(0)])
+            pos = match.end()
+        self.segments.append(rendered[pos:])
+
+    @property
+    def prefix(self) -> str:
+        """
+        Static start of the rendered prompt, shared by all posts
+        (e.g. for provider side prompt caching).
+        """
+        return self.segments[0]
+
+    def render(self, **kwargs: Any) -> str:
+        parts = [self.segments[0]]
+        for slot, segment in zip(self.slots, self.segments[1:]):
+            parts.append(str(kwargs[slot]))
+            parts.append(segment)
+        return "".join(parts)
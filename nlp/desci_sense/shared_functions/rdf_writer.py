@@ -0,0 +1,94 @@
+from typing import Dict, Iterable, List, Tuple, Union
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.term import Node
+
+Triple = Tuple[Node, Node, Node]
+
+_NT_ESCAPES = str.maketrans(
+    {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+)
+
+# characters not allowed in N-Triples/Turtle IRIs (IRIREF rule), percent-encoded
+_IRI_ESCAPES = str.maketrans(
+    {c: f"%{ord(c):02X}" for c in [chr(i) for i in range(0x21)] + list('<>"{}|^`\\')}
+)
+
+
+def escape_iri(iri: str) -> str:
+    """Percent-encode characters of `iri` that are invalid in N-Triples/Turtle IRIs."""
+    return iri.translate(_IRI_ESCAPES)
+
+
+def term_to_nt(term: Node) -> str:
+    """Return N-Triples (and Turtle) representation of `term`."""
+    if isinstance(term, URIRef):
+        return f"<{escape_iri(term)}>"
+    if isinstance(term, Literal):
+        res = '"' + str(term).translate(_NT_ESCAPES) + '"'
+        if term.language:
+            return f"{res}@{term.language}"
+        if term.datatype:
+            return f"{res}^^<{term.datatype}>"
+        return res
+    if isinstance(term, BNode):
+        return f"_:{term}"
+    raise ValueError(f"Unsupported term type: {type(term)}")
+
+
+def triples_to_graph(triples: Iterable[Triple]) -> Graph:
+    """Add `triples` to a new rdf graph in one call"""
+    graph = Graph()
+    graph.addN((s, p, o, graph) for s, p, o in triples)
+    return graph
+
+
+def serialize_nt(triples: Iterable[Triple]) -> str:
+    """Serialize `triples` to N-Triples"""
+    return "".join(
+        f"{term_to_nt(s)} {term_to_nt(p)} {term_to_nt(o)} .\n" for s, p, o in triples
+    )
+
+
+def serialize_turtle(triples: Iterable[Triple]) -> str:
+    """
+    Serialize `triples` to Turtle, grouping objects by subject and predicate.
+    Much faster than rdflib's Turtle serializer for our small graphs, but does
+    not use prefixes or blank node nesting.
+    """
+    grouped: Dict[Node, Dict[Node, List[Node]]] = {}
+    for s, p, o in triples:
+        grouped.setdefault(s, {}).setdefault(p, []).append(o)
+
+    blocks = []
+    for s, predicates in grouped.items():
+        predicate_lines = [
+            f"{term_to_nt(p)} " + ",\n        ".join(term_to_nt(o) for o in objects)
+            for p, objects in predicates.items()
+        ]
+        blocks.append(f"{term_to_nt(s)} " + " ;\n    ".join(predicate_lines) + " .\n")
+    return "\n".join(blocks)
+
+
+def term_to_json(term: Node) -> Union[str, Dict[str, str]]:
+    """
+    Return JSON representation of `term`: URIs as strings, literals as
+    {"value": ...} with optional "lang" or "datatype" keys.
+    """
+    if isinstance(term, URIRef):
+        return escape_iri(term)
+    if isinstance(term, Literal):
+        res = {"value": str(term)}
+        if term.language:
+            res["lang"] = term.language
+        elif term.datatype:
+            res["datatype"] = str(term.datatype)
+        return res
+    if isinstance(term, BNode):
+        return f"_:{term}"
+    raise ValueError(f"Unsupported term type: {type(term)}")
+
+
+def serialize_json_triples(triples: Iterable[Triple]) -> List[List]:
+    """Convert `triples` to a JSON serializable list of [subject, predicate, object]"""
+    return [[term_to_json(s), term_to_json(p), term_to_json(o)] for s, p, o in triples]
@@ -1,5 +1,7 @@
+from aiohttp.client import ClientSession
+
 from .post import RefPost
-from ..utils import extract_and_expand_urls
+from ..utils import extract_and_expand_urls, aextract_and_expand_urls
 
 
 def convert_text_to_ref_post(
@@ -16,3 +18,22 @@ def convert_text_to_ref_post(
     )
 
     return post
+
+
+async def aconvert_text_to_ref_post(
+    text: str,
+    session: ClientSession,
+    author: str = "deafult_author",
+    source: str = "default_source",
+) -> RefPost:
+    """
+    Async version of `convert_text_to_ref_post`.
+    """
+
+    urls = await aextract_and_expand_urls(text, session)
+
+    post = RefPost(
+        author=author, content=text, url="", source_network=source, ref_urls=urls
+    )
+
+    return post
@@ -1,7 +1,9 @@
-from typing import List, Dict, Union
+from types import MappingProxyType
+from typing import List, Dict, Mapping, Tuple, Union
 import pandas as pd
 import json
-from pydantic import Field, BaseModel
+import hashlib
+from pydantic import ConfigDict, Field, BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 from ..interface import (
@@ -87,6 +89,21 @@ def write_ontology_to_json(ontology: OntologyInterface, outpath: str):
         file.write(json_data)
 
 
+class FrozenLLMOntologyConceptDefinition(LLMOntologyConceptDefinition):
+    model_config = ConfigDict(frozen=True)
+
+
+def filter_concepts_by_version(
+    concepts: List[LLMOntologyConceptDefinition], allowed_versions: List[str] = None
+) -> List[LLMOntologyConceptDefinition]:
+    """Same as `filter_ontology_by_version`, for a list of concept definitions."""
+    if not allowed_versions:
+        return list(concepts)
+    return [
+        c for c in concepts if any(version in allowed_versions for version in c.versions)
+    ]
+
+
 class OntologyBase:
     def __init__(self, versions: List[str] = None) -> None:
         self.ontology_interface = load_ontology_from_model(ontology)
@@ -94,65 +111,117 @@ class OntologyBase:
         # for fast lookup
         self._ontology_dict = self.ontology_interface.model_dump()
 
-        # Process the results into a format suitable for DataFrame
-        ont_df = create_ont_df_from_interface(self.ontology_interface)
+        # identifies ontology contents, e.g. for cache keys
+        self._version_hash = hashlib.sha256(
+            json.dumps([self._ontology_dict, versions], sort_keys=True).encode("utf-8")
+        ).hexdigest()
 
         # filter by chosen versions
-        self.ont_df = filter_ontology_by_version(ont_df, allowed_versions=versions)
+        concepts = filter_concepts_by_version(
+            self.ontology_interface.semantic_predicates, allowed_versions=versions
+        )
+
+        # immutable indexes built once, so lookups at parse time are O(1)
+        self._concepts: Tuple[FrozenLLMOntologyConceptDefinition, ...] = tuple(
+            FrozenLLMOntologyConceptDefinition.model_validate(c.model_dump())
+            for c in concepts
+        )
+        self._concepts_by_label: Mapping[
+            str, FrozenLLMOntologyConceptDefinition
+        ] = MappingProxyType({c.label: c for c in self._concepts})
+        self._templates: Tuple[Mapping, ...] = tuple(
+            MappingProxyType(c.model_dump()) for c in self._concepts
+        )
+        self._templates_by_types = MappingProxyType(
+            self._build_templates_index(self._templates)
+        )
 
-        # set dict versions with alternate keys for fast lookup
-        self._label_map = self.ont_df.set_index("label", drop=False)
-        self._display_map = self.ont_df.set_index("display_name", drop=False)
-        self._template_type_map = self.ont_df
+        # pandas views are only built on demand (e.g. for the streamlit demo)
+        self._ont_df = None
+        self._label_map = None
+        self._display_map = None
+
+    @staticmethod
+    def _build_templates_index(
+        templates: Tuple[Mapping, ...]
+    ) -> Dict[Tuple[str, str], Tuple[Mapping, ...]]:
+        subject_types = {t for tmpl in templates for t in tmpl["valid_subject_types"]}
+        object_types = {t for tmpl in templates for t in tmpl["valid_object_types"]}
+        return {
+            (subject_type, object_type): tuple(
+                tmpl
+                for tmpl in templates
+                if subject_type in tmpl["valid_subject_types"]
+                and object_type in tmpl["valid_object_types"]
+            )
+            for subject_type in subject_types
+            for object_type in object_types
+        }
 
     @property
     def ontology_dict(self) -> Dict:
         return self._ontology_dict
 
+    @property
+    def version_hash(self) -> str:
+        return self._version_hash
+
+    @property
+    def concepts(self) -> Tuple[FrozenLLMOntologyConceptDefinition, ...]:
+        return self._concepts
+
+    @property
+    def ont_df(self) -> pd.DataFrame:
+        if self._ont_df is None:
+            self._ont_df = pd.DataFrame(
+                [dict(t) for t in self._templates],
+                columns=list(LLMOntologyConceptDefinition.model_fields),
+            )
+            self._ont_df.set_index("name", inplace=True, drop=False)
+        return self._ont_df
+
     @property
     def label_df(self):
+        if self._label_map is None:
+            self._label_map = self.ont_df.set_index("label", drop=False)
         return self._label_map
 
     @property
     def display_name_df(self):
+        if self._display_map is None:
+            self._display_map = self.ont_df.set_index("display_name", drop=False)
         return self._display_map
 
     @property
     def template_type_df(self):
-        return self._template_type_map
+        return self.ont_df
 
     def get_valid_templates(
         self, subject_type: str, object_type: str, as_dict: bool = True
-    ) -> List[Dict]:
+    ) -> Union[Tuple[Mapping, ...], pd.DataFrame]:
         """
-        Given `subject_type` and `object_type`, return list of templates where `subject_type` is in template['valid_subject_types'] and
+        Given `subject_type` and `object_type`, return templates where `subject_type` is in template['valid_subject_types'] and
         `object_type` is in template['valid_object_types'].
-        Templates are the rows of the Notion ontology table provided on initialization.
+        Templates are the rows of the Notion ontology table provided on initialization,
+        returned as a tuple of read-only dicts (or as a DataFrame if `as_dict` is False).
         """
-        # Filter the dataframe based on the subject_type and object_type
-        valid_templates = self.ont_df[
-            self.ont_df["valid_subject_types"].apply(
-                lambda types: subject_type in types
-            )
-            & self.ont_df["valid_object_types"].apply(
-                lambda types: object_type in types
-            )
-        ]
+        res = self._templates_by_types.get((subject_type, object_type), ())
 
-        res = valid_templates
-
-        if as_dict:
-            # Convert the filtered DataFrame to a list of dictionaries
-            res = valid_templates.to_dict(orient="records")
+        if not as_dict:
+            res = self.ont_df.loc[[t["name"] for t in res]]
 
         return res
 
-    def get_concept_by_label(self, label: str) -> LLMOntologyConceptDefinition:
-        row = self.label_df.loc[label]
-        return LLMOntologyConceptDefinition.model_validate(row.to_dict())
+    def get_valid_labels(self, subject_type: str, object_type: str) -> List[str]:
+        return [
+            t["label"] for t in self.get_valid_templates(subject_type, object_type)
+        ]
+
+    def get_concept_by_label(self, label: str) -> FrozenLLMOntologyConceptDefinition:
+        return self._concepts_by_label[label]
 
     def get_all_labels(self) -> List[str]:
-        return self.ont_df.label.to_list()
+        return [c.label for c in self._concepts]
 
     def get_all_display_names(self) -> List[str]:
-        return self.ont_df.display_name.to_list()
+        return [c.display_name for c in self._concepts]
@@ -0,0 +1,165 @@
+"""
+Lightweight timing spans for the stages of a parser run.
+
+`trace` starts collecting the durations of the stages run within its block, and
+`span` times one stage of the current trace. Each stage is logged as a structured
+loguru record (with `trace`, `stage` and `duration_ms` extras) and, if enabled and
+the OpenTelemetry API is installed, exported as an OpenTelemetry span.
+When no trace is active `span` returns a shared no-op context manager, so
+instrumented code costs next to nothing with tracing disabled.
+"""
+import time
+import threading
+from datetime import datetime, timezone
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import ContextManager, Dict, Iterator, Optional
+
+from loguru import logger
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+OTEL_TRACER_NAME = "desci_sense.parser"
+
+# name of the stage covering the whole trace
+TOTAL_STAGE = "total"
+
+_NULL_SPAN = nullcontext()
+
+
+def _to_ns(dt: datetime) -> int:
+    # LangChain run times are naive UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1e9)
+
+
+class StageTimings:
+    """
+    Durations of the stages of one parser run. Stages run more than once
+    (e.g. per reference) accumulate. Thread safe, since the branches of parallel
+    chains record their stages from worker threads.
+    """
+
+    def __init__(self, name: str, opentelemetry: bool = False) -> None:
+        self.name = name
+        self.durations: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        self.otel_tracer = None
+        if opentelemetry:
+            if otel_trace is None:
+                logger.warning(
+                    "OpenTelemetry tracing enabled but opentelemetry-api is not installed"
+                )
+            else:
+                self.otel_tracer = otel_trace.get_tracer(OTEL_TRACER_NAME)
+        # parent of spans recorded outside of the trace context (see `record_run`)
+        self.otel_context = None
+
+    def add(self, stage: str, seconds: float, **attributes):
+        with self._lock:
+            self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+        duration_ms = round(seconds * 1000, 3)
+        logger.bind(
+            trace=self.name, stage=stage, duration_ms=duration_ms, **attributes
+        ).debug(f"{self.name}: {stage} took {duration_ms} ms")
+
+    @contextmanager
+    def span(self, stage: str, **attributes) -> Iterator[None]:
+        otel_span = (
+            self.otel_tracer.start_as_current_span(stage, attributes=attributes)
+            if self.otel_tracer is not None
+            else _NULL_SPAN
+        )
+        start = time.perf_counter()
+        try:
+            with otel_span:
+                yield
+        finally:
+            self.add(stage, time.perf_counter() - start, **attributes)
+
+    def record_run(
+        self, stage: str, start_time: datetime, end_time: datetime, **attributes
+    ):
+        """Record `stage` that already ran from `start_time` to `end_time`."""
+        self.add(stage, (end_time - start_time).total_seconds(), **attributes)
+        if self.otel_tracer is not None:
+            otel_span = self.otel_tracer.start_span(
+                stage,
+                context=self.otel_context,
+                attributes=attributes,
+                start_time=_to_ns(start_time),
+            )
+            otel_span.end(end_time=_to_ns(end_time))
+
+    def as_dict(self) -> Dict[str, float]:
+        """Return stage durations in milliseconds."""
+        with self._lock:
+            return {k: round(v * 1000, 3) for k, v in self.durations.items()}
+
+
+_current_timings: ContextVar[Optional[StageTimings]] = ContextVar(
+    "current_timings", default=None
+)
+
+
+def get_current_timings() -> Optional[StageTimings]:
+    return _current_timings.get()
+
+
+@contextmanager
+def trace(
+    name: str, enabled: bool = True, opentelemetry: bool = False
+) -> Iterator[Optional[StageTimings]]:
+    """
+    Collect timings of the stages run within the block, and yield them (None if
+    not `enabled`). Nested traces join the enclosing one.
+    """
+    current = _current_timings.get()
+    if not enabled or current is not None:
+        yield current
+        return
+
+    timings = StageTimings(name, opentelemetry)
+    token = _current_timings.set(timings)
+    # root span of the stage spans
+    otel_span = (
+        timings.otel_tracer.start_as_current_span(name)
+        if timings.otel_tracer is not None
+        else _NULL_SPAN
+    )
+    start = time.perf_counter()
+    try:
+        with otel_span:
+            if timings.otel_tracer is not None:
+                timings.otel_context = otel_trace.set_span_in_context(
+                    otel_trace.get_current_span()
+                )
+            yield timings
+    finally:
+        timings.add(TOTAL_STAGE, time.perf_counter() - start)
+        _current_timings.reset(token)
+
+
+def span(stage: str, **attributes) -> ContextManager[None]:
+    """Time `stage` in the current trace, if any."""
+    timings = _current_timings.get()
+    if timings is None:
+        return _NULL_SPAN
+    return timings.span(stage, **attributes)
+
+
+def with_run_timing(runnable, stage: str, timings: StageTimings):
+    """
+    Wrap LangChain `runnable` so that each of its runs is recorded as `stage`
+    of `timings`, wherever (thread, event loop) it runs.
+    """
+
+    def on_end(run):
+        timings.record_run(stage, run.start_time, run.end_time)
+
+    return runnable.with_listeners(on_end=on_end)
@@ -1,12 +1,19 @@
 import re
+import asyncio
+import threading
 import requests
-from jinja2 import Environment, BaseLoader
+import aiohttp
+from aiohttp.client import ClientSession
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from enum import Enum
-import html2text
 from urllib.parse import urlparse
 
 from url_normalize import url_normalize
 
+from .cache import BaseCache, create_cache
+
 
 def extract_twitter_status_id(url):
     pattern = r"twitter\.com\/\w+\/status\/(\d+)"
@@ -18,6 +25,8 @@ def extract_twitter_status_id(url):
 
 
 def convert_html_to_plain_text(html_content):
+    import html2text
+
     converter = html2text.HTML2Text()
     converter.ignore_links = True
     plain_text = converter.handle(html_content)
@@ -94,14 +103,280 @@ def identify_social_media(url):
             return "Unknown"
 
 
-def unshorten_url(url):
+# timeout (seconds) for resolving redirects of a single URL
+UNSHORTEN_TIMEOUT = 10
+
+# max parallel HEAD requests when expanding the URLs of a post
+UNSHORTEN_MAX_WORKERS = 8
+
+# how long resolved URLs are cached (seconds)
+URL_CACHE_TTL = 30 * 24 * 60 * 60
+
+_url_cache: BaseCache = create_cache(max_size=8192, ttl=URL_CACHE_TTL)
+
+_http_session = None
+_url_executor = None
+_url_resources_lock = threading.Lock()
+
+
+def get_url_cache() -> BaseCache:
+    return _url_cache
+
+
+def set_url_cache(cache: BaseCache):
+    """
+    Replace the cache of resolved URLs, e.g. with
+    `create_cache(db_path=...)` to persist it on disk.
+    """
+    global _url_cache
+    _url_cache = cache
+
+
+def get_http_session() -> requests.Session:
+    """
+    Return process-wide requests session, pooling connections across URL lookups.
+    """
+    global _http_session
+    with _url_resources_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=UNSHORTEN_MAX_WORKERS,
+                pool_maxsize=UNSHORTEN_MAX_WORKERS,
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+    return _http_session
+
+
+def get_url_executor() -> ThreadPoolExecutor:
+    global _url_executor
+    with _url_resources_lock:
+        if _url_executor is None:
+            _url_executor = ThreadPoolExecutor(max_workers=UNSHORTEN_MAX_WORKERS)
+    return _url_executor
+
+
+def fetch_final_url(url) -> Optional[str]:
+    """
+    Return final URL after following redirects of `url`, or None on errors.
+    """
     try:
-        response = requests.head(url, allow_redirects=True)
+        response = get_http_session().head(
+            url, allow_redirects=True, timeout=UNSHORTEN_TIMEOUT
+        )
         return response.url
     except requests.RequestException as e:
-        # return original url in case of errors
+        return None
+
+
+async def afetch_final_url(url, session: ClientSession) -> Optional[str]:
+    """
+    Async version of `fetch_final_url`.
+    """
+    try:
+        async with session.head(
+            url,
+            allow_redirects=True,
+            timeout=aiohttp.ClientTimeout(total=UNSHORTEN_TIMEOUT),
+        ) as response:
+            return str(response.url)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        return None
+
+
+def unshorten_url(url):
+    final_url = fetch_final_url(url)
+    # return original url in case of errors
+    return url if final_url is None else final_url
+
+
+async def aunshorten_url(url, session: ClientSession):
+    final_url = await afetch_final_url(url, session)
+    # return original url in case of errors
+    return url if final_url is None else final_url
+
+
+class UrlAction(str, Enum):
+    RESOLVE = "resolve"  # follow redirects over the network
+    REWRITE = "rewrite"  # canonicalize locally using a regex rule
+    PASS = "pass"  # host never redirects anywhere interesting, keep url as is
+
+
+class UrlRule:
+    """
+    Rule deciding how URLs on `host` (or any of its subdomains) are expanded.
+    REWRITE rules substitute `pattern` with `replacement` (see `re.sub`); URLs
+    on the host not matching `pattern` fall back to being resolved remotely.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        action: UrlAction,
+        pattern: str = None,
+        replacement: str = None,
+    ) -> None:
+        self.host = host.lower()
+        self.action = UrlAction(action)
+        if self.action == UrlAction.REWRITE and (pattern is None or replacement is None):
+            raise ValueError(f"Rewrite rule for {host} requires pattern and replacement")
+        self.pattern = re.compile(pattern, re.IGNORECASE) if pattern else None
+        self.replacement = replacement
+
+    def rewrite(self, url: str) -> Optional[str]:
+        if self.pattern is None or not self.pattern.match(url):
+            return None
+        return self.pattern.sub(self.replacement, url, count=1)
+
+
+class UrlRuleEngine:
+    """
+    Decides per host whether a URL needs a network round trip to be expanded,
+    and counts how many network calls the rules avoided. Thread safe, since
+    `normalize_urls` applies the rules from executor threads.
+    """
+
+    def __init__(
+        self, rules: List[UrlRule], default_action: UrlAction = UrlAction.RESOLVE
+    ) -> None:
+        self.default_action = UrlAction(default_action)
+        self.rules = {rule.host: rule for rule in rules}
+        self.counts = Counter()
+        self._counts_lock = threading.Lock()
+
+    @classmethod
+    def from_dicts(cls, rules: List[dict], **kwargs) -> "UrlRuleEngine":
+        return cls([UrlRule(**rule) for rule in rules], **kwargs)
+
+    def get_rule(self, url: str) -> Optional[UrlRule]:
+        host = urlparse(url).hostname or ""
+        # match host, then each parent domain
+        labels = host.split(".")
+        for i in range(len(labels) - 1):
+            rule = self.rules.get(".".join(labels[i:]))
+            if rule is not None:
+                return rule
+        return None
+
+    def rewrite(self, url: str) -> str:
+        """
+        Apply local rewrite rule for `url`, if any.
+        """
+        rule = self.get_rule(url)
+        if rule is not None and rule.action == UrlAction.REWRITE:
+            return rule.rewrite(url) or url
         return url
 
+    def count(self, action: UrlAction):
+        with self._counts_lock:
+            self.counts[action.value] += 1
+
+    def resolve_locally(self, url: str) -> Optional[str]:
+        """
+        Return expanded `url` if it can be decided without a network call, else None.
+        """
+        rule = self.get_rule(url)
+        action = rule.action if rule is not None else self.default_action
+
+        if action == UrlAction.PASS:
+            self.count(UrlAction.PASS)
+            return url
+
+        if action == UrlAction.REWRITE:
+            rewritten = rule.rewrite(url)
+            if rewritten is not None:
+                self.count(UrlAction.REWRITE)
+                return rewritten
+
+        self.count(UrlAction.RESOLVE)
+        return None
+
+    def stats(self) -> dict:
+        with self._counts_lock:
+            counts = dict(self.counts)
+        return {
+            **{action.value: counts.get(action.value, 0) for action in UrlAction},
+            "network_calls_avoided": counts.get(UrlAction.PASS.value, 0)
+            + counts.get(UrlAction.REWRITE.value, 0),
+        }
+
+
+ACADEMIC_PASS_HOSTS = [
+    "arxiv.org",
+    "biorxiv.org",
+    "medrxiv.org",
+    "psyarxiv.com",
+    "osf.io",
+    "ssrn.com",
+    "pubmed.ncbi.nlm.nih.gov",
+    "ncbi.nlm.nih.gov",
+    "europepmc.org",
+    "semanticscholar.org",
+    "openreview.net",
+    "aclanthology.org",
+    "proceedings.neurips.cc",
+    "proceedings.mlr.press",
+    "nature.com",
+    "science.org",
+    "cell.com",
+    "pnas.org",
+    "plos.org",
+    "elifesciences.org",
+    "frontiersin.org",
+    "mdpi.com",
+    "springer.com",
+    "sciencedirect.com",
+    "wiley.com",
+    "tandfonline.com",
+    "sagepub.com",
+    "royalsocietypublishing.org",
+    "jstor.org",
+    "acm.org",
+    "ieee.org",
+    "zenodo.org",
+]
+
+DEFAULT_URL_RULES = [
+    {
+        # canonical DOI url, no need to follow the redirect to the publisher
+        "host": "doi.org",
+        "action": UrlAction.REWRITE,
+        "pattern": r"^https?://(?:dx\.|www\.)?doi\.org/(10\.\S+)$",
+        "replacement": r"https://doi.org/\1",
+    },
+    {
+        "host": "twitter.com",
+        "action": UrlAction.REWRITE,
+        "pattern": r"^https?://(?:www\.|mobile\.)?twitter\.com/(\w+)/status/(\d+).*$",
+        "replacement": r"https://twitter.com/\1/status/\2",
+    },
+    {
+        "host": "x.com",
+        "action": UrlAction.REWRITE,
+        "pattern": r"^https?://(?:www\.|mobile\.)?x\.com/(\w+)/status/(\d+).*$",
+        "replacement": r"https://twitter.com/\1/status/\2",
+    },
+] + [{"host": host, "action": UrlAction.PASS} for host in ACADEMIC_PASS_HOSTS]
+
+_url_rules = UrlRuleEngine.from_dicts(DEFAULT_URL_RULES)
+
+
+def get_url_rule_engine() -> UrlRuleEngine:
+    return _url_rules
+
+
+def set_url_rule_engine(engine: UrlRuleEngine):
+    global _url_rules
+    _url_rules = engine
+
+
+def cache_normalized_url(url: str, normalized_url: str):
+    _url_cache.set(url, normalized_url)
+    # normalized urls are already expanded, so map to themselves
+    _url_cache.set(normalized_url, normalized_url)
+
 
 # based on ChatGPT and https://stackoverflow.com/a/6041965
 def extract_urls(text):
@@ -122,28 +397,134 @@ def normalize_url(url):
     Process url to convert it to canonical format.
 
     Includes:
-    - URL unshortening
+    - URL unshortening (skipped for hosts with a local rule, see `UrlRuleEngine`)
     -Normalization (using https://pypi.org/project/url-normalize/)
 
-
+    Results are cached, so URLs seen before (including already
+    normalized URLs) skip the network.
     """
-    res = unshorten_url(url)
-    res = url_normalize(res)
+    local_url = _url_rules.resolve_locally(url)
+    if local_url is not None:
+        return url_normalize(local_url)
+
+    cached = _url_cache.get(url)
+    if cached is not None:
+        return cached
+
+    final_url = fetch_final_url(url)
+    if final_url is None:
+        # failed to resolve - normalize original url and don't cache
+        return url_normalize(url)
+
+    res = url_normalize(_url_rules.rewrite(final_url))
+    cache_normalized_url(url, res)
 
     return res
 
 
-def extract_and_expand_urls(text):
-    """_summary_
+def normalize_urls(urls: List[str]) -> List[str]:
+    """
+    Apply `normalize_url` to all `urls`, resolving uncached URLs concurrently.
+    """
+    if len(urls) <= 1:
+        return [normalize_url(url) for url in urls]
+    return list(get_url_executor().map(normalize_url, urls))
 
-    Args:
-        text (_type_): _description_
+
+def extract_and_expand_urls(text):
+    """
+    Extract all URLs in `text` and return them unshortened and normalized.
     """
 
-    expanded_urls = [normalize_url(url) for url in extract_urls(text)]
+    expanded_urls = normalize_urls(extract_urls(text))
     return expanded_urls
 
 
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return a process-wide event loop running on a daemon thread. Running all
+    sync-to-async calls on the same loop lets async clients that are created
+    once and reused (e.g. the LLM HTTP clients) stay bound to a single loop.
+    """
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, daemon=True).start()
+            _background_loop = loop
+    return _background_loop
+
+
+def run_coroutine_sync(coro):
+    """
+    Run coroutine `coro` to completion from sync code and return its result.
+    Safe to call while an event loop is already running in this thread (e.g.
+    from a notebook or an async server), since the coroutine runs on the
+    background loop.
+    """
+    loop = get_background_loop()
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        coro.close()
+        raise RuntimeError("run_coroutine_sync called from the background loop")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def iterate_async_sync(agen):
+    """
+    Iterate async iterator `agen` from sync code, yielding each item as soon as
+    it is produced.
+    """
+    loop = get_background_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                break
+    finally:
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+
+
+async def anormalize_url(url, session: ClientSession):
+    """
+    Async version of `normalize_url`.
+    """
+    local_url = _url_rules.resolve_locally(url)
+    if local_url is not None:
+        return url_normalize(local_url)
+
+    cached = _url_cache.get(url)
+    if cached is not None:
+        return cached
+
+    final_url = await afetch_final_url(url, session)
+    if final_url is None:
+        return url_normalize(url)
+
+    res = url_normalize(_url_rules.rewrite(final_url))
+    cache_normalized_url(url, res)
+
+    return res
+
+
+async def aextract_and_expand_urls(text, session: ClientSession):
+    """
+    Async version of `extract_and_expand_urls`, expanding all URLs concurrently.
+    """
+    expanded_urls = await asyncio.gather(
+        *[anormalize_url(url, session) for url in extract_urls(text)]
+    )
+    return list(expanded_urls)
+
+
 def render_to_py_dict(obj_dict, obj_name: str = "object", out_path: str = "output.py"):
     template_str = """{{ obj_name }} = {
     {% for key, value in obj_dict.items() -%}
@@ -170,6 +551,8 @@ def render_to_py_dict(obj_dict, obj_name: str = "object", out_path: str = "outpu
         else:
             raise TypeError(f"Unsupported type: {type(value)}")
 
+    from jinja2 import Environment, BaseLoader
+
     env = Environment(loader=BaseLoader())
     env.filters["to_py"] = to_py_filter
 
@@ -9,10 +9,78 @@ from aiohttp.client import ClientSession
 
 import requests
 from urllib.parse import quote
+from url_normalize import url_normalize
+
+from ..cache import BaseCache, create_cache
+
+# how long successful / failed citoid lookups are cached (seconds)
+CITOID_CACHE_TTL = 7 * 24 * 60 * 60
+CITOID_ERROR_CACHE_TTL = 10 * 60
+
+# per URL request timeout (seconds) and max parallel citoid requests
+CITOID_TIMEOUT = 10
+CITOID_MAX_CONCURRENCY = 10
+
+_citoid_cache: BaseCache = create_cache(max_size=4096, ttl=CITOID_CACHE_TTL)
+
+
+def get_citoid_cache() -> BaseCache:
+    return _citoid_cache
+
+
+def set_citoid_cache(cache: BaseCache):
+    """
+    Replace the cache used for citoid lookups, e.g. with
+    `create_cache(db_path=...)` to persist results on disk.
+    """
+    global _citoid_cache
+    _citoid_cache = cache
+
+
+def get_citoid_cache_key(target_url: str) -> str:
+    try:
+        return url_normalize(target_url)
+    except Exception:
+        return target_url
+
+
+def is_citoid_error(result: dict) -> bool:
+    msg = result.get("msg")
+    return isinstance(msg, str) and msg.startswith("Error:")
+
+
+def get_cached_citation(target_url: str):
+    result = _citoid_cache.get(get_citoid_cache_key(target_url))
+    if result is None:
+        return None
+    result = dict(result)
+    if not is_citoid_error(result):
+        result["original_url"] = target_url
+    return result
+
+
+def is_transient_status(status: int) -> bool:
+    """Whether a citoid response `status` is worth retrying (rate limit or server error)."""
+    return status == 429 or status >= 500
+
+
+def get_status_error(status: int) -> dict:
+    return {"msg": f"Error: Unable to fetch data. Status code: {status}"}
+
+
+def cache_citation(target_url: str, result: dict):
+    ttl = CITOID_ERROR_CACHE_TTL if is_citoid_error(result) else CITOID_CACHE_TTL
+    _citoid_cache.set(get_citoid_cache_key(target_url), result, ttl=ttl)
 
 
 # https://plainenglish.io/blog/send-http-requests-as-fast-as-possible-in-python-304134d46604
-async def fetch_citation_async(target_url, session: ClientSession):
+async def fetch_citation_async(
+    target_url, session: ClientSession, timeout: float = CITOID_TIMEOUT
+):
+    cached = get_cached_citation(target_url)
+    if cached is not None:
+        return cached
+
     # Fixed part of the API endpoint
     base_url = "https://en.wikipedia.org/api/rest_v1/data/citation/zotero/"
 
@@ -25,32 +93,62 @@ async def fetch_citation_async(target_url, session: ClientSession):
 
     # Headers to be sent with the request
     headers = {"accept": "application/json; charset=utf-8;"}
-    async with session.get(full_url, headers=headers) as response:
-        result = await response.json()
-        try:
-            result = result[0]
-            return result
-        except Exception as e:
-            return {"msg": f"Error: Unable to fetch data. Error: {e}"}
-
-
-async def fetch_all_citations(urls: list):
-    my_conn = aiohttp.TCPConnector(limit=10)
-    async with aiohttp.ClientSession(connector=my_conn) as session:
-        tasks = []
-        for url in urls:
-            task = asyncio.ensure_future(
-                fetch_citation_async(target_url=url, session=session)
-            )
-            tasks.append(task)
-        results = await asyncio.gather(
-            *tasks, return_exceptions=True
-        )  # the await must be nest inside of the session
+    try:
+        async with session.get(
+            full_url,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            if is_transient_status(response.status):
+                # transient failure - don't cache
+                return get_status_error(response.status)
+            result = await response.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        # transient failure - don't cache
+        return {"msg": f"Error: Unable to fetch data. Error: {e!r}"}
+
+    try:
+        result = result[0]
+        result["original_url"] = target_url
+    except Exception as e:
+        result = {"msg": f"Error: Unable to fetch data. Error: {e}"}
+
+    cache_citation(target_url, result)
+    return result
+
+
+async def fetch_all_citations(
+    urls: list,
+    max_concurrency: int = CITOID_MAX_CONCURRENCY,
+    timeout: float = CITOID_TIMEOUT,
+    session: ClientSession = None,
+) -> List[dict]:
+    """
+    Fetch citoid metadata for all `urls` concurrently, with at most `max_concurrency`
+    requests in flight and a `timeout` (seconds) per URL. Results are returned in
+    the order of `urls`. If `session` is not provided a new one is created for the call.
+    """
+    if session is None:
+        my_conn = aiohttp.TCPConnector(limit=max_concurrency)
+        async with aiohttp.ClientSession(connector=my_conn) as session:
+            return await fetch_all_citations(urls, max_concurrency, timeout, session)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(url):
+        async with semaphore:
+            return await fetch_citation_async(url, session, timeout)
+
+    results = await asyncio.gather(*[fetch(url) for url in urls])
 
     return results
 
 
-def fetch_citation(target_url):
+def fetch_citation(target_url, timeout: float = CITOID_TIMEOUT):
+    cached = get_cached_citation(target_url)
+    if cached is not None:
+        return cached
+
     # Fixed part of the API endpoint
     base_url = "https://en.wikipedia.org/api/rest_v1/data/citation/zotero/"
 
@@ -64,22 +162,31 @@ def fetch_citation(target_url):
     headers = {"accept": "application/json; charset=utf-8;"}
 
     # Sending a GET request to the API
-    response = requests.get(full_url, headers=headers)
+    try:
+        response = requests.get(full_url, headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        # transient failure - don't cache
+        return {"msg": f"Error: Unable to fetch data. Error: {e!r}"}
+
+    if is_transient_status(response.status_code):
+        # transient failure - don't cache
+        return get_status_error(response.status_code)
 
     # Checking if the request was successful
     if response.status_code == 200:
-        # return JSON response
-        response = response.json()[0]
-
-        # remember the target url as the original_url
-        response["original_url"] = target_url
+        try:
+            # return JSON response
+            result = response.json()[0]
 
-        return response
+            # remember the target url as the original_url
+            result["original_url"] = target_url
+        except Exception as e:
+            result = {"msg": f"Error: Unable to fetch data. Error: {e}"}
     else:
-        formatted_err_msg = {
-            "msg": f"Error: Unable to fetch data. Status code: {response.status_code}"
-        }
-        return formatted_err_msg
+        result = get_status_error(response.status_code)
+
+    cache_citation(target_url, result)
+    return result
 
 
 def fetch_citations(urls) -> List:
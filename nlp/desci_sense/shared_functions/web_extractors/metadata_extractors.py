@@ -1,7 +1,10 @@
 from typing import List
 from enum import Enum
 
+from aiohttp.client import ClientSession
+
 from ..interface import RefMetadata
+from ..utils import run_coroutine_sync
 from .citoid import fetch_citation, fetch_all_citations
 
 
@@ -89,10 +92,8 @@ def extract_urls_citoid_metadata(
         return [extract_citoid_metadata(target_urls[0], max_summary_length)]
     else:
         # use parallel call
-        metadatas_raw = fetch_all_citations(target_urls)
-        return [
-            normalize_citoid_metadata(md, max_summary_length) for md in metadatas_raw
-        ]
+        metadatas_raw = run_coroutine_sync(fetch_all_citations(target_urls))
+        return normalize_citoid_metadata(metadatas_raw, max_summary_length)
 
 
 def extract_all_metadata_by_type(
@@ -113,3 +114,22 @@ def extract_all_metadata_by_type(
         return extract_urls_citoid_metadata(target_urls, max_summary_length)
     else:
         raise ValueError(f"Unsupported extraction type:{md_type.value}")
+
+
+async def aextract_all_metadata_by_type(
+    target_urls,
+    md_type: MetadataExtractionType,
+    max_summary_length: int,
+    session: ClientSession = None,
+) -> List[RefMetadata]:
+    """
+    Async version of `extract_all_metadata_by_type`. Lookups for all URLs
+    run concurrently, reusing `session` if provided.
+    """
+    if md_type == MetadataExtractionType.NONE or len(target_urls) == 0:
+        return []
+    if md_type == MetadataExtractionType.CITOID:
+        metadatas_raw = await fetch_all_citations(target_urls, session=session)
+        return normalize_citoid_metadata(metadatas_raw, max_summary_length)
+    else:
+        raise ValueError(f"Unsupported extraction type:{md_type.value}")
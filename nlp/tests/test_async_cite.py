@@ -12,12 +12,15 @@ from desci_sense.shared_functions.web_extractors.citoid import (
     fetch_all_citations,
     fetch_citation,
 )
+from desci_sense.shared_functions.web_extractors import citoid
+from desci_sense.shared_functions.cache import create_cache
 
 
-def test_fetch_speed():
+def test_fetch_speed(monkeypatch):
     # teting that async citoid fetch is faster than serial fetch
     # run async
     url_list = ["https://www.google.com", "https://www.bing.com"] * 3
+    monkeypatch.setattr(citoid, "_citoid_cache", create_cache(max_size=0))
     start = time.time()
     asyncio.run(fetch_all_citations(url_list))
     end = time.time()
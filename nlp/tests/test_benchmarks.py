@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "benchmarks"))
+
+import json
+
+import suite
+
+
+def test_benchmark_scenarios_run_offline():
+    results = suite.run_suite(sizes=[2], isolated=False)
+    assert set(results) == {f"{name}[2]" for name in suite.SCENARIOS}
+    for result in results.values():
+        assert result["n"] == 2
+        assert 0 < result["p50_ms"] <= result["p95_ms"]
+        assert result["throughput"] > 0
+        assert result["peak_rss_mb"] > 0
+
+
+def test_compare_to_baselines(tmp_path):
+    path = tmp_path / "baselines.json"
+    baseline = {
+        "n": 100,
+        "p50_ms": 1.0,
+        "p95_ms": 2.0,
+        "throughput": 500.0,
+        "peak_rss_mb": 100.0,
+    }
+    suite.save_baselines(path, {"extract_tags[100]": baseline})
+    baselines = suite.load_baselines(path)
+    assert baselines["results"]["extract_tags[100]"] == baseline
+    assert "python" in baselines["environment"]
+
+    within_tolerance = {**baseline, "p95_ms": 2.4, "throughput": 450.0}
+    assert (
+        suite.compare_to_baselines({"extract_tags[100]": within_tolerance}, baselines)
+        == []
+    )
+
+    slower = {**baseline, "p95_ms": 3.0, "throughput": 300.0}
+    regressions = suite.compare_to_baselines(
+        {"extract_tags[100]": slower, "new_scenario[1]": slower}, baselines
+    )
+    assert [(key, metric) for key, metric, _, _ in regressions] == [
+        ("extract_tags[100]", "p95_ms"),
+        ("extract_tags[100]", "throughput"),
+    ]
+
+    # results are merged into stored baselines
+    suite.save_baselines(path, {"extract_tags[1]": baseline})
+    assert set(json.loads(path.read_text())["results"]) == {
+        "extract_tags[1]",
+        "extract_tags[100]",
+    }
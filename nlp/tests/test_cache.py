@@ -0,0 +1,227 @@
+import sys
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+from langchain_community.chat_models.fake import FakeListChatModel
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+
+from desci_sense.shared_functions.cache import (
+    LRUCache,
+    SQLiteCache,
+    TieredCache,
+    create_cache,
+)
+from desci_sense.shared_functions.llm_cache import CachedChatModel
+from desci_sense.shared_functions.web_extractors import citoid
+from desci_sense.shared_functions.web_extractors.citoid import (
+    fetch_citation,
+    get_citoid_cache,
+)
+
+
+def test_lru_eviction():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_expiry():
+    cache = LRUCache(ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+
+def test_sqlite_persistence(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    cache = SQLiteCache(db_path)
+    cache.set("url", {"title": "paper"})
+    cache.close()
+    assert SQLiteCache(db_path).get("url") == {"title": "paper"}
+
+
+def test_sqlite_table_name_validated(tmp_path):
+    with pytest.raises(ValueError):
+        SQLiteCache(str(tmp_path / "cache.db"), table="cache; DROP TABLE cache")
+
+
+def test_cache_counts_thread_safe():
+    cache = LRUCache()
+    cache.set("hit", 1)
+    threads = [
+        threading.Thread(
+            target=lambda: [cache.get(k) for k in ["hit", "miss"] * 5000]
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 4 * 5000
+
+
+def test_tiered_promotion(tmp_path):
+    cache = create_cache(db_path=str(tmp_path / "cache.db"))
+    assert isinstance(cache, TieredCache)
+    cache.tiers[1].set("url", "value")
+    assert cache.get("url") == "value"
+    assert len(cache.tiers[0]) == 1
+
+
+def mock_response(status_code, json_data=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = json_data
+    return response
+
+
+@pytest.fixture
+def citoid_cache(monkeypatch):
+    """Fresh citoid cache, restored after the test."""
+    cache = create_cache()
+    monkeypatch.setattr(citoid, "_citoid_cache", cache)
+    return cache
+
+
+def test_citoid_cache_hit(citoid_cache):
+    with patch.object(
+        citoid.requests, "get", return_value=mock_response(200, [{"title": "T"}])
+    ) as mock_get:
+        first = fetch_citation("https://arxiv.org/abs/2402.04607")
+        # normalized url maps to same cache entry
+        second = fetch_citation("https://ARXIV.org/abs/2402.04607")
+        assert mock_get.call_count == 1
+    assert first["title"] == second["title"] == "T"
+    assert second["original_url"] == "https://ARXIV.org/abs/2402.04607"
+    assert get_citoid_cache().stats()["hits"] == 1
+
+
+def test_citoid_negative_cache(citoid_cache, monkeypatch):
+    with patch.object(
+        citoid.requests, "get", return_value=mock_response(404)
+    ) as mock_get:
+        fetch_citation("https://www.alink.com")
+        result = fetch_citation("https://www.alink.com")
+        assert mock_get.call_count == 1
+    assert result["msg"].startswith("Error:")
+
+    with patch.object(citoid, "CITOID_ERROR_CACHE_TTL", 0), patch.object(
+        citoid.requests, "get", return_value=mock_response(404)
+    ) as mock_get:
+        monkeypatch.setattr(citoid, "_citoid_cache", create_cache())
+        fetch_citation("https://www.alink.com")
+        fetch_citation("https://www.alink.com")
+        assert mock_get.call_count == 2
+
+
+def test_citoid_transient_errors_not_cached(citoid_cache):
+    with patch.object(
+        citoid.requests, "get", return_value=mock_response(503)
+    ) as mock_get:
+        result = fetch_citation("https://www.alink.com")
+        fetch_citation("https://www.alink.com")
+        assert mock_get.call_count == 2
+        assert mock_get.call_args.kwargs["timeout"] == citoid.CITOID_TIMEOUT
+    assert result["msg"].startswith("Error:")
+
+    with patch.object(
+        citoid.requests, "get", side_effect=citoid.requests.Timeout()
+    ) as mock_get:
+        assert fetch_citation("https://www.alink.com")["msg"].startswith("Error:")
+        fetch_citation("https://www.alink.com")
+        assert mock_get.call_count == 2
+    assert len(citoid_cache) == 0
+
+
+class FakeModel(FakeListChatModel):
+    temperature: float = 0.0
+
+
+def test_cached_chat_model():
+    model = FakeModel(responses=["first", "second"])
+    cached_model = CachedChatModel(model, create_cache(), namespace="ont_v1")
+    assert cached_model.invoke("prompt").content == "first"
+    # cached - model not called again
+    assert cached_model.invoke("prompt").content == "first"
+    assert asyncio.run(cached_model.ainvoke("prompt")).content == "first"
+    assert cached_model.invoke("other prompt").content == "second"
+
+    # different namespace (e.g. ontology version) is a separate entry
+    other_ns = CachedChatModel(model, cached_model.response_cache, namespace="ont_v2")
+    messages = [HumanMessage(content="prompt")]
+    assert other_ns.get_cache_key(messages) != cached_model.get_cache_key(messages)
+
+    # so are calls with other stop sequences or call kwargs
+    key = cached_model.get_cache_key(messages)
+    assert cached_model.get_cache_key(messages, stop=["\n"]) != key
+    assert cached_model.get_cache_key(messages, max_tokens=10) != key
+    assert cached_model.get_cache_key(
+        messages, max_tokens=10, top_p=0.5
+    ) == cached_model.get_cache_key(messages, top_p=0.5, max_tokens=10)
+
+
+def test_cached_chat_model_deterministic_only():
+    model = FakeModel(responses=["first", "second"], temperature=0.6)
+    cached_model = CachedChatModel(model, create_cache(), deterministic_only=True)
+    assert cached_model.invoke("prompt").content == "first"
+    assert cached_model.invoke("prompt").content == "second"
+
+
+class StreamingFakeModel(FakeModel):
+    # reports tokens to callbacks, as ChatOpenAI does
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for chunk in super()._stream(messages, stop, run_manager, **kwargs):
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def test_cached_chat_model_streams():
+    model = StreamingFakeModel(responses=["first answer", "second answer"])
+    cached_model = CachedChatModel(model, create_cache())
+
+    # tokens are streamed from the wrapped model, and reach callbacks
+    tokens = []
+
+    class TokenHandler(BaseCallbackHandler):
+        def on_llm_new_token(self, token, **kwargs):
+            tokens.append(token)
+
+    chunks = list(cached_model.stream("prompt", {"callbacks": [TokenHandler()]}))
+    assert [c.content for c in chunks] == list("first answer")
+    assert tokens == list("first answer")
+    # then served from cache
+    assert [c.content for c in cached_model.stream("prompt")] == ["first answer"]
+    assert cached_model.invoke("prompt").content == "first answer"
+
+    async def astream(prompt):
+        return [c.content async for c in cached_model.astream(prompt)]
+
+    assert asyncio.run(astream("prompt")) == ["first answer"]
+
+    # stream stopped early is only replayed to streams
+    stream = cached_model.stream("other prompt")
+    assert [next(stream).content for _ in range(3)] == list("sec")
+    stream.close()
+    assert [c.content for c in cached_model.stream("other prompt")] == ["sec"]
+    assert cached_model.invoke("other prompt").content == "first answer"
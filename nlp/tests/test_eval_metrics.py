@@ -0,0 +1,100 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+
+import timeit
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import (
+    precision_recall_fscore_support,
+    accuracy_score,
+    confusion_matrix,
+)
+from sklearn.preprocessing import MultiLabelBinarizer
+
+from desci_sense.evaluation.eval_metrics import (
+    calculate_scores,
+    create_custom_confusion_matrix,
+    score_chart_by_label,
+)
+
+
+# previous implementations, based on sklearn and loops over label pairs
+def legacy_calculate_scores(y_pred, y_true):
+    precision, recall, f1_score, support = precision_recall_fscore_support(
+        y_true, y_pred, average=None, zero_division=0
+    )
+    accuracy = accuracy_score(y_pred=y_pred, y_true=y_true)
+    return precision, recall, f1_score, support, accuracy
+
+
+def legacy_create_custom_confusion_matrix(y_true, y_pred, labels):
+    matrix = np.zeros((len(labels), len(labels)))
+    for i, label_i in enumerate(labels):
+        for j, label_j in enumerate(labels):
+            if i == j:
+                tp = confusion_matrix(y_true[:, i], y_pred[:, i]).ravel()[3]
+                matrix[i, i] = tp
+            else:
+                fn_i = y_true[:, i] & ~y_pred[:, i]
+                fp_j = ~y_true[:, j] & y_pred[:, j]
+                matrix[i, j] = np.sum(fn_i & fp_j)
+    return pd.DataFrame(matrix, index=labels, columns=labels)
+
+
+def random_predictions(n_posts: int, n_labels: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    labels = [f"label-{i}" for i in range(n_labels)]
+    y_true = [
+        list(rng.choice(labels, rng.integers(1, 4), replace=False))
+        for _ in range(n_posts)
+    ]
+    y_pred = [
+        list(rng.choice(labels, rng.integers(0, 4), replace=False))
+        for _ in range(n_posts)
+    ]
+    mlb = MultiLabelBinarizer()
+    mlb.fit(y_pred + y_true)
+    return mlb.transform(y_pred), mlb.transform(y_true), mlb.classes_
+
+
+def test_confusion_matrix_same_as_legacy():
+    y_pred, y_true, labels = random_predictions(500, 12)
+    legacy = legacy_create_custom_confusion_matrix(y_true, y_pred, labels)
+    pd.testing.assert_frame_equal(
+        create_custom_confusion_matrix(y_true, y_pred, labels), legacy
+    )
+
+
+def test_scores_same_as_legacy():
+    y_pred, y_true, labels = random_predictions(500, 12, seed=1)
+    # a label that is never predicted
+    y_pred[:, 0] = 0
+    scores = calculate_scores(y_pred=y_pred, y_true=y_true)
+    legacy = legacy_calculate_scores(y_pred=y_pred, y_true=y_true)
+    for value, legacy_value in zip(scores, legacy):
+        np.testing.assert_allclose(value, legacy_value)
+
+    chart = score_chart_by_label(labels, y_pred, y_true)
+    assert list(chart["Labels"]) == list(labels) + ["Average"]
+    assert list(chart["True label Count"]) == list(sum(y_true)) + [sum(sum(y_true))]
+    assert chart["F1 score"].iloc[-1] == np.mean(legacy[2])
+
+
+def test_confusion_matrix_speedup():
+    y_pred, y_true, labels = random_predictions(2000, 40)
+
+    # best of several runs, so that a slow run on a loaded machine doesn't count
+    def best_time(create_matrix) -> float:
+        return min(
+            timeit.repeat(
+                lambda: create_matrix(y_true, y_pred, labels), number=1, repeat=3
+            )
+        )
+
+    assert best_time(create_custom_confusion_matrix) < best_time(
+        legacy_create_custom_confusion_matrix
+    )
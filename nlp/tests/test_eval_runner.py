@@ -0,0 +1,108 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+
+import time
+import threading
+
+from desci_sense.evaluation import eval_runner
+from desci_sense.evaluation.eval_runner import (
+    create_prediction_cache,
+    get_config_hash,
+    predict_rows,
+)
+from desci_sense.shared_functions.init import init_multi_stage_parser_config
+
+TEXTS = [f"post number {i} about https://example.com/{i % 10}" for i in range(200)]
+
+
+class FakeModel:
+    def __init__(self, latency: float = 0.01, fail_on=()):
+        self.latency = latency
+        self.fail_on = set(fail_on)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def predict(self, text: str) -> dict:
+        with self.lock:
+            self.calls.append(text)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+        if text in self.fail_on:
+            raise RuntimeError("LLM call failed")
+        return {"multi_tag": [text.split()[2]], "reasoning": f"because {text}"}
+
+
+def test_predict_rows_concurrent_in_order():
+    model = FakeModel()
+    predictions = predict_rows(TEXTS, model.predict, "config", max_workers=20)
+    # rows are predicted concurrently, by at most max_workers threads
+    assert 1 < model.max_in_flight <= 20
+    assert predictions == [model.predict(t) for t in TEXTS]
+
+
+def test_predict_rows_cache_and_resume(tmp_path):
+    config = init_multi_stage_parser_config(
+        {
+            "openai_api_base": "https://openrouter.ai/api/v1",
+            "openai_api_key": "key",
+            "openai_api_referer": "referer",
+            "wandb_project": "project",
+        }
+    )
+    config_hash = get_config_hash(config)
+    cache_path = str(tmp_path / "predictions.db")
+
+    # crashed run: some rows fail
+    model = FakeModel(fail_on=TEXTS[:5])
+    predictions = predict_rows(
+        TEXTS, model.predict, config_hash, create_prediction_cache(cache_path)
+    )
+    assert predictions[:5] == [None] * 5
+    assert all(p is not None for p in predictions[5:])
+
+    # resumed run only predicts the missing rows
+    model = FakeModel()
+    predictions = predict_rows(
+        TEXTS, model.predict, config_hash, create_prediction_cache(cache_path)
+    )
+    assert sorted(model.calls) == sorted(TEXTS[:5])
+    assert predictions == [model.predict(t) for t in TEXTS]
+
+    # unchanged config: nothing to predict
+    model = FakeModel()
+    assert (
+        predict_rows(
+            TEXTS, model.predict, config_hash, create_prediction_cache(cache_path)
+        )
+        == predictions
+    )
+    assert model.calls == []
+
+    # changing the model invalidates the cache, changing credentials doesn't
+    config["wandb"]["project"] = "other"
+    config["openai_api"]["openai_api_key"] = "other"
+    assert get_config_hash(config) == config_hash
+    config["model"]["temperature"] = 0.9
+    assert get_config_hash(config) != config_hash
+
+
+def test_config_hash_covers_templates(monkeypatch):
+    config = init_multi_stage_parser_config(
+        {
+            "openai_api_base": "https://openrouter.ai/api/v1",
+            "openai_api_key": "key",
+            "openai_api_referer": "referer",
+            "wandb_project": "project",
+        }
+    )
+    config_hash = get_config_hash(config)
+    monkeypatch.setattr(eval_runner, "get_templates_hash", lambda: "edited")
+    assert get_config_hash(config) != config_hash
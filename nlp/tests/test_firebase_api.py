@@ -4,7 +4,36 @@ from pathlib import Path
 ROOT = Path(__file__).parents[1]
 sys.path.append(str(ROOT))
 
-from desci_sense.shared_functions.interface import ParserResult
+import json
+import time
+import asyncio
+from typing import ClassVar
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from loguru import logger
+
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from rdflib import Graph
+from rdflib.compare import isomorphic
+
+from desci_sense.shared_functions.interface import ParserResult, CompactParserResult
+from desci_sense.shared_functions.init import (
+    init_multi_stage_parser_config,
+    BATCH_MAX_CONCURRENCY_LIMIT,
+)
+from desci_sense.shared_functions import main
+from desci_sense.shared_functions.main import (
+    SM_FUNCTION_post_parser_batch_imp,
+    SM_FUNCTION_post_parser_json_imp,
+    SM_FUNCTION_ontology_imp,
+)
+from desci_sense.shared_functions.parsers import firebase_api_parser
+from desci_sense.shared_functions.schema.post import RefPost
+from desci_sense.shared_functions.web_extractors import citoid
+from desci_sense.shared_functions.cache import create_cache
+from desci_sense.shared_functions.fake_llm import FakeChatModel
 from desci_sense.configs import default_init_parser_config
 from desci_sense.shared_functions.parsers.firebase_api_parser import (
     FirebaseAPIParser,
@@ -21,6 +50,30 @@ I really liked this paper!
 https://arxiv.org/abs/2402.04607
 """
 
+TEST_POST_TEXT_NO_REF = "Science is better when done in the open #openscience"
+
+FAKE_COMPLETION = """Reasoning Steps: The post makes a claim.
+Candidate Tags: <dg-claim>
+Final Answer: <dg-claim> #OpenScience #Science"""
+
+
+def create_fake_model(**kwargs):
+    return FakeListChatModel(responses=[FAKE_COMPLETION])
+
+
+TEST_FUNCTION_CONFIG = {
+    "wandb_project": "test",
+    "openai_api_key": "test_key",
+    "openai_api_base": "https://openrouter.ai/api/v1",
+    "openai_api_referer": "https://127.0.0.1:3000/",
+}
+
+
+def create_offline_parser() -> FirebaseAPIParser:
+    config = init_multi_stage_parser_config(TEST_FUNCTION_CONFIG)
+    with patch.object(firebase_api_parser, "ChatOpenAI", create_fake_model):
+        return FirebaseAPIParser(config=config)
+
 
 def test_init():
     config = default_init_parser_config()
@@ -99,3 +152,367 @@ def test_parallel_keywords():
     post = convert_text_to_ref_post(TEST_POST_TEXT_W_REF)
     combined = parser.process_ref_post_parallel(post)
     assert len(combined["keywords"]["answer"]["valid_keywords"]) > 0
+
+
+def test_aprocess_text_offline():
+    parser = create_offline_parser()
+    result = asyncio.run(parser.aprocess_text(TEST_POST_TEXT_NO_REF))
+    sync_result = parser.process_text_parallel(TEST_POST_TEXT_NO_REF)
+    assert isinstance(result, ParserResult)
+    assert set(result.semantics) == set(sync_result.semantics)
+    assert len(result.semantics) == 2
+
+
+def test_process_batch_offline(monkeypatch):
+    parser = create_offline_parser()
+    parser.set_md_extract_method("citoid")
+    monkeypatch.setattr(citoid, "_citoid_cache", create_cache())
+    shared_ref = "https://arxiv.org/abs/2402.04607"
+    posts = [
+        RefPost(author="a", content="post 0", url="", ref_urls=[]),
+        RefPost(author="a", content="post 1", url="", ref_urls=[shared_ref]),
+        RefPost(author="a", content="fail", url="", ref_urls=[]),
+        RefPost(
+            author="a",
+            content="post 3",
+            url="",
+            ref_urls=[shared_ref, "https://www.alink.com/"],
+        ),
+    ]
+    fetched = []
+
+    async def fake_fetch_citation_async(target_url, session, timeout):
+        fetched.append(target_url)
+        return {"url": target_url, "original_url": target_url, "title": target_url}
+
+    create_prompt = parser.create_semantics_prompt_by_case
+
+    def failing_create_prompt(post, case, md_list=None):
+        if post.content == "fail":
+            raise ValueError("bad post")
+        return create_prompt(post, case, md_list)
+
+    with patch.object(
+        citoid, "fetch_citation_async", fake_fetch_citation_async
+    ), patch.object(parser, "create_semantics_prompt_by_case", failing_create_prompt):
+        results = parser.process_batch(posts, max_concurrency=2)
+
+    assert sorted(fetched) == sorted([shared_ref, "https://www.alink.com/"])
+    assert isinstance(results[2], ValueError)
+    for i in [0, 1, 3]:
+        assert isinstance(results[i], ParserResult)
+    assert list(results[3].support.refs_meta) == posts[3].ref_urls
+
+
+class InFlightFakeModel(FakeListChatModel):
+    # concurrent calls, across all instances
+    in_flight: ClassVar[int] = 0
+    max_in_flight: ClassVar[int] = 0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        cls = InFlightFakeModel
+        cls.in_flight += 1
+        cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            return self._generate(messages, stop, **kwargs)
+        finally:
+            cls.in_flight -= 1
+
+
+def test_process_batch_errors_and_concurrency(monkeypatch):
+    config = init_multi_stage_parser_config(TEST_FUNCTION_CONFIG)
+    with patch.object(
+        firebase_api_parser,
+        "ChatOpenAI",
+        lambda **kwargs: InFlightFakeModel(responses=[FAKE_COMPLETION]),
+    ):
+        parser = FirebaseAPIParser(config=config)
+    parser.set_md_extract_method("citoid")
+    monkeypatch.setattr(citoid, "_citoid_cache", create_cache())
+    failing_ref = "https://www.alink.com/fail"
+    posts = [
+        RefPost(author="a", content=f"post {i}", url="", ref_urls=refs)
+        for i, refs in enumerate(
+            [[], ["https://www.alink.com/"], [failing_ref], [], [], [], [], []]
+        )
+    ]
+
+    async def fake_fetch_citation_async(target_url, session, timeout):
+        if target_url == failing_ref:
+            raise RuntimeError("metadata service down")
+        return {"url": target_url, "original_url": target_url, "title": target_url}
+
+    InFlightFakeModel.max_in_flight = 0
+    with patch.object(citoid, "fetch_citation_async", fake_fetch_citation_async):
+        results = parser.process_batch(posts, max_concurrency=3)
+
+    # a failed metadata fetch only drops the metadata of its URL
+    assert all(isinstance(result, ParserResult) for result in results)
+    assert list(results[1].support.refs_meta) == posts[1].ref_urls
+    assert results[2].support.refs_meta == {}
+    # semantics and keywords calls of all prompt cases share the budget
+    assert InFlightFakeModel.max_in_flight == 3
+
+
+def test_batch_function_offline():
+    parser = create_offline_parser()
+    contents = [TEST_POST_TEXT_NO_REF, "fail", "Another post #science"]
+    aprocess_text = parser.aprocess_text
+
+    async def failing_aprocess_text(text, *args, **kwargs):
+        if text == "fail":
+            raise ValueError("bad post")
+        return await aprocess_text(text, *args, **kwargs)
+
+    with patch.object(main, "get_parser", return_value=parser), patch.object(
+        parser, "aprocess_text", failing_aprocess_text
+    ):
+        lines = list(SM_FUNCTION_post_parser_batch_imp(contents, {}, TEST_FUNCTION_CONFIG))
+
+    assert all(line.endswith("\n") for line in lines)
+    items = sorted([json.loads(line) for line in lines], key=lambda x: x["index"])
+    assert [item["index"] for item in items] == [0, 1, 2]
+    assert "error" in items[1]
+    result = ParserResult.model_validate(items[0]["result"])
+    assert len(result.semantics) == 2
+
+
+class SlowFakeParser:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.finished = []
+
+    async def aprocess_text(self, text, session=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0 if text == "fast" else 0.5)
+        finally:
+            self.in_flight -= 1
+        self.finished.append(text)
+        return text
+
+
+def test_batch_function_concurrency_limit_and_cancel():
+    parser = SlowFakeParser()
+    contents = ["fast"] + ["slow"] * 99
+    with patch.object(main, "get_parser", return_value=parser), patch.object(
+        main, "serialize_parser_result", lambda result, *args: json.dumps(result)
+    ):
+        lines = SM_FUNCTION_post_parser_batch_imp(
+            contents, {"max_concurrency": "1000"}, TEST_FUNCTION_CONFIG
+        )
+        assert json.loads(next(lines)) == {"index": 0, "result": "fast"}
+        # client disconnected: the contents still being parsed are cancelled
+        lines.close()
+
+    assert parser.max_in_flight == BATCH_MAX_CONCURRENCY_LIMIT
+    assert parser.finished == ["fast"]
+    assert parser.in_flight == 0
+
+
+def test_llm_cache_offline():
+    config = init_multi_stage_parser_config(
+        TEST_FUNCTION_CONFIG, {"enable_llm_cache": True}
+    )
+    with patch.object(firebase_api_parser, "ChatOpenAI", create_fake_model):
+        parser = FirebaseAPIParser(config=config)
+    parser.process_text_parallel(TEST_POST_TEXT_NO_REF)
+    parser.process_text_parallel(TEST_POST_TEXT_NO_REF)
+    # semantics + keywords calls cached on first parse
+    assert parser.llm_cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5}
+
+
+def test_compiled_prompts_identical():
+    parser = create_offline_parser()
+    post = RefPost(
+        author="Some {{ author }}",
+        content="Content with {% raw %} jinja syntax {{ x }}\nand lines",
+        url="",
+        ref_urls=["https://arxiv.org/abs/2402.04607"],
+    )
+    references_metadata = parser.get_refs_metadata_portion([])
+    for case, case_dict in parser.prompt_case_dict.items():
+        expected = case_dict["prompt_j2_template"].render(
+            type_templates=case_dict["type_templates"],
+            author_name=post.author,
+            content=post.content,
+            references_metadata=references_metadata,
+        )
+        assert parser.create_semantics_prompt_by_case(post, case, []) == expected
+        # tag definitions are part of the static prefix
+        prefix = parser.get_semantics_prompt_prefix(case)
+        assert expected.startswith(prefix)
+        assert f"<{case_dict['type_templates'][0]['label']}>" in prefix
+
+    expected_kw = parser.kw_extraction["prompt_j2_template"].render(
+        author_name=post.author,
+        content=post.content,
+        references_metadata=references_metadata,
+        max_keywords=parser.kw_extraction["max_keywords"],
+    )
+    assert parser.create_kw_prompt(post, []) == expected_kw
+
+
+def test_stream_answers_offline():
+    streamed_chunks = []
+
+    class StreamingFakeModel(FakeListChatModel):
+        def _stream(self, *args, **kwargs):
+            for chunk in super()._stream(*args, **kwargs):
+                streamed_chunks.append(chunk)
+                yield chunk
+
+    completion = FAKE_COMPLETION + "\nMore text generated after the answer..."
+    config = init_multi_stage_parser_config(
+        TEST_FUNCTION_CONFIG, {"stream_answers": True}
+    )
+    with patch.object(
+        firebase_api_parser,
+        "ChatOpenAI",
+        lambda **kwargs: StreamingFakeModel(responses=[completion]),
+    ):
+        parser = FirebaseAPIParser(config=config)
+
+    result = parser.process_text_parallel(TEST_POST_TEXT_NO_REF)
+    assert len(result.semantics) == 2
+    # generation stopped after the answer line (fake model streams per character)
+    answer_end = len(FAKE_COMPLETION) + 1
+    assert len(streamed_chunks) == 2 * answer_end
+
+
+def test_ontology_response_without_parser():
+    main.clear_parser_registry()
+    version, ontology_json = SM_FUNCTION_ontology_imp()
+    # served from the ontology alone
+    assert len(main._parser_registry) == 0
+    assert json.loads(ontology_json)["version"] == version
+    assert SM_FUNCTION_ontology_imp() == (version, ontology_json)
+
+
+def test_compact_response_offline():
+    parser = create_offline_parser()
+    with patch.object(main, "get_parser", return_value=parser):
+        full_json = SM_FUNCTION_post_parser_json_imp(
+            TEST_POST_TEXT_NO_REF, {}, TEST_FUNCTION_CONFIG
+        )
+        nt_json = SM_FUNCTION_post_parser_json_imp(
+            TEST_POST_TEXT_NO_REF, {"format": "compact"}, TEST_FUNCTION_CONFIG
+        )
+        triples_json = SM_FUNCTION_post_parser_json_imp(
+            TEST_POST_TEXT_NO_REF,
+            {"format": "compact", "semantics_format": "json"},
+            TEST_FUNCTION_CONFIG,
+        )
+        version, ontology_json = SM_FUNCTION_ontology_imp()
+
+    full_result = ParserResult.model_validate_json(full_json)
+    nt_result = CompactParserResult.model_validate_json(nt_json)
+    triples_result = CompactParserResult.model_validate_json(triples_json)
+
+    # ontology is referenced by version and served separately
+    assert nt_result.support.ontology_version == version
+    ontology = json.loads(ontology_json)["ontology"]
+    assert ontology == full_result.support.ontology.model_dump()
+    assert len(nt_json) < len(full_json) / 5
+
+    nt_graph = Graph().parse(data=nt_result.semantics, format="nt")
+    assert isomorphic(nt_graph, full_result.semantics)
+    assert len(triples_result.semantics) == len(full_result.semantics)
+    assert {"value": "OpenScience"} in [t[2] for t in triples_result.semantics]
+
+
+def test_fake_llm_offline():
+    config = init_multi_stage_parser_config(
+        {**TEST_FUNCTION_CONFIG, "openai_api_base": "fake://llm?latency=1"},
+        {"stream_answers": True},
+    )
+    parser = FirebaseAPIParser(config=config)
+    assert parser.kw_model.latency == 1
+
+    start = time.perf_counter()
+    result = parser.process_text_parallel(TEST_POST_TEXT_NO_REF)
+    # semantics and keywords calls run in parallel: well below both in turn (2s),
+    # leaving room for pipeline overhead on a loaded machine
+    assert 1 <= time.perf_counter() - start < 1.8
+    assert len(result.semantics) > 0
+    assert result.model_dump() == parser.process_text_parallel(
+        TEST_POST_TEXT_NO_REF
+    ).model_dump()
+
+    # also selectable by model name
+    config = init_multi_stage_parser_config(
+        {**TEST_FUNCTION_CONFIG, "model_name": "fake/llm"}
+    )
+    parser = FirebaseAPIParser(config=config)
+    answer = parser.process_text_st(TEST_POST_TEXT_NO_REF)["answer"]
+    assert set(answer["multi_tag"]) <= set(parser.all_labels)
+    assert len(answer["multi_tag"]) > 0
+
+
+def test_fake_llm_responses_thread_safe():
+    model = FakeChatModel(responses=["a", "b"])
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(
+            executor.map(lambda _: model.invoke("post").content, range(400))
+        )
+    assert responses.count("a") == responses.count("b") == 200
+
+
+def test_stage_timings():
+    config = init_multi_stage_parser_config(
+        {**TEST_FUNCTION_CONFIG, "openai_api_base": "fake://llm?latency=0.05"},
+        {"record_timings": True},
+    )
+    parser = FirebaseAPIParser(config=config)
+
+    records = []
+    handler_id = logger.add(
+        lambda message: records.append(message.record["extra"]),
+        level="DEBUG",
+        filter=lambda record: "stage" in record["extra"],
+    )
+    try:
+        result = parser.process_text_parallel(TEST_POST_TEXT_NO_REF)
+    finally:
+        logger.remove(handler_id)
+
+    timings = result.support.timings
+    assert set(timings) == {
+        "url_unshortening",
+        "ref_metadata",
+        "prompt_rendering",
+        "semantics_llm",
+        "keywords_llm",
+        "rdf_graph",
+        "total",
+    }
+    # LLM branches are timed separately, although they run in parallel
+    assert timings["semantics_llm"] >= 50 and timings["keywords_llm"] >= 50
+    assert timings["total"] < timings["semantics_llm"] + timings["keywords_llm"]
+    assert {(r["trace"], r["stage"]) for r in records} == {
+        ("process_text_parallel", stage) for stage in timings
+    }
+    assert json.loads(result.model_dump_json())["support"]["timings"] == timings
+
+    # serialization is timed as well, in both response formats
+    for response_format in ["full", "compact"]:
+        serialized = json.loads(
+            main.serialize_parser_result(result, parser, {"format": response_format})
+        )
+        serialized_timings = serialized["support"]["timings"]
+        assert serialized_timings.pop("serialization") > 0
+        assert serialized_timings == timings
+    assert result.support.timings == timings
+
+    result = asyncio.run(parser.aprocess_text(TEST_POST_TEXT_NO_REF))
+    assert set(result.support.timings) == set(timings)
+
+    # disabled by default
+    parser = create_offline_parser()
+    result = parser.process_text_parallel(TEST_POST_TEXT_NO_REF)
+    assert result.support.timings is None
+    serialized = json.loads(main.serialize_parser_result(result, parser, {}))
+    assert serialized["support"]["timings"] is None
@@ -0,0 +1,61 @@
+import sys
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+
+ENTRY_MODULE = "desci_sense.shared_functions.main"
+
+# cold start budget for importing the cloud function entry point
+# (cumulative `python -X importtime` time, measured ~80ms)
+IMPORT_TIME_BUDGET_US = 300_000
+
+# dependencies that should only be imported on first use of a parser
+LAZY_MODULES = [
+    "langchain",
+    "langchain_core",
+    "langchain_community",
+    "rdflib",
+    "pandas",
+    "pydantic_settings",
+    "aiohttp",
+    "html2text",
+    "url_normalize",
+    "jinja2",
+    "confection",
+]
+
+
+def get_import_times(module: str) -> dict:
+    """
+    Import `module` in a fresh interpreter with `-X importtime` and return
+    the cumulative import time in microseconds of each imported module.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(ROOT),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        # format: "import time: <self us> | <cumulative us> | <module>"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_entry_point_import_lazy():
+    times = get_import_times(ENTRY_MODULE)
+    loaded = {name.split(".")[0] for name in times}
+    assert loaded.isdisjoint(LAZY_MODULES), loaded.intersection(LAZY_MODULES)
+
+
+def test_entry_point_import_budget():
+    times = get_import_times(ENTRY_MODULE)
+    print(f"{ENTRY_MODULE} import time: {times[ENTRY_MODULE] / 1000:.1f}ms")
+    assert times[ENTRY_MODULE] < IMPORT_TIME_BUDGET_US
@@ -4,6 +4,9 @@ from pathlib import Path
 ROOT = Path(__file__).parents[1]
 sys.path.append(str(ROOT))
 
+import time
+import threading
+
 from langchain.document_loaders import MastodonTootsLoader
 
 
@@ -28,6 +31,123 @@ def test_loader():
     assert len(posts) == 5
 
 
+class FakeMastodonApi:
+    """In-memory stand-in for the Mastodon API, with the statuses pagination semantics."""
+
+    def __init__(self, n_toots: dict, delay: float = 0.01):
+        self.delay = delay
+        self.toots = {
+            account: [self.make_toot(account, i) for i in range(n, 0, -1)]
+            for account, n in n_toots.items()
+        }
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_toot(account: str, i: int) -> dict:
+        return {
+            "id": str(1000 * (hash(account) % 1000) + i),
+            "url": f"https://mastodon.social/{account}/{i}",
+            "content": f"<p>toot {i} of {account}</p>",
+            "created_at": "2024-01-01T00:00:00.000Z",
+            "account": {"display_name": account},
+            "card": None,
+        }
+
+    def account_lookup(self, account):
+        return {"id": account}
+
+    def account_statuses(self, id, max_id=None, since_id=None, limit=20, **kwargs):
+        with self.lock:
+            self.calls.append((id, max_id, since_id, limit))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        toots = [
+            t
+            for t in self.toots[id]
+            if (max_id is None or int(t["id"]) < int(max_id))
+            and (since_id is None or int(t["id"]) > int(since_id))
+        ]
+        return toots[:limit]
+
+
+def create_fake_loader(n_toots: dict) -> MastodonLoader:
+    mloader = MastodonLoader(access_token="test")
+    mloader.api = FakeMastodonApi(n_toots)
+    return mloader
+
+
+def test_load_profiles_paginated_concurrent():
+    n_toots = {f"@user{i}@mastodon.social": 30 + 25 * i for i in range(6)}
+    mloader = create_fake_loader(n_toots)
+    posts = mloader.load_profiles(
+        mastodon_accounts=list(n_toots), number_toots=None, max_workers=3
+    )
+    # full histories, grouped in account order
+    assert [p.url for p in posts] == [
+        t["url"] for toots in mloader.api.toots.values() for t in toots
+    ]
+    assert mloader.api.max_in_flight == 3
+
+    # number_toots caps each account's toots, across pages
+    mloader = create_fake_loader(n_toots)
+    posts = mloader.load_profiles(mastodon_accounts=list(n_toots), number_toots=50)
+    assert len(posts) == 30 + 50 * 5
+    assert all(limit <= 40 for _, _, _, limit in mloader.api.calls)
+
+
+def test_iter_profiles_since_id_checkpoints():
+    accts = ["@ronent@mastodon.social", "@other@mastodon.social"]
+    mloader = create_fake_loader({accts[0]: 90, accts[1]: 10})
+    since_ids = {}
+    posts = list(mloader.iter_profiles(mastodon_accounts=accts, since_ids=since_ids))
+    assert len(posts) == 100
+    assert since_ids == {a: mloader.api.toots[a][0]["id"] for a in accts}
+
+    # new toots since the checkpoint
+    api = mloader.api
+    api.toots[accts[0]].insert(0, api.make_toot(accts[0], 91))
+    api.calls.clear()
+    posts = list(mloader.iter_profiles(mastodon_accounts=accts, since_ids=since_ids))
+    assert [p.url for p in posts] == [api.toots[accts[0]][0]["url"]]
+    assert since_ids[accts[0]] == api.toots[accts[0]][0]["id"]
+    # no pages older than the checkpoint are requested
+    assert len(api.calls) == 3
+    assert all(since_id is not None for _, _, since_id, _ in api.calls)
+
+    # posts are streamed: stopping early leaves the checkpoints unchanged
+    mloader = create_fake_loader({accts[0]: 200})
+    since_ids = {}
+    posts = mloader.iter_profiles(mastodon_accounts=accts[:1], since_ids=since_ids)
+    assert next(posts).url.endswith("/200")
+    posts.close()
+    assert since_ids == {}
+
+    # capped by number_toots: older new toots were skipped, the checkpoint is kept
+    since_ids = {accts[0]: mloader.api.toots[accts[0]][150]["id"]}
+    posts = list(
+        mloader.iter_profiles(
+            mastodon_accounts=accts[:1], number_toots=100, since_ids=since_ids
+        )
+    )
+    assert len(posts) == 100
+    assert since_ids == {accts[0]: mloader.api.toots[accts[0]][150]["id"]}
+
+    # exactly number_toots new toots: all were fetched, the checkpoint advances
+    posts = list(
+        mloader.iter_profiles(
+            mastodon_accounts=accts[:1], number_toots=150, since_ids=since_ids
+        )
+    )
+    assert len(posts) == 150
+    assert since_ids == {accts[0]: mloader.api.toots[accts[0]][0]["id"]}
+
+
 if __name__ == "__main__":
     mloader = MastodonLoader()
     accts = ["@ronent@mastodon.social"]
@@ -4,6 +4,11 @@ from pathlib import Path
 ROOT = Path(__file__).parents[1]
 sys.path.append(str(ROOT))
 
+import asyncio
+from unittest.mock import patch
+
+from desci_sense.shared_functions.web_extractors import citoid
+from desci_sense.shared_functions.web_extractors.citoid import fetch_all_citations
 from desci_sense.shared_functions.web_extractors.metadata_extractors import (
     extract_all_metadata_by_type,
     MetadataExtractionType,
@@ -29,3 +34,33 @@ def test_truncate_2():
         max_summary_length=-1,
     )
     assert md_list[0].summary == summary
+
+
+def fake_citation(delays):
+    async def fetch_citation_async(target_url, session, timeout):
+        await asyncio.sleep(delays[target_url])
+        return {"url": target_url, "original_url": target_url, "title": target_url}
+
+    return fetch_citation_async
+
+
+def test_fetch_all_citations_order():
+    delays = {"https://a.org": 0.05, "https://b.org": 0.0, "https://c.org": 0.02}
+    urls = list(delays)
+    with patch.object(citoid, "fetch_citation_async", fake_citation(delays)):
+        results = asyncio.run(fetch_all_citations(urls, max_concurrency=2))
+    assert [r["original_url"] for r in results] == urls
+
+
+def test_multi_ref_metadata_in_running_loop():
+    delays = {"https://a.org": 0.01, "https://b.org": 0.0}
+    urls = list(delays)
+
+    async def extract_in_loop():
+        return extract_all_metadata_by_type(
+            urls, md_type=MetadataExtractionType.CITOID, max_summary_length=10
+        )
+
+    with patch.object(citoid, "fetch_citation_async", fake_citation(delays)):
+        md_list = asyncio.run(extract_in_loop())
+    assert [md.url for md in md_list] == urls
@@ -0,0 +1,98 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+
+import time
+
+import pytest
+from pydantic import ValidationError
+
+from desci_sense.shared_functions.interface import LLMOntologyConceptDefinition
+from desci_sense.shared_functions.schema.ontology_base import (
+    OntologyBase,
+    create_ont_df_from_interface,
+    filter_ontology_by_version,
+)
+from desci_sense.shared_functions.schema.post import RefPost
+from desci_sense.shared_functions.postprocessing import (
+    convert_predicted_relations_to_rdf_triplets,
+)
+
+TYPE_PAIRS = [("post", "nan"), ("post", "ref"), ("post", "missing")]
+
+
+def legacy_valid_templates(ont_df, subject_type, object_type):
+    # previous pandas implementation of OntologyBase.get_valid_templates
+    return ont_df[
+        ont_df["valid_subject_types"].apply(lambda types: subject_type in types)
+        & ont_df["valid_object_types"].apply(lambda types: object_type in types)
+    ].to_dict(orient="records")
+
+
+@pytest.mark.parametrize("versions", [None, ["v0"], ["v1"]])
+def test_indexes_match_pandas(versions):
+    ontology = OntologyBase(versions=versions)
+    ont_df = filter_ontology_by_version(
+        create_ont_df_from_interface(ontology.ontology_interface),
+        allowed_versions=versions,
+    )
+    for subject_type, object_type in TYPE_PAIRS:
+        templates = ontology.get_valid_templates(subject_type, object_type)
+        assert [dict(t) for t in templates] == legacy_valid_templates(
+            ont_df, subject_type, object_type
+        )
+        assert ontology.get_valid_labels(subject_type, object_type) == [
+            t["label"] for t in templates
+        ]
+        assert (
+            ontology.get_valid_templates(subject_type, object_type, as_dict=False)
+            .label.to_list()
+            == ontology.get_valid_labels(subject_type, object_type)
+        )
+
+    label_df = ont_df.set_index("label", drop=False)
+    for label in ontology.get_all_labels():
+        legacy_concept = LLMOntologyConceptDefinition.model_validate(
+            label_df.loc[label].to_dict()
+        )
+        assert (
+            ontology.get_concept_by_label(label).model_dump()
+            == legacy_concept.model_dump()
+        )
+    assert ontology.get_all_labels() == ont_df.label.to_list()
+
+
+def test_indexes_immutable():
+    ontology = OntologyBase()
+    concept = ontology.get_concept_by_label("dg-claim")
+    with pytest.raises(ValidationError):
+        concept.label = "other"
+    template = ontology.get_valid_templates("post", "nan")[0]
+    with pytest.raises(TypeError):
+        template["label"] = "other"
+    with pytest.raises(KeyError):
+        ontology.get_concept_by_label("not-a-label")
+
+
+def test_postprocessing_cost_per_post():
+    ontology = OntologyBase()
+    post = RefPost(
+        author="someone",
+        content="",
+        url="",
+        ref_urls=["https://arxiv.org/abs/2402.04607"],
+    )
+    prediction = {
+        "post": post,
+        "answer": {"multi_tag": ontology.get_valid_labels("post", "ref")},
+    }
+    n_posts = 200
+    start = time.perf_counter()
+    for _ in range(n_posts):
+        convert_predicted_relations_to_rdf_triplets(prediction, ontology)
+    per_post = (time.perf_counter() - start) / n_posts
+    print(f"postprocessing cost per post: {per_post * 1e6:.1f}us")
+    # generous bound - pandas lookups alone took ~0.5ms per post
+    assert per_post < 0.005
@@ -0,0 +1,127 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+
+import re
+import time
+import random
+import asyncio
+
+from langchain_core.messages import AIMessageChunk
+
+from desci_sense.shared_functions.schema.ontology_base import OntologyBase
+from desci_sense.shared_functions.postprocessing.output_parsers import (
+    TagTypeParser,
+    KeywordParser,
+    TagMatcher,
+    extract_tags,
+)
+
+ALLOWED_TAGS = ["dg-claim", "dg-question", "reading"]
+
+COMPLETION = """Reasoning Steps: The post makes a claim and asks a question.
+Candidate Tags: <dg-claim> <dg-question>
+Final Answer: <dg-claim>, <dg-question>
+Some trailing text the model keeps generating, mentioning <reading>...
+"""
+
+
+def stream_chunks(text: str, consumed: list, size: int = 5):
+    for i in range(0, len(text), size):
+        consumed.append(i)
+        yield AIMessageChunk(content=text[i : i + size])
+
+
+async def astream_chunks(text: str, consumed: list, size: int = 5):
+    for chunk in stream_chunks(text, consumed, size):
+        yield chunk
+
+
+def test_stream_stops_at_answer():
+    parser = TagTypeParser(allowed_tags=ALLOWED_TAGS, stop_at_answer=True)
+    consumed = []
+    results = list(parser.transform(stream_chunks(COMPLETION, consumed)))
+    assert len(results) == 1
+    assert set(results[0]["multi_tag"]) == {"dg-claim", "dg-question"}
+    assert results[0]["final_answer"] == "<dg-claim>, <dg-question>"
+    # generation after the answer line is not consumed
+    answer_end = COMPLETION.index("Some trailing")
+    assert len(consumed) * 5 < answer_end + 5
+
+
+def test_astream_stops_at_answer():
+    parser = TagTypeParser(allowed_tags=ALLOWED_TAGS, stop_at_answer=True)
+    consumed = []
+
+    async def collect():
+        return [r async for r in parser.atransform(astream_chunks(COMPLETION, consumed))]
+
+    results = asyncio.run(collect())
+    assert len(results) == 1
+    assert set(results[0]["multi_tag"]) == {"dg-claim", "dg-question"}
+    assert len(consumed) * 5 < COMPLETION.index("Some trailing") + 5
+
+
+def test_stream_early_then_full():
+    parser = TagTypeParser(allowed_tags=ALLOWED_TAGS)
+    consumed = []
+    results = list(parser.transform(stream_chunks(COMPLETION, consumed)))
+    assert len(results) == 2
+    assert set(results[0]["multi_tag"]) == {"dg-claim", "dg-question"}
+    # without stopping, last result is the same as parsing the full output
+    assert results[-1] == parser.parse(COMPLETION)
+
+
+def test_stream_without_answer_line():
+    text = "Reasoning Steps: a\nCandidate Tags: #AI\nFinal Answer: #AI #ML"
+    parser = KeywordParser(stop_at_answer=True)
+    results = list(parser.transform(stream_chunks(text, [])))
+    assert results == [parser.parse(text)]
+    assert set(results[0]["valid_keywords"]) == {"AI", "ML"}
+
+
+def test_extract_tags_order_and_boundaries():
+    tags = ["dg-claim", "claim", "reading", "missing-ref"]
+    text = "<READING> is spreading, <dg-claim>, <claim> <dg-claim> <missing-reference>"
+    assert extract_tags(text, tags) == ["reading", "dg-claim", "claim"]
+    assert extract_tags(text, []) == []
+    # tags with spaces use the regex matcher
+    assert TagMatcher(["Two words", "claim"]).find_all(
+        "two wordsy, claim, two words"
+    ) == ["claim", "Two words"]
+
+
+def legacy_extract_tags(input_text, tags):
+    # previous implementation, without ordering or word boundaries
+    pattern = "|".join(map(re.escape, tags))
+    return list(set(re.findall(pattern, input_text.lower())))
+
+
+def test_tag_matcher_throughput():
+    labels = OntologyBase().get_all_labels()
+    rng = random.Random(0)
+    completions = [
+        "Final Answer: "
+        + ", ".join(f"<{label}>" for label in rng.sample(labels, rng.randint(1, 4)))
+        + " because the post discusses the paper in detail. " * rng.randint(1, 5)
+        for _ in range(20000)
+    ]
+
+    start = time.perf_counter()
+    legacy = [legacy_extract_tags(c, labels) for c in completions]
+    legacy_time = time.perf_counter() - start
+
+    matcher = TagMatcher(labels)
+    start = time.perf_counter()
+    results = [matcher.find_all(c) for c in completions]
+    matcher_time = time.perf_counter() - start
+
+    print(
+        f"extract_tags: {len(completions) / legacy_time:.0f} completions/s (legacy) "
+        f"vs {len(completions) / matcher_time:.0f} completions/s (compiled matcher)"
+    )
+    # same tags found for well formed answers
+    assert [set(r) for r in results] == [set(r) for r in legacy]
+    assert results == [matcher.find_all(c) for c in completions]
@@ -0,0 +1,75 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+
+import time
+
+from desci_sense.shared_functions.init import (
+    init_multi_stage_parser_config,
+    get_config_fingerprint,
+)
+from desci_sense.shared_functions.main import get_parser, clear_parser_registry
+
+
+def get_test_config(**optional):
+    config = {
+        "wandb_project": "test",
+        "openai_api_key": "test_key",
+        "openai_api_base": "https://openrouter.ai/api/v1",
+        "openai_api_referer": "https://127.0.0.1:3000/",
+    }
+    return init_multi_stage_parser_config(config, optional)
+
+
+def test_fingerprint_stable():
+    assert get_config_fingerprint(get_test_config()) == get_config_fingerprint(
+        get_test_config()
+    )
+    assert get_config_fingerprint(get_test_config()) != get_config_fingerprint(
+        get_test_config(temperature=0)
+    )
+
+
+def test_registry_reuse():
+    clear_parser_registry()
+    parser = get_parser(get_test_config())
+    assert get_parser(get_test_config()) is parser
+
+
+def test_registry_rebuild_on_config_change():
+    clear_parser_registry()
+    parser = get_parser(get_test_config())
+    other = get_parser(get_test_config(temperature=0))
+    assert other is not parser
+    assert other.config["model"]["temperature"] == 0
+    assert get_parser(get_test_config()) is parser
+
+
+def test_warm_faster_than_cold():
+    clear_parser_registry()
+    config = get_test_config()
+
+    start = time.time()
+    get_parser(config)
+    cold_time = time.time() - start
+
+    start = time.time()
+    get_parser(config)
+    warm_time = time.time() - start
+
+    assert warm_time < cold_time
+
+
+if __name__ == "__main__":
+    config = get_test_config()
+    clear_parser_registry()
+    start = time.time()
+    get_parser(config)
+    print(f"cold: {time.time() - start:.4f} seconds")
+    n = 100
+    start = time.time()
+    for _ in range(n):
+        get_parser(config)
+    print(f"warm: {(time.time() - start) / n:.6f} seconds")
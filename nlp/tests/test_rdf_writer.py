@@ -0,0 +1,143 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+
+import time
+
+from rdflib import Graph, Literal, URIRef
+from rdflib.compare import isomorphic
+from rdflib.namespace import XSD
+
+from desci_sense.shared_functions.interface import (
+    ParserResult,
+    ParserSupport,
+    RDFTriplet,
+    KeywordConceptDefinition,
+)
+from desci_sense.shared_functions.schema.ontology_base import OntologyBase
+from desci_sense.shared_functions.schema.post import RefPost
+from desci_sense.shared_functions.postprocessing import (
+    ASSERTION_URI,
+    predicted_relations_to_triples,
+    keywords_to_triples,
+)
+from desci_sense.shared_functions.rdf_writer import (
+    serialize_json_triples,
+    serialize_nt,
+    serialize_turtle,
+    triples_to_graph,
+)
+
+REFS = ["https://arxiv.org/abs/2402.04607", "https://www.alink.com/a?b=1&c=2"]
+
+
+def get_prediction(ontology: OntologyBase):
+    post = RefPost(author="someone", content="", url="", ref_urls=REFS)
+    semantics = {
+        "post": post,
+        "answer": {"multi_tag": ontology.get_valid_labels("post", "ref")[:3]},
+    }
+    keywords = {"answer": {"valid_keywords": ["AI", 'quote"d', "back\\slash", "über"]}}
+    return semantics, keywords
+
+
+def legacy_post_process(semantics, keywords, ontology):
+    # previous implementation: pydantic triplet per triple, rdflib turtle serializer
+    graph = Graph()
+    for label in semantics["answer"]["multi_tag"]:
+        concept = ontology.get_concept_by_label(label)
+        for ref in semantics["post"].ref_urls:
+            graph.add(
+                RDFTriplet(predicate=URIRef(concept.uri), object=URIRef(ref)).to_tuple()
+            )
+    for kw in keywords["answer"]["valid_keywords"]:
+        graph.add(
+            RDFTriplet(
+                predicate=URIRef(KeywordConceptDefinition().uri), object=Literal(kw)
+            ).to_tuple()
+        )
+    return graph, graph.serialize(format="turtle")
+
+
+def fast_post_process(semantics, keywords, ontology):
+    triples = predicted_relations_to_triples(semantics, ontology)
+    triples += keywords_to_triples(keywords)
+    graph = triples_to_graph(triples)
+    return graph, serialize_turtle(graph)
+
+
+def test_same_graph_as_legacy():
+    ontology = OntologyBase()
+    semantics, keywords = get_prediction(ontology)
+    legacy_graph, _ = legacy_post_process(semantics, keywords, ontology)
+    graph, turtle = fast_post_process(semantics, keywords, ontology)
+    assert len(graph) == 3 * len(REFS) + 4
+    assert isomorphic(graph, legacy_graph)
+    assert isomorphic(Graph().parse(data=turtle, format="turtle"), legacy_graph)
+
+
+def test_writers_round_trip():
+    triples = [
+        (ASSERTION_URI, URIRef("https://schema.org/keywords"), Literal("a\nb\t\"c\"")),
+        (ASSERTION_URI, URIRef("https://schema.org/keywords"), Literal("d", lang="en")),
+        (ASSERTION_URI, URIRef("https://schema.org/count"), Literal(3)),
+        (
+            URIRef("https://other.org/s"),
+            URIRef("https://schema.org/date"),
+            Literal("x", datatype=XSD.string),
+        ),
+    ]
+    graph = triples_to_graph(triples)
+    assert isomorphic(Graph().parse(data=serialize_nt(triples), format="nt"), graph)
+    assert isomorphic(
+        Graph().parse(data=serialize_turtle(triples), format="turtle"), graph
+    )
+
+
+def test_invalid_iri_characters_escaped():
+    url = 'https://www.alink.com/a b<c>"d"{e}|f^g`h\\i'
+    escaped = "https://www.alink.com/a%20b%3Cc%3E%22d%22%7Be%7D%7Cf%5Eg%60h%5Ci"
+    triples = [(ASSERTION_URI, URIRef("https://schema.org/about"), URIRef(url))]
+    expected = triples_to_graph(
+        [(ASSERTION_URI, URIRef("https://schema.org/about"), URIRef(escaped))]
+    )
+    assert isomorphic(Graph().parse(data=serialize_nt(triples), format="nt"), expected)
+    assert isomorphic(
+        Graph().parse(data=serialize_turtle(triples), format="turtle"), expected
+    )
+    assert serialize_json_triples(triples)[0][2] == escaped
+
+
+def test_parser_result_round_trip():
+    ontology = OntologyBase()
+    semantics, keywords = get_prediction(ontology)
+    graph, _ = fast_post_process(semantics, keywords, ontology)
+    result = ParserResult(
+        semantics=graph, support=ParserSupport(ontology=ontology.ontology_interface)
+    )
+    loaded = ParserResult.model_validate_json(result.model_dump_json())
+    assert isomorphic(loaded.semantics, graph)
+
+
+def test_post_process_cost_per_post():
+    ontology = OntologyBase()
+    semantics, keywords = get_prediction(ontology)
+    n_posts = 300
+
+    start = time.perf_counter()
+    for _ in range(n_posts):
+        legacy_post_process(semantics, keywords, ontology)
+    legacy_time = (time.perf_counter() - start) / n_posts
+
+    start = time.perf_counter()
+    for _ in range(n_posts):
+        fast_post_process(semantics, keywords, ontology)
+    fast_time = (time.perf_counter() - start) / n_posts
+
+    print(
+        f"postprocessing + serialization per post: {legacy_time * 1e6:.0f}us (legacy)"
+        f" vs {fast_time * 1e6:.0f}us"
+    )
+    assert fast_time < legacy_time
@@ -0,0 +1,81 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from desci_sense.shared_functions import tracing
+
+
+def test_span_without_trace_is_noop():
+    assert tracing.get_current_timings() is None
+    assert tracing.span("stage") is tracing.span("other_stage")
+    with tracing.trace("disabled", enabled=False) as timings:
+        assert timings is None
+        with tracing.span("stage"):
+            pass
+
+
+def test_trace_collects_stages():
+    with tracing.trace("outer") as timings:
+        with tracing.span("a"):
+            time.sleep(0.01)
+        with tracing.span("a"):
+            time.sleep(0.01)
+        # nested traces join the enclosing one
+        with tracing.trace("inner") as inner:
+            assert inner is timings
+            with tracing.span("b"):
+                pass
+
+        # stages recorded from worker threads
+        start = datetime.utcnow()
+        with ThreadPoolExecutor(2) as executor:
+            list(
+                executor.map(
+                    lambda i: timings.record_run(
+                        "llm", start, start + timedelta(milliseconds=5)
+                    ),
+                    range(2),
+                )
+            )
+
+    assert tracing.get_current_timings() is None
+    durations = timings.as_dict()
+    assert set(durations) == {"a", "b", "llm", "total"}
+    assert durations["a"] >= 20
+    assert durations["llm"] == 10
+    assert durations["total"] >= durations["a"]
+
+
+def test_opentelemetry_spans():
+    sdk_trace = pytest.importorskip("opentelemetry.sdk.trace")
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+
+    exporter = InMemorySpanExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    otel_trace.set_tracer_provider(provider)
+
+    with tracing.trace("parse", opentelemetry=True) as timings:
+        with tracing.span("prompt_rendering"):
+            pass
+        start = datetime.utcnow()
+        timings.record_run("semantics_llm", start, start + timedelta(seconds=1))
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert set(spans) == {"parse", "prompt_rendering", "semantics_llm"}
+    root_id = spans["parse"].context.span_id
+    assert spans["prompt_rendering"].parent.span_id == root_id
+    assert spans["semantics_llm"].parent.span_id == root_id
+    assert spans["semantics_llm"].end_time - spans["semantics_llm"].start_time == 1e9
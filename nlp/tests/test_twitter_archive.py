@@ -0,0 +1,376 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+
+import io
+import os
+import json
+import time
+import zipfile
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta
+
+import pytz
+import pytest
+
+from desci_sense.shared_functions.dataloaders.twitter import twitter_archive_parser
+from desci_sense.shared_functions.dataloaders.twitter.twitter_archive_loader import (
+    TwitterArchiveLoader,
+    iter_js_array,
+)
+
+USERNAME = "test_user"
+START_DATE = datetime(2024, 1, 1, tzinfo=pytz.UTC)
+
+
+def make_tweet(i: int) -> dict:
+    created_at = START_DATE + timedelta(days=i)
+    return {
+        "tweet": {
+            "id": str(1000 + i),
+            "created_at": created_at.strftime("%a %b %d %H:%M:%S %z %Y"),
+            "full_text": f"tweet number {i} about https://t.co/{i} " + "x" * 200,
+            "id_str": str(1000 + i),
+            "entities": {
+                "urls": [
+                    {
+                        "url": f"https://t.co/{i}",
+                        "expanded_url": f"https://example.com/{i}",
+                    }
+                ],
+                "user_mentions": [{"id": str(i % 7), "screen_name": f"user{i % 7}"}],
+            },
+        }
+    }
+
+
+def to_js(name: str, items) -> str:
+    lines = [f"window.YTD.{name}.part0 = ["]
+    lines.append(",\n".join(json.dumps(item, indent=2) for item in items))
+    lines.append("]")
+    return "\n".join(lines)
+
+
+def write_archive(path: Path, n_tweets: int) -> Path:
+    account = [{"account": {"username": USERNAME, "accountId": "1"}}]
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("archive/data/account.js", to_js("account", account))
+        with zf.open("archive/data/tweets.js", "w") as f:
+            f.write(b"window.YTD.tweets.part0 = [\n")
+            for i in range(n_tweets):
+                sep = b",\n" if i < n_tweets - 1 else b"\n"
+                f.write(json.dumps(make_tweet(i), indent=2).encode("utf8") + sep)
+            f.write(b"]")
+    return path
+
+
+def test_iter_js_array_small_chunks():
+    items = [make_tweet(i) for i in range(5)] + [{"s": "with ] and [ and , inside"}]
+    text = to_js("tweets", items)
+    for chunk_size in [1, 7, 1 << 16]:
+        assert list(iter_js_array(io.StringIO(text), chunk_size)) == items
+    assert list(iter_js_array(io.StringIO("window.YTD.tweets.part0 = []"))) == []
+    assert list(iter_js_array(io.StringIO(""))) == []
+
+
+def test_iter_archive_lazy_and_cutoff(tmp_path):
+    path = write_archive(tmp_path / "archive.zip", 20)
+    loader = TwitterArchiveLoader()
+
+    posts = loader.iter_archive(str(path))
+    first = next(posts)
+    assert first.author == USERNAME
+    assert first.url == f"https://twitter.com/{USERNAME}/status/1000"
+    assert first.ref_urls == ["https://example.com/0"]
+    assert len(list(posts)) == 19
+
+    cutoff = (START_DATE + timedelta(days=15)).strftime("%Y-%m-%d")
+    posts = loader.load_archive(str(path), cutoff_date=cutoff)
+    assert [p.url.split("/")[-1] for p in posts] == [str(1000 + i) for i in range(15, 20)]
+
+    # archive is read in place
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_load_ref_posts_from_archive_dir(tmp_path):
+    path = write_archive(tmp_path / "archive.zip", 10)
+    with zipfile.ZipFile(path) as zf:
+        zf.extractall(tmp_path / "extracted")
+    posts = TwitterArchiveLoader().load_ref_posts_from_archive_dir(
+        str(tmp_path / "extracted" / "archive"), cutoff_date="2024-01-06"
+    )
+    assert len(posts) == 5
+    assert posts[0].created_at == START_DATE + timedelta(days=5)
+
+
+def peak_memory_of_iteration(path: Path) -> int:
+    tracemalloc.start()
+    count = 0
+    for _ in TwitterArchiveLoader().iter_archive(str(path)):
+        count += 1
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def test_peak_memory_independent_of_archive_size(tmp_path):
+    small = write_archive(tmp_path / "small.zip", 1000)
+    large = write_archive(tmp_path / "large.zip", 10000)
+    with zipfile.ZipFile(large) as zf:
+        large_size = zf.getinfo("archive/data/tweets.js").file_size
+
+    small_peak = peak_memory_of_iteration(small)
+    large_peak = peak_memory_of_iteration(large)
+    print(
+        f"peak memory: {small_peak / 1e6:.2f}MB (1k tweets) vs "
+        f"{large_peak / 1e6:.2f}MB (10k tweets, {large_size / 1e6:.1f}MB archive file)"
+    )
+    assert large_peak < large_size / 4
+    assert large_peak < 2 * small_peak
+
+
+def write_archive_dir(path: Path, tweets: list) -> twitter_archive_parser.PathConfig:
+    account = [{"account": {"username": USERNAME, "accountId": "1"}}]
+    (path / "data" / "tweets_media").mkdir(parents=True, exist_ok=True)
+    (path / "data" / "account.js").write_text(to_js("account", account))
+    (path / "data" / "tweets.js").write_text(to_js("tweets", tweets))
+    return twitter_archive_parser.PathConfig(dir_archive=str(path))
+
+
+def legacy_parse_tweets(paths):
+    # previous implementation: serial conversion with shared state
+    tweets, media_sources, users = [], [], {}
+    for filename in paths.files_input_tweets:
+        for tweet in twitter_archive_parser.read_json_from_js_file(filename):
+            tweets.append(
+                twitter_archive_parser.convert_tweet(
+                    tweet, USERNAME, media_sources, users, paths
+                )
+            )
+    tweets.sort(key=lambda tup: tup[0])
+    return tweets, {k: u.handle for k, u in users.items()}
+
+
+def parse_tweets(paths, **kwargs):
+    users = {}
+    tweets = twitter_archive_parser.parse_tweets(USERNAME, users, paths, **kwargs)
+    return tweets, {k: u.handle for k, u in users.items()}
+
+
+def test_parse_tweets_parallel_same_as_serial(tmp_path):
+    paths = write_archive_dir(tmp_path, [make_tweet(i) for i in range(50)])
+    expected = legacy_parse_tweets(paths)
+    assert parse_tweets(paths, use_cache=False) == expected
+    assert parse_tweets(paths, processes=2, chunk_size=10, use_cache=False) == expected
+    assert not Path(paths.file_converted_tweets_cache).exists()
+
+
+def test_parse_tweets_collects_media_sources(tmp_path):
+    tweets = [make_tweet(i) for i in range(3)]
+    media = {"url": "https://t.co/m", "media_url": "http://pbs.twimg.com/media/p.jpg"}
+    tweets[1]["tweet"]["entities"]["media"] = [media]
+    tweets[1]["tweet"]["extended_entities"] = {"media": [media]}
+    paths = write_archive_dir(tmp_path, tweets)
+    (tmp_path / "data" / "tweets_media" / "1001-p.jpg").write_bytes(b"jpg")
+    os.makedirs(paths.dir_output_media)
+
+    for use_cache in [False, True, True]:
+        media_sources = []
+        parse_tweets(paths, use_cache=use_cache, media_sources=media_sources)
+        assert media_sources == [
+            (
+                os.path.join(paths.dir_output_media, "1001-p.jpg"),
+                "https://pbs.twimg.com/media/p.jpg:orig",
+            )
+        ]
+
+
+def test_parse_tweets_incremental_cache(tmp_path, monkeypatch):
+    tweets = [make_tweet(i) for i in range(30)]
+    paths = write_archive_dir(tmp_path, tweets)
+    expected = parse_tweets(paths, processes=2, chunk_size=10)
+    assert Path(paths.file_converted_tweets_cache).exists()
+
+    converted_ids = []
+    convert_tweet = twitter_archive_parser.convert_tweet
+
+    def counting_convert_tweet(tweet, *args):
+        converted_ids.append(tweet["tweet"]["id_str"])
+        return convert_tweet(tweet, *args)
+
+    monkeypatch.setattr(twitter_archive_parser, "convert_tweet", counting_convert_tweet)
+
+    hashed_ids = []
+    get_tweet_content_hash = twitter_archive_parser.get_tweet_content_hash
+
+    def counting_get_tweet_content_hash(tweet, *args):
+        hashed_ids.append(tweet["tweet"]["id_str"])
+        return get_tweet_content_hash(tweet, *args)
+
+    monkeypatch.setattr(
+        twitter_archive_parser, "get_tweet_content_hash", counting_get_tweet_content_hash
+    )
+
+    # nothing changed: everything comes from the cache, without hashing tweets again
+    assert parse_tweets(paths) == expected
+    assert converted_ids == []
+    assert hashed_ids == []
+
+    # only new and edited tweets are converted
+    tweets[3]["tweet"]["full_text"] = "edited"
+    tweets.append(make_tweet(30))
+    paths = write_archive_dir(tmp_path, tweets)
+    result = parse_tweets(paths)
+    assert sorted(converted_ids) == ["1003", "1030"]
+    assert result == legacy_parse_tweets(paths)
+
+
+def legacy_escape_markdown(input_text: str) -> str:
+    # previous implementation, char by char
+    output_text = ""
+    for char in input_text:
+        if char in r"\_*[]()~`>#+-=|{}.!":
+            output_text = output_text + "\\" + char
+        elif char == "\n":
+            output_text = output_text + "  " + char
+        else:
+            output_text = output_text + char
+    return output_text
+
+
+def test_escape_markdown_same_as_legacy():
+    text = "a_b *c* [d](e) ~`>#+-=|{}.! \\ \n\nplain text\t&"
+    assert twitter_archive_parser.escape_markdown(text) == legacy_escape_markdown(text)
+
+
+class MediaServer:
+    """Local stand-in for the media host, supporting conditional and range requests."""
+
+    def __init__(self, files: dict, delay: float = 0.02):
+        self.files = files
+        self.delay = delay
+        self.truncate_once = set()
+        self.requests = []
+        self.in_flight = Counter()
+        self.max_in_flight = defaultdict(int)
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                host = self.headers["Host"]
+                with server.lock:
+                    server.requests.append((self.path, dict(self.headers)))
+                    server.in_flight[host] += 1
+                    server.max_in_flight[host] = max(
+                        server.max_in_flight[host], server.in_flight[host]
+                    )
+                try:
+                    time.sleep(server.delay)
+                    self.respond()
+                finally:
+                    with server.lock:
+                        server.in_flight[host] -= 1
+
+            def respond(self):
+                content = server.files.get(self.path)
+                if content is None:
+                    self.send_error(404)
+                    return
+                etag = f'"{hash(content)}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                start = 0
+                if self.headers.get("Range") and self.headers.get("If-Range") == etag:
+                    start = int(self.headers["Range"][len("bytes=") : -1])
+                    self.send_response(206)
+                    self.send_header(
+                        "Content-Range",
+                        f"bytes {start}-{len(content) - 1}/{len(content)}",
+                    )
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(len(content) - start))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                if self.path in server.truncate_once:
+                    server.truncate_once.discard(self.path)
+                    self.wfile.write(content[start : len(content) // 2])
+                    return
+                self.wfile.write(content[start:])
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_media(tmp_path, n_files: int):
+    paths = write_archive_dir(tmp_path, [make_tweet(0)])
+    Path(paths.dir_output_media).mkdir(parents=True, exist_ok=True)
+    files, media_sources = {}, []
+    for i in range(n_files):
+        local_path = Path(paths.dir_output_media) / f"{i}.mp4"
+        local_path.write_bytes(b"small")
+        files[f"/media/{i}.mp4"] = bytes([i % 256]) * (20000 + i)
+        # spread media over two host names of the same server
+        host = "127.0.0.1" if i % 2 else "localhost"
+        media_sources.append((str(local_path), f"http://{host}:{{port}}/media/{i}.mp4"))
+    return paths, files, media_sources
+
+
+def test_download_larger_media_concurrent_and_resumable(tmp_path):
+    # hot-loaded by the downloader (which would otherwise prompt to install it)
+    pytest.importorskip("imagesize")
+    paths, files, media_sources = make_media(tmp_path, 24)
+    server = MediaServer(files)
+    media_sources = [(p, url.format(port=server.port)) for p, url in media_sources]
+    # first response of one file is cut off midway
+    server.truncate_once.add("/media/5.mp4")
+    try:
+        report = twitter_archive_parser.download_larger_media(
+            media_sources, paths, max_workers=8, max_connections_per_host=2, sleep_time=0
+        )
+        assert report["succeeded"] == 24 and report["failed"] == 0
+        # the cut off download is resumed, so only its second half is counted
+        assert report["bytes_downloaded"] == sum(len(c) for c in files.values()) - (
+            len(files["/media/5.mp4"]) // 2
+        )
+        assert report["bytes_per_second"] > 0
+        for i, (local_path, _) in enumerate(media_sources):
+            assert Path(local_path).read_bytes() == files[f"/media/{i}.mp4"]
+        assert max(server.max_in_flight.values()) <= 2
+        assert len(server.max_in_flight) == 2
+        # the cut off download was resumed with a range request
+        ranged = [h for path, h in server.requests if "Range" in h]
+        assert [h["Range"] for h in ranged] == [f"bytes={len(files['/media/5.mp4']) // 2}-"]
+
+        # resumed run: everything is already in the journal
+        server.requests.clear()
+        report = twitter_archive_parser.download_larger_media(
+            media_sources, paths, sleep_time=0
+        )
+        assert report["resumed"] == 24 and server.requests == []
+
+        # fresh run: files are only checked with conditional requests
+        report = twitter_archive_parser.download_larger_media(
+            media_sources, paths, sleep_time=0, resume=False
+        )
+        assert len(server.requests) == 24
+        assert all("If-None-Match" in h for _, h in server.requests)
+        assert report["succeeded"] == 24 and report["bytes_downloaded"] == 0
+    finally:
+        server.close()
@@ -0,0 +1,144 @@
+import sys
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+ROOT = Path(__file__).parents[1]
+sys.path.append(str(ROOT))
+
+import time
+import threading
+
+import pytest
+import requests
+
+from desci_sense.shared_functions import utils
+from desci_sense.shared_functions.cache import create_cache
+from desci_sense.shared_functions.utils import (
+    extract_and_expand_urls,
+    normalize_url,
+    UrlRuleEngine,
+    DEFAULT_URL_RULES,
+    get_url_rule_engine,
+)
+
+REDIRECTS = {
+    "https://t.co/abc": "https://arxiv.org/abs/2402.04607",
+}
+
+
+class FakeSession:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def head(self, url, allow_redirects, timeout):
+        with self.lock:
+            self.calls.append(url)
+        time.sleep(self.delay)
+        if "unreachable" in url:
+            raise requests.ConnectionError()
+        response = MagicMock()
+        response.url = REDIRECTS.get(url, url)
+        return response
+
+
+@pytest.fixture
+def url_cache(monkeypatch):
+    """Fresh cache of resolved URLs, restored after the test."""
+    cache = create_cache()
+    monkeypatch.setattr(utils, "_url_cache", cache)
+    return cache
+
+
+def test_normalize_url_memoized(url_cache):
+    session = FakeSession()
+    with patch.object(utils, "get_http_session", return_value=session):
+        assert normalize_url("https://t.co/abc") == "https://arxiv.org/abs/2402.04607"
+        assert normalize_url("https://t.co/abc") == "https://arxiv.org/abs/2402.04607"
+        # already expanded url skips the network
+        normalize_url("https://www.alink.com/")
+        normalize_url("https://www.alink.com/")
+    assert session.calls == ["https://t.co/abc", "https://www.alink.com/"]
+    assert url_cache.stats()["hits"] == 2
+
+
+def test_failed_resolution_not_cached(url_cache):
+    session = FakeSession()
+    with patch.object(utils, "get_http_session", return_value=session):
+        assert normalize_url("https://unreachable.org/a") == "https://unreachable.org/a"
+        normalize_url("https://unreachable.org/a")
+    assert len(session.calls) == 2
+
+
+def test_expand_urls_concurrently(url_cache):
+    session = FakeSession(delay=0.1)
+    text = " ".join(["see https://t.co/abc"] + [f"https://a{i}.org/x" for i in range(5)])
+    with patch.object(utils, "get_http_session", return_value=session):
+        start = time.time()
+        urls = extract_and_expand_urls(text)
+        elapsed = time.time() - start
+    assert urls[0] == "https://arxiv.org/abs/2402.04607"
+    assert urls[1:] == [f"https://a{i}.org/x" for i in range(5)]
+    assert elapsed < 6 * 0.1
+
+
+def test_url_rules_skip_network(url_cache, monkeypatch):
+    monkeypatch.setattr(
+        utils, "_url_rules", UrlRuleEngine.from_dicts(DEFAULT_URL_RULES)
+    )
+    session = FakeSession()
+    with patch.object(utils, "get_http_session", return_value=session):
+        assert (
+            normalize_url("http://dx.doi.org/10.1098/rstb.2022.0267")
+            == "https://doi.org/10.1098/rstb.2022.0267"
+        )
+        assert (
+            normalize_url("https://mobile.x.com/someone/status/1722300572554969090?s=20")
+            == "https://twitter.com/someone/status/1722300572554969090"
+        )
+        assert (
+            normalize_url("https://www.biorxiv.org/content/10.1101/2024.01.01.1")
+            == "https://www.biorxiv.org/content/10.1101/2024.01.01.1"
+        )
+        normalize_url("https://t.co/abc")
+        # non-scholarly hosts may redirect, so they are still resolved
+        normalize_url("https://youtube.com/watch?v=abc")
+    assert session.calls == ["https://t.co/abc", "https://youtube.com/watch?v=abc"]
+    stats = get_url_rule_engine().stats()
+    assert stats["network_calls_avoided"] == 3
+    assert stats["resolve"] == 2
+
+
+def test_url_rule_counts_thread_safe():
+    engine = UrlRuleEngine.from_dicts(DEFAULT_URL_RULES)
+    urls = ["https://arxiv.org/abs/1", "https://t.co/abc"] * 5000
+    threads = [
+        threading.Thread(target=lambda: [engine.resolve_locally(u) for u in urls])
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert engine.stats()["pass"] == engine.stats()["resolve"] == 4 * 5000
+
+
+def test_url_rule_config():
+    engine = UrlRuleEngine.from_dicts(
+        [
+            {"host": "example.org", "action": "pass"},
+            {
+                "host": "short.ly",
+                "action": "rewrite",
+                "pattern": r"^https?://short\.ly/p/(\d+)$",
+                "replacement": r"https://example.org/paper/\1",
+            },
+        ],
+        default_action="pass",
+    )
+    assert engine.resolve_locally("https://sub.example.org/a") == "https://sub.example.org/a"
+    assert engine.resolve_locally("https://short.ly/p/12") == "https://example.org/paper/12"
+    # rewrite pattern doesn't match - resolve remotely
+    assert engine.resolve_locally("https://short.ly/other") is None
+    assert engine.resolve_locally("https://unknown.org") == "https://unknown.org"